@@ -90,6 +90,68 @@ and computation time.
 :type: int
 """
 
+granulation_chunk_size = 10000
+"""
+The default number of epochs to draw at once when
+the granulation coverage is sampled in chunks.
+
+:type: int
+"""
+
+spectrum_cache_size = 64
+"""
+The maximum number of stellar spectra to keep in the
+``GridSpectra`` memo before the least recently used
+one is evicted.
+
+:type: int
+"""
+
+spectra_block_size = 32
+"""
+The number of epochs whose stellar spectra ``ObservationModel.build_spectra``
+combines in a single matrix product.
+
+:type: int
+"""
+
+psg_output_cache_size = 8
+"""
+The maximum number of parsed PSG output files to keep in memory
+during ``ObservationModel.build_spectra`` before the least recently
+used one is evicted. Each epoch reads eight files.
+
+:type: int
+"""
+
+spectra_load_workers = None
+"""
+The number of stellar spectra to read and bin at once when
+loading a ``GridSpectra``. If ``None``, the number of CPUs is used.
+
+:type: int or None
+"""
+
+spectra_load_processes = False
+"""
+Whether raw PHOENIX models are binned in separate processes rather
+than in threads when loading a ``GridSpectra``.
+
+Processes are started with ``spawn``, which imports the ``__main__``
+module again in each worker, so only turn this on from scripts that
+guard their entry point with ``if __name__ == '__main__':``.
+
+:type: bool
+"""
+
+grid_wl_chunk_size = 4096
+"""
+The number of wavelength points in each chunk of a
+``ChunkedGridSpectra`` file.
+
+:type: int
+"""
+
 grid_teff_bounds = (2300*u.K, 3900*u.K)
 """
 The limits on the effective temperature allowed by the grid.
@@ -178,6 +240,58 @@ This command is sent after the ``.cfg`` returned by PSG reaches
 `PSG_CFG_MAX_LINES` lines long.
 """
 
+PSG_CFG_CHECK_INTERVAL = 10
+"""
+The config returned by PSG is checked on every phase with an
+index that is a multiple of this, and on the first phase after
+each ``set`` command. Set it to 1 to check every phase.
+
+Between checks, the length of the config stored by PSG is
+estimated from the lines that have been sent, and a ``set``
+command is sent before a phase that would take it past
+`PSG_CFG_MAX_LINES`.
+
+:type: int
+"""
+
+PSG_TIMEOUT = (10, None)
+"""
+The number of seconds to wait for PSG, as a ``(connect, read)`` tuple
+or a single number for both, in the form accepted by ``requests``.
+
+A full GCM run can keep PSG busy for several minutes, so by default
+there is no limit on the wait for a response once connected. Set
+a read timeout to give up on runs that take longer.
+
+:type: tuple or float
+"""
+
+PSG_RETRIES = 3
+"""
+The number of times to retry a PSG API call that fails to connect
+or gets a server error response. Calls that time out or lose the
+connection while waiting for the response are not retried, as
+PSG may have already done the computation.
+
+:type: int
+"""
+
+PSG_RETRY_BACKOFF = 0.5
+"""
+The backoff factor, in seconds, between retries of a PSG API call.
+The wait doubles after each attempt.
+
+:type: float
+"""
+
+PSG_MAX_CONCURRENCY = 4
+"""
+The maximum number of PSG instances that
+``ObservationModel.build_planet_async`` sends requests to at once.
+
+:type: int
+"""
+
 
 psg_pressure_unit = u.bar
 """
@@ -268,6 +382,49 @@ The path to the binned PHOENIX stellar models.
 :type: pathlib.Path
 """
 
+SPECTRA_CACHE_PATH = Path.home() / '.vspec' / 'cache' / 'spectra'
+"""
+The path to the user-level cache of binned stellar spectra.
+
+Spectra at resolving powers that are not pre-binned are
+written here the first time they are computed.
+
+:type: pathlib.Path
+"""
+
+SPECTRA_CACHE_MAX_BYTES = 2*1024**3
+"""
+The maximum size of the spectra cache in bytes. When it is
+exceeded, the least recently used spectra are deleted.
+
+:type: int
+"""
+
+PSG_CACHE_PATH = Path.home() / '.vspec' / 'cache' / 'psg'
+"""
+The path to the user-level cache of PSG responses, used when
+``ObservationModel.build_planet`` is called with ``use_cache=True``.
+
+:type: pathlib.Path
+"""
+
+PSG_CACHE_MAX_BYTES = 1024**3
+"""
+The maximum size of the PSG response cache in bytes. When it is
+exceeded, the least recently used responses are deleted.
+
+:type: int
+"""
+
+JAX_CACHE_PATH = None
+"""
+The directory of the persistent JAX compilation cache. Set this to
+a path (for example ``VSPEC_PARENT_PATH / 'jax_cache'``) to reuse
+compiled functions between runs. The cache is off by default.
+
+:type: pathlib.Path or None
+"""
+
 EXAMPLE_GCM_PATH = Path(__file__).parent / 'data' / 'GCMs'
 """
 The path to example GCMs.
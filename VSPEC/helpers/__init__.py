@@ -5,9 +5,10 @@ This module contains functions that may be shared
 throughout the rest of the package.
 """
 from VSPEC.helpers.astropy_units import isclose
-from VSPEC.helpers.misc import get_transit_radius, get_planet_indicies, read_lyr
+from VSPEC.helpers.misc import get_transit_radius, get_planet_indicies, read_lyr, parse_lyr
 from VSPEC.helpers.docker import is_port_in_use, set_psg_state
-from VSPEC.helpers.teff import arrange_teff, get_surrounding_teffs, round_teff, clip_teff
+from VSPEC.helpers.teff import arrange_teff, get_surrounding_teffs, round_teff, clip_teff, get_required_teffs
 from VSPEC.helpers.coordinate_grid import CoordinateGrid
 from VSPEC.helpers.geometry import get_angle_between, proj_ortho, calc_circ_fraction_inside_unit_circle
 from VSPEC.helpers.files import check_and_build_dir, get_filename
+from VSPEC.helpers.compilation import enable_compilation_cache
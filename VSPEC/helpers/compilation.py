@@ -0,0 +1,31 @@
+"""
+Helpers for JAX compilation
+"""
+from pathlib import Path
+import jax
+
+from VSPEC import config
+
+
+def enable_compilation_cache(path: Path = None) -> bool:
+    """
+    Store compiled JAX functions on disk so that later processes can reuse them.
+
+    Parameters
+    ----------
+    path : pathlib.Path, default=None
+        The cache directory. Defaults to ``VSPEC.config.JAX_CACHE_PATH``.
+
+    Returns
+    -------
+    bool
+        ``True`` if the cache was enabled, ``False`` if no path was set.
+    """
+    path = config.JAX_CACHE_PATH if path is None else path
+    if path is None:
+        return False
+    Path(path).mkdir(parents=True, exist_ok=True)
+    jax.config.update('jax_compilation_cache_dir', str(path))
+    # our functions compile quickly, but there are many short runs
+    jax.config.update('jax_persistent_cache_min_compile_time_secs', 0.0)
+    return True
@@ -117,20 +117,42 @@ def read_lyr(filename: str) -> pd.DataFrame:
     pandas.DataFrame
         DataFrame containing the layer data.
     """
-    lines = []
     with open(filename, 'r', encoding='UTF-8') as file:
-        save = False
-        for line in file:
-            if 'Alt[km]' in line:
-                save = True
-            if save:
-                if '--' in line:
-                    if len(lines) > 2:
-                        save = False
-                    else:
-                        pass
+        return parse_lyr(file.read())
+
+
+def parse_lyr(content: str) -> pd.DataFrame:
+    """
+    Parse the content of a PSG layer file.
+
+    Parameters
+    ----------
+    content : str
+        The content of a ``.lyr`` file.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame containing the layer data.
+
+    Raises
+    ------
+    ValueError
+        If no layer data is found.
+    """
+    lines = []
+    save = False
+    for line in content.splitlines(keepends=True):
+        if 'Alt[km]' in line:
+            save = True
+        if save:
+            if '--' in line:
+                if len(lines) > 2:
+                    save = False
                 else:
-                    lines.append(line[2:-1])
+                    pass
+            else:
+                lines.append(line[2:-1])
     if len(lines) == 0:
         raise ValueError('No data was captured. Perhaps the format is wrong.')
     dat = StringIO('\n'.join(lines[1:]))
@@ -139,4 +161,4 @@ def read_lyr(filename: str) -> pd.DataFrame:
         # get previous parameter (e.g 'water' for 'water_size')
         if 'size' in name:
             names[i] = names[i-1] + '_' + name
-    return pd.read_csv(dat, delim_whitespace=True, names=names)
+    return pd.read_csv(dat, sep=r'\s+', names=names)
@@ -171,3 +171,59 @@ def clip_teff(teff: u.Quantity):
         return low
     else:
         return teff
+
+
+
+def get_required_teffs(starparams, nsigma: float = 3.0) -> u.Quantity:
+    """
+    Get the grid temperatures a star can produce.
+
+    The photosphere, granulation, spot umbra and penumbra temperatures are
+    fixed by the parameters. Facula walls and floors change temperature as
+    the facula grows, so the range spanned by radii within `nsigma` of the
+    peak of the radius distribution is used.
+
+    Parameters
+    ----------
+    starparams : VSPEC.params.StarParameters
+        The parameters of the stellar model.
+    nsigma : float, default=3.0
+        The width of the facula radius distribution to cover,
+        in standard deviations.
+
+    Returns
+    -------
+    astropy.units.Quantity
+        The sorted grid temperatures, in steps of 100 K, needed to
+        interpolate every temperature the star can produce.
+    """
+    teff = starparams.teff
+    ranges = [(teff, teff)]
+    granulation = starparams.granulation
+    if granulation.mean > 0 or granulation.amp > 0:
+        ranges.append((teff - granulation.dteff,)*2)
+    spots = starparams.spots
+    if spots.initial_coverage > 0 or spots.equillibrium_coverage > 0:
+        ranges.append((spots.teff_umbra,)*2)
+        ranges.append((spots.teff_penumbra,)*2)
+    faculae = starparams.faculae
+    if faculae.equillibrium_coverage > 0:
+        spread = 10**(nsigma*faculae.logsigma_radius)
+        # a facula is removed once it shrinks to 1/e^2 of its maximum radius
+        r_low = faculae.mean_radius/spread/np.e**2
+        r_high = faculae.mean_radius*spread
+        wall = teff + faculae.wall_teff_slope * \
+            u.Quantity([r_low, r_high]) + faculae.wall_teff_intercept
+        ranges.append((wall.min(), wall.max()))
+        if r_high > faculae.floor_teff_min_rad:
+            radii = u.Quantity([max(r_low, faculae.floor_teff_min_rad), r_high])
+            floor = teff + (radii - faculae.floor_teff_min_rad) * \
+                faculae.floor_teff_slope + faculae.floor_teff_base_dteff
+            ranges.append((floor.min(), floor.max()))
+    low, high = config.grid_teff_bounds
+    teffs = set()
+    for minteff, maxteff in ranges:
+        minteff = np.clip(minteff.to(config.teff_unit), low, high)
+        maxteff = np.clip(maxteff.to(config.teff_unit), low, high)
+        teffs.update(arrange_teff(minteff, maxteff).to_value(config.teff_unit))
+    return np.array(sorted(teffs))*config.teff_unit
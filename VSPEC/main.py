@@ -8,6 +8,8 @@ and PSG.
 
 from pathlib import Path
 import typing
+import json
+import asyncio
 
 import numpy as np
 import pandas as pd
@@ -15,18 +17,26 @@ from astropy import units as u
 from tqdm.auto import tqdm
 import warnings
 from functools import partial
+from collections import OrderedDict
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
 
 from VSPEC import variable_star_model as vsm
 from VSPEC.config import PSG_CFG_MAX_LINES, N_ZFILL
 from VSPEC import config
 from VSPEC.geometry import SystemGeometry, plan_to_df
-from VSPEC.helpers import isclose, is_port_in_use, arrange_teff, get_surrounding_teffs
+from VSPEC.helpers import isclose, is_port_in_use, arrange_teff, get_surrounding_teffs, get_required_teffs
 from VSPEC.helpers import check_and_build_dir, get_filename
 from VSPEC.helpers import get_planet_indicies, read_lyr
-from VSPEC.psg_api import call_api, PSGrad, get_reflected, cfg_to_bytes
-from VSPEC.psg_api import change_psg_parameters, parse_full_output, cfg_to_dict
+from VSPEC.helpers import enable_compilation_cache
+from VSPEC.psg_api import PSGClient, AsyncPSGClient, PSGrad, get_reflected, cfg_to_bytes
+from VSPEC.psg_api import change_psg_parameters, parse_full_output, cfg_to_dict, count_cfg_lines
+from VSPEC.psg_cache import PSGCache
+from VSPEC.manifest import PhaseManifest
+from VSPEC.psg_store import PSGStore
 from VSPEC.params.read import InternalParameters 
-from VSPEC.spectra import GridSpectra, get_wavelengths, ForwardSpectra
+from VSPEC.spectra import LazyGridSpectra, ChunkedGridSpectra, get_wavelengths, ForwardSpectra
 
 
 class ObservationModel:
@@ -51,6 +61,11 @@ class ObservationModel:
     rng : numpy.random.Generator
         A psudo-random number generator to be used in
         the simulation.
+    psg_client : VSPEC.psg_api.PSGClient
+        The client used for every call to PSG.
+    metadata : dict
+        Information about the run, such as compilation time, that is
+        written to ``run_metadata.json``.
     """
 
     def __init__(
@@ -65,6 +80,13 @@ class ObservationModel:
         self.build_directories()
         self.star = None
         self.rng = np.random.default_rng(self.params.header.seed)
+        self._wl_cache = None
+        self._psg_client = None
+        self._psg_output_cache = OrderedDict()
+        self._run_key_prefix = None
+        self._gcm_lock = Lock()
+        self.metadata = {}
+        enable_compilation_cache()
         self.spec = self.load_spectra()
         self.bb = ForwardSpectra.blackbody()
 
@@ -81,20 +103,6 @@ class ObservationModel:
         params = InternalParameters.from_yaml(config_path)
         return cls(params)
 
-    class __flags__:
-        """
-        Flags attribute
-
-        Attributes
-        ----------
-        psg_needs_set : bool
-            For security reasons, PSG config files can contain a
-            maximum of ~2000 lines. After that number, the server
-            will no longer update after our API call. In this case,
-            we issue the `set` command. Unfortuantely, we must re-
-            upload the GCM.
-        """
-        psg_needs_set = True
     _directories = {
         'parent': '',
         'all_model': 'AllModelSpectraValues',
@@ -155,20 +163,54 @@ class ObservationModel:
 
         Returns
         -------
-        VSPEC.spectra.GridSpec
+        VSPEC.spectra.LazyGridSpectra or VSPEC.spectra.ChunkedGridSpectra
             The spectal grid object to draw stellar spectra from.
+
+        Notes
+        -----
+        If ``header.spectral_grid`` is set, spectra are read from that
+        chunked grid file and interpolated in Teff, log g, and [Fe/H]. The
+        file should be built at the resolving power and line spread function
+        of the instrument, because it is only resampled onto ``wl``.
+
+        Otherwise, the grid spans ``header.teff_min`` to ``header.teff_max``,
+        but only the nodes the stellar model can use (see
+        ``VSPEC.helpers.get_required_teffs``) are loaded up front. Any
+        other node is loaded the first time it is needed.
         """
+        bandpass = self.params.inst.bandpass
+        if self.params.header.spectral_grid is not None:
+            return ChunkedGridSpectra(
+                self.params.header.spectral_grid,
+                w1 = bandpass.wl_blue,
+                w2 = bandpass.wl_red
+            )
         teffs = arrange_teff(
             self.params.header.teff_min,
             self.params.header.teff_max
         )
-        spec = GridSpectra.from_vspec(
-            w1 = self.params.inst.bandpass.wl_blue,
-            w2 = self.params.inst.bandpass.wl_red,
-            R = self.params.inst.bandpass.resolving_power,
-            teffs = teffs
+        spec = LazyGridSpectra(
+            w1 = bandpass.wl_blue,
+            w2 = bandpass.wl_red,
+            R = bandpass.resolving_power,
+            teffs = teffs,
+            lsf = bandpass.lsf
         )
+        spec.preload(get_required_teffs(self.params.star))
         return spec
+
+    def _grid_point(self, teff: u.Quantity) -> tuple:
+        """
+        Get the point on the spectral grid of a region with effective temperature `teff`.
+
+        A chunked grid is also evaluated at the log g and [Fe/H] of the
+        star. If either is ``None``, that axis of the grid must have a single node.
+        """
+        point = (teff.to_value(config.teff_unit),)
+        if isinstance(self.spec, ChunkedGridSpectra):
+            point += (self.params.star.logg, self.params.star.feh)
+        return point
+
     @property
     def wl(self):
         """
@@ -178,12 +220,27 @@ class ObservationModel:
         -------
         wl : astropy.units.Quantity
             The wavelength axis.
+
+        Notes
+        -----
+        The axis is computed once and reused for the rest of the run
+        unless the bandpass changes. The returned array is read-only.
         """
-        return get_wavelengths(
-            resolving_power=self.params.inst.bandpass.resolving_power,
-            lam1=self.params.inst.bandpass.wl_blue.to_value(config.wl_unit),
-            lam2=self.params.inst.bandpass.wl_red.to_value(config.wl_unit)
-        )[:-1]*config.wl_unit
+        bandpass = self.params.inst.bandpass
+        key = (
+            bandpass.resolving_power,
+            bandpass.wl_blue.to_value(config.wl_unit),
+            bandpass.wl_red.to_value(config.wl_unit)
+        )
+        if self._wl_cache is None or self._wl_cache[0] != key:
+            wl = get_wavelengths(
+                resolving_power=key[0],
+                lam1=key[1],
+                lam2=key[2]
+            )[:-1]*config.wl_unit
+            wl.flags.writeable = False
+            self._wl_cache = (key, wl)
+        return self._wl_cache[1]
     
     def get_model_spectrum(self,teff:u.Quantity):
         """
@@ -201,9 +258,15 @@ class ObservationModel:
         
         Notes
         -----
-        This function applies the solid angle correction.
+        This function applies the solid angle correction. Spectra
+        are memoized by ``GridSpectra.evaluate_cached``.
         """
-        return self.spec.evaluate(self.wl,teff.to_value(config.teff_unit))*self.params.flux_correction*config.flux_unit
+        flux = self.spec.evaluate_cached(
+            self.wl,
+            *self._grid_point(teff),
+            scale=self.params.flux_correction
+        )
+        return flux*config.flux_unit
     
 
     def get_observation_parameters(self) -> SystemGeometry:
@@ -260,10 +323,39 @@ class ObservationModel:
         return observation_parameters.get_observation_plan(self.params.planet.init_phase,
                                                            self.params.obs.observation_time, N_obs=N_obs)
 
-    def check_psg(self):
+    @property
+    def psg_client(self) -> PSGClient:
+        """
+        The client used for every call to PSG.
+
+        Returns
+        -------
+        VSPEC.psg_api.PSGClient
+            A client with a pooled connection to ``params.psg.url``.
+
+        Notes
+        -----
+        The client is created on first use and reused for the rest of the
+        run unless the URL or API key changes.
+        """
+        url = self.params.psg.url
+        api_key = self.params.psg.api_key.value
+        client = self._psg_client
+        if client is None or client.psg_url != url or client.api_key != api_key:
+            if client is not None:
+                client.close()
+            self._psg_client = PSGClient(psg_url=url, api_key=api_key)
+        return self._psg_client
+
+    def check_psg(self, psg_url: str = None):
         """
         Check that PSG is running
 
+        Parameters
+        ----------
+        psg_url : str, default=None
+            The URL to check. If ``None``, use ``params.psg.url``.
+
         Raises
         ------
         RuntimeError
@@ -275,7 +367,7 @@ class ObservationModel:
         RuntimeWarning
             If calling the online PSG API, but no API key is specified.
         """
-        psg_url = self.params.psg.url
+        psg_url = self.params.psg.url if psg_url is None else psg_url
         if 'localhost' in psg_url:
             port = int(psg_url.split(':')[-1])
             if not is_port_in_use(port):
@@ -287,43 +379,71 @@ class ObservationModel:
             msg += 'We suggest installing PSG locally using docker. (see https://psg.gsfc.nasa.gov/help.php#handbook)'
             warnings.warn(msg, RuntimeWarning)
 
-    def upload_gcm(self, obstime: u.Quantity = 0*u.s, update=False):
+    def get_gcm_content(self, obstime: u.Quantity = 0*u.s) -> bytes:
         """
-        Upload GCM file to PSG
+        Get the GCM that is uploaded to PSG.
 
         Parameters
         ----------
-        is_ncdf : bool
-            Whether or not to use a netCDF file for the GCM
         obstime : astropy.units.Quantity, default=0*u.s
             The time since the start of the observation.
-        update : bool
-            Whether to use the `'upd'` keyword rather than `'set'`
+
+        Returns
+        -------
+        bytes
+            The content of the GCM.
+
+        Notes
+        -----
+        Reads are serialized, since netCDF4 and HDF5 are not thread-safe
+        and ``build_planet`` may run several phases at once.
         """
         if self.params.gcm.gcmtype == 'waccm':
             kwargs = {'obs_time': obstime}
         else:
             kwargs = {}
-        content = self.params.gcm.content(**kwargs)
-        call_api(
-            psg_url=self.params.psg.url,
-            api_key=self.params.psg.api_key.value,
+        with self._gcm_lock:
+            return self.params.gcm.content(**kwargs)
+
+    def upload_gcm(self, obstime: u.Quantity = 0*u.s, update=False, client: PSGClient = None, content: bytes = None):
+        """
+        Upload GCM file to PSG
+
+        Parameters
+        ----------
+        obstime : astropy.units.Quantity, default=0*u.s
+            The time since the start of the observation.
+        update : bool
+            Whether to use the `'upd'` keyword rather than `'set'`
+        client : VSPEC.psg_api.PSGClient, default=None
+            The client to upload with. If ``None``, use ``self.psg_client``.
+        content : bytes, default=None
+            The GCM at `obstime`, if it has already been read.
+        """
+        client = self.psg_client if client is None else client
+        if content is None:
+            content = self.get_gcm_content(obstime)
+        client.call(
             output_type='upd' if update else 'set',
             app='globes',
             config_data=content
         )
         if not update:
-            self.__flags__.psg_needs_set = False
+            client.needs_set = False
 
-    def set_static_config(self):
+    def set_static_config(self, client: PSGClient = None):
         """
         Upload the non-changing parts of the PSG config.
+
+        Parameters
+        ----------
+        client : VSPEC.psg_api.PSGClient, default=None
+            The client to upload with. If ``None``, use ``self.psg_client``.
         """
+        client = self.psg_client if client is None else client
         params = self.params.to_psg()
         content = cfg_to_bytes(params)
-        call_api(
-            psg_url=self.params.psg.url,
-            api_key=self.params.psg.api_key.value,
+        client.call(
             output_type='upd',
             app='globes',
             config_data=content
@@ -337,7 +457,8 @@ class ObservationModel:
         sub_stellar_lat: u.Quantity,
         pl_sub_obs_lon: u.Quantity,
         pl_sub_obs_lat: u.Quantity,
-        include_star: bool
+        include_star: bool,
+        client: PSGClient = None
     ):
         """
         Update the PSG config with time-dependent values.
@@ -359,7 +480,10 @@ class ObservationModel:
             The sub-observer latitude of the planet.
         include_star : bool
             Whether to include the star in the simulation.
+        client : VSPEC.psg_api.PSGClient, default=None
+            The client to upload with. If ``None``, use ``self.psg_client``.
         """
+        client = self.psg_client if client is None else client
         params = change_psg_parameters(
             params=self.params,
             phase=phase,
@@ -371,15 +495,13 @@ class ObservationModel:
             include_star=include_star
         )
         content = cfg_to_bytes(params)
-        call_api(
-            psg_url=self.params.psg.url,
-            api_key=self.params.psg.api_key.value,
+        client.call(
             output_type='upd',
             app='globes',
             config_data=content
         )
 
-    def check_config(self, cfg_from_psg):
+    def check_config(self, cfg_from_psg, client: PSGClient = None, run_config: dict = None):
         """
         Validate the config file recieved from PSG to ensure that
         the parameters sent are the parameters used in the simulation.
@@ -389,17 +511,33 @@ class ObservationModel:
         cfg_from_psg : str
             A string containing the contents of the config file
             recieved from PSG
+        client : VSPEC.psg_api.PSGClient, default=None
+            The client that recieved the config. Its estimate of the
+            config length is corrected, and if the config is too long
+            it is marked as needing a ``set``. If ``None``, use
+            ``self.psg_client``.
+        run_config : dict, default=None
+            The time-dependent config of the run, such as the output of
+            ``VSPEC.psg_api.change_psg_parameters``. It replaces the
+            expected value of any key that it shares with ``params.to_psg()``,
+            for example the star type of a run without the star.
 
         Raises
         ------
         RuntimeError
             If the config recieved does not match the config sent.
         """
-        n_lines = len(cfg_from_psg.split('\n'))
+        client = self.psg_client if client is None else client
+        n_lines = count_cfg_lines(cfg_from_psg)
+        client.cfg_lines = n_lines
+        client.cfg_checked = True
         if n_lines > PSG_CFG_MAX_LINES:
-            self.__flags__.psg_needs_set = True
+            client.needs_set = True
         cfg_dict = cfg_to_dict(cfg_from_psg)
         expected_cfg = self.params.to_psg()
+        if run_config is not None:
+            expected_cfg.update(
+                {key: value for key, value in run_config.items() if key in expected_cfg})
         msg = ''
         for key, value in expected_cfg.items():
             try:
@@ -417,55 +555,429 @@ class ObservationModel:
         if not msg == '':
             raise RuntimeError(f'PSG config validation error:\n{msg}')
 
-    def run_psg(self, path_dict: dict, i: int):
+    def write_psg_output(self, output_data: dict, path_dict: dict, i: int):
         """
-        Run PSG
+        Write the files of a parsed PSG run.
 
         Parameters
         ----------
+        output_data : dict
+            The output of ``VSPEC.psg_api.parse_full_output``.
         path_dict : dict
             A dictionary that determines where each downloaded file
             gets written to.
+        i : int
+            The index of the phase, used to name the files.
+
+        Notes
+        -----
+        If ``params.psg.store_outputs`` is set, the files are added to
+        ``psg_store`` instead, each named after its directory.
+        """
+        files = []
+        for key, path in path_dict.items():
+            if key == 'lyr' and self.params.psg.use_molecular_signatures is False:
+                content = b''
+            else:
+                content = output_data[bytes(key, encoding='UTF-8')]
+            files.append((key, path, content))
+        if self.params.psg.store_outputs:
+            self.psg_store.write(i, [(path.name, key, content) for key, path, content in files])
+            return
+        for key, path, content in files:
+            with open(path/get_filename(i, N_ZFILL, key), 'wb') as file:
+                file.write(content)
+
+    def _get_run_content(self, phase_config: dict = None) -> bytes:
+        """
+        Get the config sent with a request to run PSG.
         """
         content = bytes(
             f'<OBJECT-NAME>{self.params.planet.name}', encoding='UTF-8')
-        response = call_api(
-            psg_url=self.params.psg.url,
-            api_key=self.params.psg.api_key.value,
+        if phase_config is not None:
+            content += b'\n' + cfg_to_bytes(phase_config)
+        return content
+
+    @staticmethod
+    def _should_check_config(i: int, client: PSGClient) -> bool:
+        """
+        Whether to check the config returned for phase `i`.
+        """
+        return (not client.cfg_checked) or i % config.PSG_CFG_CHECK_INTERVAL == 0
+
+    def _check_run(
+        self,
+        output_data: dict,
+        path_dict: dict,
+        i: int,
+        client: PSGClient,
+        run_config: dict = None,
+        to_cache: bool = False
+    ) -> bool:
+        """
+        Check the config returned by a PSG run if a check is due, or if the
+        response is going to be cached. Return whether it was checked.
+        """
+        due = 'cfg' in path_dict and self._should_check_config(i, client)
+        if not due and not (to_cache and b'cfg' in output_data):
+            return False
+        self.check_config(str(output_data[b'cfg'], encoding='UTF-8'),
+                          client=client, run_config=run_config)
+        return True
+
+    def run_psg(
+        self,
+        path_dict: dict,
+        i: int,
+        client: PSGClient = None,
+        cache: PSGCache = None,
+        cache_key: str = None,
+        phase_config: dict = None,
+        run_config: dict = None
+    ):
+        """
+        Run PSG
+
+        Parameters
+        ----------
+        path_dict : dict
+            A dictionary that determines where each downloaded file
+            gets written to.
+        i : int
+            The index of the phase, used to name the files.
+        client : VSPEC.psg_api.PSGClient, default=None
+            The client to run with. If ``None``, use ``self.psg_client``.
+        cache : VSPEC.psg_cache.PSGCache, default=None
+            A cache to store the response in. The config returned with
+            every response is checked before it is stored.
+        cache_key : str, default=None
+            The key to store the response under.
+        phase_config : dict, default=None
+            Config values to send along with the request, such as the
+            output of ``VSPEC.psg_api.change_psg_parameters``.
+        run_config : dict, default=None
+            The time-dependent config of the run, used when the returned
+            config is checked. Defaults to `phase_config`.
+        """
+        client = self.psg_client if client is None else client
+        content = self._get_run_content(phase_config)
+        response = client.call(
             output_type='all',
             app='globes',
             config_data=content
         )
         output_data = parse_full_output(response)
-        for key, path in path_dict.items():
-            filename = get_filename(i, N_ZFILL, key)
-            key = bytes(key, encoding='UTF-8')
-            with open(path/filename, 'wb') as file:
-                if not (key == b'lyr' and self.params.psg.use_molecular_signatures is False):
-                    file.write(output_data[key])
-                if key == b'cfg':
-                    self.check_config(str(output_data[key], encoding='UTF-8'))
+        self.write_psg_output(output_data, path_dict, i)
+        run_config = phase_config if run_config is None else run_config
+        checked = self._check_run(output_data, path_dict, i, client,
+                                  run_config, to_cache=cache is not None)
+        if cache is not None and checked:
+            cache.put(cache_key, response)
+
+    async def run_psg_async(
+        self,
+        path_dict: dict,
+        i: int,
+        client: AsyncPSGClient,
+        cache: PSGCache = None,
+        cache_key: str = None,
+        phase_config: dict = None,
+        run_config: dict = None
+    ) -> asyncio.Future:
+        """
+        Run PSG without blocking the event loop.
 
-    def build_planet(self):
+        The caller should hold ``client.lock``. The config is checked
+        before returning, so a needed reset is seen by the next task to
+        acquire the lock, but the files are written in the background.
+
+        Parameters
+        ----------
+        path_dict : dict
+            A dictionary that determines where each downloaded file
+            gets written to.
+        i : int
+            The index of the phase, used to name the files.
+        client : VSPEC.psg_api.AsyncPSGClient
+            The client to run with.
+        cache : VSPEC.psg_cache.PSGCache, default=None
+            A cache to store the response in. The config returned with
+            every response is checked before it is stored.
+        cache_key : str, default=None
+            The key to store the response under.
+        phase_config : dict, default=None
+            Config values to send along with the request.
+        run_config : dict, default=None
+            The time-dependent config of the run, used when the returned
+            config is checked. Defaults to `phase_config`.
+
+        Returns
+        -------
+        asyncio.Future
+            Completes when the files have been written.
         """
-        Use the PSG GlobES API to construct a planetary phase curve.
-        Follow steps in original PlanetBuilder.py file
+        content = self._get_run_content(phase_config)
+        response = await client.call(
+            output_type='all',
+            app='globes',
+            config_data=content
+        )
+        output_data = parse_full_output(response)
+        run_config = phase_config if run_config is None else run_config
+        checked = self._check_run(output_data, path_dict, i, client.client,
+                                  run_config, to_cache=cache is not None)
+        if cache is not None and checked:
+            await asyncio.to_thread(cache.put, cache_key, response)
+        return asyncio.ensure_future(
+            asyncio.to_thread(self.write_psg_output, output_data, path_dict, i)
+        )
 
+    def _update_gcm(self, obs_time: u.Quantity, client: PSGClient, gcm_content: bytes = None) -> bool:
         """
-        # check that psg is running
-        self.check_psg()
-        # for not using globes, append all configurations instead of rewritting
+        Upload the GCM if it changes with time, or reset PSG if it needs a ``set``.
+        Return whether PSG was reset.
+        """
+        # reset before a phase that is expected to take the config past the limit,
+        # rather than after PSG returns a config that is too long
+        if client.cfg_lines + client.cfg_growth > PSG_CFG_MAX_LINES:
+            client.needs_set = True
+        reset = client.needs_set
+        if (not self.params.gcm.is_staic) or client.needs_set:
+            # enter if we need a reset or if there is time dependence
+            upload = partial(self.upload_gcm, obstime=obs_time, client=client, content=gcm_content)
+            if client.needs_set:  # do a reset if needed
+                upload(update=False)
+                self.set_static_config(client=client)
+            else:  # update if it's just time dependence.
+                upload(update=True)
+        return reset
+
+    def _get_phase_runs(self, obs_plan: dict, i: int) -> typing.List[tuple]:
+        """
+        Get the ``update_config`` keywords and output paths of the two PSG runs of a phase.
+        """
+        geometry = dict(
+            phase=obs_plan['phase'][i],
+            orbit_radius_coeff=obs_plan['orbit_radius'][i],
+            sub_stellar_lon=obs_plan['sub_stellar_lon'][i],
+            sub_stellar_lat=obs_plan['sub_stellar_lat'][i],
+            pl_sub_obs_lon=obs_plan['planet_sub_obs_lon'][i],
+            pl_sub_obs_lat=obs_plan['planet_sub_obs_lat'][i]
+        )
+        # Write updates to the config to change the phase value and ensure the star is of type 'StarType'
+        combined = {
+            'rad': Path(self.directories['psg_combined']),
+            'noi': Path(self.directories['psg_noise']),
+            'cfg': Path(self.directories['psg_configs'])
+        }
+        # write updates to config file to remove star flux
+        thermal = {
+            'rad': Path(self.directories['psg_thermal']),
+            'lyr': Path(self.directories['psg_layers'])
+        }
+        return [
+            (dict(geometry, include_star=True), combined),
+            (dict(geometry, include_star=False), thermal)
+        ]
+
+    def _get_phase_gcm(self, obs_time: u.Quantity) -> typing.Union[bytes, None]:
+        """
+        Read the GCM of a phase if it changes with time, so that it is
+        read once for both the run keys and the upload.
+        """
+        return None if self.params.gcm.is_staic else self.get_gcm_content(obs_time)
 
-        ####################################
-        # Initial upload of GCM
+    def _get_run_keys(self, obs_time: u.Quantity, runs: typing.List[tuple], gcm_content: bytes = None) -> typing.List[str]:
+        """
+        Get the ``VSPEC.psg_cache.PSGCache`` key of each PSG run of a phase.
+        A static GCM is read and hashed once per build.
+        """
+        if self.params.gcm.is_staic and self._run_key_prefix is not None:
+            prefix = self._run_key_prefix
+        else:
+            if gcm_content is None:
+                gcm_content = self.get_gcm_content(obs_time)
+            prefix = PSGCache.get_prefix(gcm_content, cfg_to_bytes(self.params.to_psg()))
+            if self.params.gcm.is_staic:
+                self._run_key_prefix = prefix
+        return [
+            PSGCache.get_key_from_prefix(
+                prefix, cfg_to_bytes(change_psg_parameters(params=self.params, **kwargs)))
+            for kwargs, _ in runs
+        ]
+
+    def _read_phase_cache(
+        self,
+        obs_time: u.Quantity,
+        runs: typing.List[tuple],
+        cache: PSGCache = None,
+        manifest: PhaseManifest = None,
+        gcm_content: bytes = None
+    ) -> typing.List[tuple]:
+        """
+        Get the key and cached output (or ``None``) of each PSG run of a phase.
+        """
+        if cache is None and manifest is None:
+            return [(None, None)]*len(runs)
+        keys = self._get_run_keys(obs_time, runs, gcm_content)
+        return [(key, None if cache is None else cache.get(key)) for key in keys]
 
-        self.upload_gcm(
-            obstime=0*u.s,
-            update=False
-        )
-        ####################################
-        # Set observation parameters that do not change
-        self.set_static_config()
+    def _record_phase(self, manifest: PhaseManifest, i: int, runs: typing.List[tuple], keys: typing.List[str]):
+        """
+        Add a finished phase to the manifest.
+        """
+        if self.params.psg.store_outputs:
+            files = [self.psg_store.path]
+        else:
+            files = [path/get_filename(i, N_ZFILL, key) for _, path_dict in runs for key, path in path_dict.items()]
+        manifest.add(i, manifest.get_phase_hash(keys), files)
+
+    def build_phase(
+        self,
+        obs_plan: dict,
+        i: int,
+        client: PSGClient = None,
+        cache: PSGCache = None,
+        manifest: PhaseManifest = None
+    ):
+        """
+        Run PSG for one phase of the planetary phase curve.
+
+        Parameters
+        ----------
+        obs_plan : dict
+            The observation plan of the planet.
+        i : int
+            The index of the phase in `obs_plan`.
+        client : VSPEC.psg_api.PSGClient, default=None
+            The client to run with. If ``None``, use ``self.psg_client``.
+        cache : VSPEC.psg_cache.PSGCache, default=None
+            A cache of PSG responses. Runs found in it are written without
+            calling PSG, and the others are added to it.
+        manifest : VSPEC.manifest.PhaseManifest, default=None
+            A manifest to record the phase in once its files are written.
+        """
+        client = self.psg_client if client is None else client
+        obs_time = obs_plan['time'][i] - obs_plan['time'][0]
+        runs = self._get_phase_runs(obs_plan, i)
+        gcm_content = self._get_phase_gcm(obs_time)
+        entries = self._read_phase_cache(obs_time, runs, cache, manifest, gcm_content)
+        gcm_ready = False
+        for (kwargs, path_dict), (key, output_data) in zip(runs, entries):
+            if output_data is not None:
+                self.write_psg_output(output_data, path_dict, i)
+                continue
+            if not gcm_ready:
+                upd_lines = client.upd_lines
+                reset = self._update_gcm(obs_time, client, gcm_content)
+                gcm_ready = True
+            run_config = change_psg_parameters(params=self.params, **kwargs)
+            if self.params.psg.single_request:
+                phase_config = run_config
+            else:
+                self.update_config(**kwargs, client=client)
+                phase_config = None
+            self.run_psg(path_dict, i, client=client, cache=cache, cache_key=key,
+                         phase_config=phase_config, run_config=run_config)
+        if gcm_ready and not reset:
+            client.cfg_growth = client.upd_lines - upd_lines
+        if manifest is not None:
+            self._record_phase(manifest, i, runs, [key for key, _ in entries])
+
+    async def build_phase_async(
+        self,
+        obs_plan: dict,
+        i: int,
+        client: AsyncPSGClient,
+        semaphore: asyncio.Semaphore,
+        cache: PSGCache = None,
+        manifest: PhaseManifest = None,
+        previous: asyncio.Event = None,
+        queued: asyncio.Event = None
+    ):
+        """
+        Run PSG for one phase of the planetary phase curve without blocking the event loop.
+
+        The GCM and the cache are read in a worker thread. The calls that
+        depend on the config stored by PSG are made while holding
+        ``client.lock``, and the files are written after it is released,
+        so the next phase can be sent while this one is saved.
+
+        Parameters
+        ----------
+        obs_plan : dict
+            The observation plan of the planet.
+        i : int
+            The index of the phase in `obs_plan`.
+        client : VSPEC.psg_api.AsyncPSGClient
+            The client to run with.
+        semaphore : asyncio.Semaphore
+            Limits the number of PSG instances called at once.
+        cache : VSPEC.psg_cache.PSGCache, default=None
+            A cache of PSG responses. Runs found in it are written without
+            calling PSG, and the others are added to it.
+        manifest : VSPEC.manifest.PhaseManifest, default=None
+            A manifest to record the phase in once its files are written.
+        previous : asyncio.Event, default=None
+            Set by the previous phase on `client` once it has asked for
+            ``client.lock``. This phase waits for it before asking.
+        queued : asyncio.Event, default=None
+            Set once this phase has asked for ``client.lock``, or has
+            found that it does not need it.
+        """
+        obs_time = obs_plan['time'][i] - obs_plan['time'][0]
+        runs = self._get_phase_runs(obs_plan, i)
+        try:
+            gcm_content = await asyncio.to_thread(self._get_phase_gcm, obs_time)
+            entries = await asyncio.to_thread(
+                self._read_phase_cache, obs_time, runs, cache, manifest, gcm_content)
+            if previous is not None:
+                await previous.wait()
+        finally:
+            # nothing is awaited between here and asking for the lock,
+            # so tasks ask for it in phase order
+            if queued is not None:
+                queued.set()
+        writes = []
+        misses = []
+        for (kwargs, path_dict), (key, output_data) in zip(runs, entries):
+            if output_data is None:
+                misses.append((kwargs, path_dict, key))
+            else:
+                writes.append(asyncio.ensure_future(
+                    asyncio.to_thread(self.write_psg_output, output_data, path_dict, i)))
+        if len(misses) > 0:
+            async with client.lock, semaphore:
+                upd_lines = client.client.upd_lines
+                reset = await asyncio.to_thread(self._update_gcm, obs_time, client.client, gcm_content)
+                for kwargs, path_dict, key in misses:
+                    run_config = change_psg_parameters(params=self.params, **kwargs)
+                    if self.params.psg.single_request:
+                        phase_config = run_config
+                    else:
+                        await asyncio.to_thread(partial(self.update_config, **kwargs, client=client.client))
+                        phase_config = None
+                    writes.append(await self.run_psg_async(
+                        path_dict, i, client, cache=cache, cache_key=key,
+                        phase_config=phase_config, run_config=run_config))
+                if not reset:
+                    client.client.cfg_growth = client.client.upd_lines - upd_lines
+        await asyncio.gather(*writes)
+        if manifest is not None:
+            self._record_phase(manifest, i, runs, [key for key, _ in entries])
+
+    def _start_build_planet(self, psg_urls: typing.List[str] = None) -> typing.Tuple[typing.List[PSGClient], dict]:
+        """
+        Get a client for each PSG instance, check that they are running, and write the observation plan.
+        """
+        if psg_urls is None:
+            clients = [self.psg_client]
+        else:
+            api_key = self.params.psg.api_key.value
+            clients = [PSGClient(psg_url=url, api_key=api_key) for url in psg_urls]
+        # check that psg is running
+        for client in clients:
+            self.check_psg(client.psg_url)
 
         ####################################
         # Calculate observation parameters
@@ -475,6 +987,10 @@ class ObservationModel:
 
         obs_info_filename = Path(self.directories['parent']) / 'observation_info.csv'
         plan_to_df(obs_plan).to_csv(obs_info_filename, sep=',', index=False)
+        # the files read by an earlier build_spectra are about to be replaced
+        self._psg_output_cache.clear()
+        # the GCM or config may have changed since the last build
+        self._run_key_prefix = None
 
         if self.verbose > 0:
             print(
@@ -482,50 +998,199 @@ class ObservationModel:
             print('Phases = ' +
                   str(np.round(np.asarray((obs_plan['phase']/u.deg).to(u.Unit(''))), 2)) + ' deg')
         ####################################
+        # Start each PSG instance with a fresh upload of the GCM and the static config
+        for client in clients:
+            client.needs_set = True
+        return clients, obs_plan
+
+    @property
+    def planet_manifest(self) -> PhaseManifest:
+        """
+        The record of the planet phases that have been built.
+
+        Returns
+        -------
+        VSPEC.manifest.PhaseManifest
+            The manifest in the parent directory of the run.
+        """
+        return PhaseManifest(Path(self.directories['parent']) / 'planet_manifest.jsonl')
+
+    @property
+    def psg_store(self) -> PSGStore:
+        """
+        The single-file store of the planet outputs, used if ``params.psg.store_outputs`` is set.
+
+        Returns
+        -------
+        VSPEC.psg_store.PSGStore
+            The store in the parent directory of the run.
+        """
+        return PSGStore(Path(self.directories['parent']) / 'psg_output.h5')
+
+    def _get_pending_phases(self, obs_plan: dict, manifest: PhaseManifest, resume: bool) -> typing.List[int]:
+        """
+        Get the phases to build. Unless resuming, the manifest is started over.
+        """
+        n_phases = self.params.planet_total_images
+        if not resume:
+            manifest.clear()
+            if self.params.psg.store_outputs:
+                self.psg_store.clear()
+            return list(range(n_phases))
+        phase_hashes = {
+            i: manifest.get_phase_hash(self._get_run_keys(
+                obs_plan['time'][i] - obs_plan['time'][0], self._get_phase_runs(obs_plan, i)))
+            for i in range(n_phases)
+        }
+        complete = manifest.get_complete(phase_hashes)
+        if self.params.psg.store_outputs:
+            store = self.psg_store
+            complete = {i for i in complete if i in store}
+        if self.verbose > 0:
+            print(f'Resuming: {len(complete)} of {n_phases} phases are already complete')
+        return [i for i in range(n_phases) if i not in complete]
+
+    @staticmethod
+    def _get_phase_blocks(phases: typing.List[int], n_clients: int) -> typing.List[np.ndarray]:
+        """
+        Split the phases into one contiguous block per PSG instance.
+        """
+        return np.array_split(np.asarray(phases, dtype=int), n_clients)
+
+    def build_planet(self, psg_urls: typing.List[str] = None, use_cache: bool = False, resume: bool = False):
+        """
+        Use the PSG GlobES API to construct a planetary phase curve.
+        Follow steps in original PlanetBuilder.py file
+
+        Parameters
+        ----------
+        psg_urls : list of str, default=None
+            The URLs of several PSG instances (for example local docker
+            containers on different ports) to share the phases between.
+            If ``None``, run every phase against ``params.psg.url``.
+        use_cache : bool, default=False
+            Whether to read and write PSG responses in the cache at
+            ``VSPEC.config.PSG_CACHE_PATH``. Runs that have been done
+            before are not sent to PSG.
+        resume : bool, default=False
+            Whether to skip the phases that ``planet_manifest`` records as
+            complete with the same config, for example after a build was
+            interrupted. PSG is set up again only for the phases that remain.
+
+        Notes
+        -----
+        PSG keeps the uploaded GCM and config between calls, so each
+        instance gets its own client that does its own ``set`` upload,
+        static config, and resets. The phases are split into one
+        contiguous block per instance, and each block is run in order,
+        so each instance gets the same sequence of calls as a serial run
+        would send for those phases. An instance starts its block from a
+        fresh ``set``, though, so if PSG's output depends on config left
+        over from earlier phases, the files can differ from a serial run.
+        """
+        clients, obs_plan = self._start_build_planet(psg_urls)
+        cache = PSGCache() if use_cache else None
+        manifest = self.planet_manifest
+        phases = self._get_pending_phases(obs_plan, manifest, resume)
+        ####################################
         # iterate through phases
-        for i in self.wrap_iterator(range(self.params.planet_total_images), desc='Build Planet', total=self.params.planet_total_images):
-            phase = obs_plan['phase'][i]
-            sub_stellar_lon = obs_plan['sub_stellar_lon'][i]
-            sub_stellar_lat = obs_plan['sub_stellar_lat'][i]
-            pl_sub_obs_lon = obs_plan['planet_sub_obs_lon'][i]
-            pl_sub_obs_lat = obs_plan['planet_sub_obs_lat'][i]
-            orbit_radius_coeff = obs_plan['orbit_radius'][i]
-            obs_time = obs_plan['time'][i] - obs_plan['time'][0]
-
-            if (not self.params.gcm.is_staic) or self.__flags__.psg_needs_set:
-                # enter if we need a reset or if there is time dependence
-                upload = partial(self.upload_gcm, obstime=obs_time)
-                if self.__flags__.psg_needs_set:  # do a reset if needed
-                    upload(update=False)
-                    self.set_static_config()
-                    self.__flags__.psg_needs_set = False
-                else:  # update if it's just time dependence.
-                    upload(update=True)
-
-            # Write updates to the config to change the phase value and ensure the star is of type 'StarType'
-            update_config = partial(
-                self.update_config,
-                phase=phase,
-                orbit_radius_coeff=orbit_radius_coeff,
-                sub_stellar_lon=sub_stellar_lon,
-                sub_stellar_lat=sub_stellar_lat,
-                pl_sub_obs_lon=pl_sub_obs_lon,
-                pl_sub_obs_lat=pl_sub_obs_lat
-            )
-            update_config(include_star=True)
-            path_dict = {
-                'rad': Path(self.directories['psg_combined']),
-                'noi': Path(self.directories['psg_noise']),
-                'cfg': Path(self.directories['psg_configs'])
-            }
-            self.run_psg(path_dict, i)
-            # write updates to config file to remove star flux
-            update_config(include_star=False)
-            path_dict = {
-                'rad': Path(self.directories['psg_thermal']),
-                'lyr': Path(self.directories['psg_layers'])
-            }
-            self.run_psg(path_dict, i)
+        try:
+            if len(clients) == 1:
+                for i in self.wrap_iterator(phases, desc='Build Planet', total=len(phases)):
+                    self.build_phase(obs_plan, i, clients[0], cache, manifest)
+            else:
+                self._build_phases_parallel(obs_plan, phases, clients, cache, manifest)
+        finally:
+            if psg_urls is not None:
+                for client in clients:
+                    client.close()
+
+    def _build_phases_parallel(
+        self,
+        obs_plan: dict,
+        phases: typing.List[int],
+        clients: typing.List[PSGClient],
+        cache: PSGCache = None,
+        manifest: PhaseManifest = None
+    ):
+        """
+        Run one block of phases per client at the same time.
+        """
+        # one single-threaded executor per client keeps each block in order
+        executors = [ThreadPoolExecutor(max_workers=1) for _ in clients]
+        try:
+            futures = [
+                executor.submit(self.build_phase, obs_plan, int(i), client, cache, manifest)
+                for executor, client, block in zip(executors, clients, self._get_phase_blocks(phases, len(clients)))
+                for i in block
+            ]
+            for future in self.wrap_iterator(as_completed(futures), desc='Build Planet', total=len(phases)):
+                future.result()
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    async def build_planet_async(
+        self,
+        psg_urls: typing.List[str] = None,
+        max_concurrency: int = None,
+        use_cache: bool = False,
+        resume: bool = False
+    ):
+        """
+        Construct a planetary phase curve like ``build_planet``, but
+        overlap the wait for PSG with parsing and writing the results.
+
+        Parameters
+        ----------
+        psg_urls : list of str, default=None
+            The URLs of several PSG instances to share the phases between.
+            If ``None``, run every phase against ``params.psg.url``.
+        max_concurrency : int, default=``VSPEC.config.PSG_MAX_CONCURRENCY``
+            The maximum number of PSG instances to send requests to at once.
+        use_cache : bool, default=False
+            Whether to read and write PSG responses in the cache at
+            ``VSPEC.config.PSG_CACHE_PATH``.
+        resume : bool, default=False
+            Whether to skip the phases that ``planet_manifest`` records as
+            complete with the same config.
+
+        Notes
+        -----
+        A task is started for every phase. Tasks that share a PSG instance
+        take turns holding its lock in the order of their phases, so each
+        instance gets its calls in the same order as a serial run. As with
+        ``build_planet``, an instance starts its block from a fresh ``set``.
+
+        Examples
+        --------
+        >>> asyncio.run(model.build_planet_async())
+        """
+        max_concurrency = config.PSG_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        clients, obs_plan = self._start_build_planet(psg_urls)
+        async_clients = [AsyncPSGClient(client) for client in clients]
+        cache = PSGCache() if use_cache else None
+        manifest = self.planet_manifest
+        phases = self._get_pending_phases(obs_plan, manifest, resume)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        tasks = []
+        for client, block in zip(async_clients, self._get_phase_blocks(phases, len(clients))):
+            previous = None
+            for i in block:
+                queued = asyncio.Event()
+                tasks.append(asyncio.ensure_future(self.build_phase_async(
+                    obs_plan, int(i), client, semaphore, cache, manifest, previous, queued)))
+                previous = queued
+        try:
+            for task in self.wrap_iterator(asyncio.as_completed(tasks), desc='Build Planet', total=len(phases)):
+                await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if psg_urls is not None:
+                for client in clients:
+                    client.close()
 
     def build_star(self):
         """
@@ -573,6 +1238,90 @@ class ObservationModel:
         self.star.get_flares_over_observation(
             self.params.obs.observation_time)
 
+    def get_spectra_matrix(self, teffs: u.Quantity) -> np.ndarray:
+        """
+        Get the interpolated spectra of several effective temperatures.
+
+        Parameters
+        ----------
+        teffs : astropy.units.Quantity
+            The effective temperatures.
+
+        Returns
+        -------
+        numpy.ndarray
+            An array with shape ``(len(teffs), len(self.wl))`` holding the flux
+            of each Teff in units of ``config.flux_unit``.
+
+        Notes
+        -----
+        This function applies the solid angle correction.
+        """
+        return self.spec.evaluate_matrix(
+            self.wl,
+            [self._grid_point(teff) for teff in teffs],
+            scale=self.params.flux_correction
+        )
+
+    def combine_spectra(self, coverages: typing.List[dict]) -> u.Quantity:
+        """
+        Compute the spectra of several surface coverage distributions.
+
+        All of the distributions are combined in a single
+        ``(len(coverages) x Teff) @ (Teff x wavelength)`` matrix product.
+
+        Parameters
+        ----------
+        coverages : list of dict
+            Each dictionary maps Teff quantities to coverage fractions,
+            as returned by ``VSPEC.variable_star_model.Star.calc_coverage``.
+
+        Returns
+        -------
+        astropy.units.Quantity
+            The flux of each distribution, with shape
+            ``(len(coverages), len(self.wl))``.
+        """
+        teffs = []
+        for coverage in coverages:
+            for teff, frac in coverage.items():
+                if frac > 0 and teff not in teffs:
+                    teffs.append(teff)
+        weights = np.array([
+            [coverage.get(teff, 0) for teff in teffs]
+            for coverage in coverages
+        ]).reshape(len(coverages), len(teffs))
+        return (weights @ self.get_spectra_matrix(teffs))*config.flux_unit
+
+    def get_flare_spectrum(self, sub_obs_coords: dict, tstart: u.Quantity, tfinish: u.Quantity) -> u.Quantity:
+        """
+        Compute the flux from flares visible during an integration window.
+
+        Parameters
+        ----------
+        sub_obs_coords : dict
+            A dictionary containing stellar sub-observer coordinates.
+        tstart : astropy.units.Quantity [time]
+            The starting time of the observation.
+        tfinish : astropy.units.Quantity [time]
+            The ending time of the observation.
+
+        Returns
+        -------
+        astropy.units.Quantity [flambda]
+            The flare flux.
+        """
+        visible_flares = self.star.get_flare_int_over_timeperiod(
+            tstart, tfinish, sub_obs_coords)
+        if len(visible_flares) == 0:
+            return np.zeros(len(self.wl))*config.flux_unit
+        teffs = u.Quantity([flare['Teff'] for flare in visible_flares])
+        timeareas = u.Quantity([flare['timearea'] for flare in visible_flares])
+        eff_areas = (timeareas/(tfinish-tstart)).to(u.km**2)
+        corrections = (eff_areas/self.params.system.distance**2).to_value(u.dimensionless_unscaled)
+        # one (flare x wavelength) block instead of one call per flare
+        return corrections @ self.bb.evaluate(self.wl, teffs)
+
     def calculate_composite_stellar_spectrum(
         self,
         sub_obs_coords,
@@ -602,15 +1351,10 @@ class ObservationModel:
 
         Returns
         -------
-        base_wave : astropy.units.Quantity [wavelength]
-            The wavelength coordinates of the stellar spectrum.
         base_flux : astropy.units.Quantity [flambda]
             The composite stellar flux
-
-        Raises
-        ------
-        ValueError
-            If wavenelength coordinates do not match.
+        pl_frac : float
+            The fraction of the planet that is visible.
         """
         total, covered, pl_frac = self.star.calc_coverage(
             sub_obs_coords,
@@ -620,39 +1364,63 @@ class ObservationModel:
             phase=phase,
             inclination=inclination
         )
-        visible_flares = self.star.get_flare_int_over_timeperiod(
-            tstart, tfinish, sub_obs_coords)
-        base_flux = self.get_model_spectrum(self.params.star.teff)
-        base_flux = base_flux * 0
-        # add up star flux before considering transit
-        for teff, coverage in total.items():
-            if coverage > 0:
-                flux = self.get_model_spectrum(teff)
-                if not flux.shape == base_flux.shape:
-                    raise ValueError('All arrays must have same shape.')
-                base_flux = base_flux + flux * coverage
-        # get flux of transited region
-        transit_flux = base_flux*0
-        for teff, coverage in covered.items():
-            if coverage > 0:
-                flux = self.get_model_spectrum(teff)
-                if not flux.shape == base_flux.shape:
-                    raise ValueError('All arrays must have same shape.')
-                transit_flux = transit_flux + flux * coverage
+        total_flux, transit_flux = self.combine_spectra([total, covered])
         # scale according to effective radius
-        transit_flux = transit_flux * transit_depth
-        base_flux = base_flux - transit_flux
-        # add in flares
-        for flare in visible_flares:
-            teff = flare['Teff']
-            timearea = flare['timearea']
-            eff_area = (timearea/(tfinish-tstart)).to(u.km**2)
-            correction = (eff_area/self.params.system.distance**2).to_value(u.dimensionless_unscaled)
-            flux = self.bb.evaluate(self.wl,teff) * correction
-            base_flux = base_flux + flux
-
+        base_flux = total_flux - transit_flux * transit_depth
+        base_flux = base_flux + self.get_flare_spectrum(sub_obs_coords, tstart, tfinish)
         return base_flux.to(config.flux_unit), pl_frac
 
+    _psg_outputs = {
+        'combined': ('psg_combined', 'rad'),
+        'thermal': ('psg_thermal', 'rad'),
+        'noise': ('psg_noise', 'noi'),
+        'layers': ('psg_layers', 'lyr')
+    }
+
+    def _read_psg_output(self, kind: str, index: int) -> typing.Union[PSGrad, pd.DataFrame]:
+        """
+        Parse an output file written by ``build_planet``, from ``psg_store`` if it is used.
+        """
+        directory, ext = self._psg_outputs[kind]
+        if self.params.psg.store_outputs:
+            return self.psg_store.get(index, Path(self.directories[directory]).name)
+        path = Path(self.directories[directory]) / get_filename(index, N_ZFILL, ext)
+        if kind == 'layers':
+            return read_lyr(path)
+        return PSGrad.from_rad(path)
+
+    def get_psg_output(self, kind: str, index: int) -> typing.Union[PSGrad, pd.DataFrame]:
+        """
+        Get a parsed PSG output file.
+
+        Files are parsed once and kept in a least recently used cache of
+        ``config.psg_output_cache_size`` entries, which is emptied at the
+        start and end of ``build_spectra``. The returned object is shared,
+        so it should not be modified.
+
+        Parameters
+        ----------
+        kind : str
+            One of ``'combined'``, ``'thermal'``, ``'noise'``, or ``'layers'``.
+        index : int
+            The planet index.
+
+        Returns
+        -------
+        VSPEC.psg_api.PSGrad or pandas.DataFrame
+            The parsed file. Layer files are returned as a DataFrame.
+        """
+        key = (kind, int(index))
+        cache = self._psg_output_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        output = self._read_psg_output(kind, index)
+        cache[key] = output
+        while len(cache) > config.psg_output_cache_size:
+            cache.popitem(last=False)
+        return output
+
     def calculate_reflected_spectra(self, N1, N2, N1_frac,
                                     sub_planet_flux, pl_frac: float):
         """
@@ -688,21 +1456,11 @@ class ObservationModel:
         ValueError
             If the wavelength coordinates from the loaded spectra do not match.
         """
-        psg_combined_path1 = Path(
-            self.directories['psg_combined']) / get_filename(N1, N_ZFILL, 'rad')
-        psg_thermal_path1 = Path(
-            self.directories['psg_thermal']) / get_filename(N1, N_ZFILL, 'rad')
-        psg_combined_path2 = Path(
-            self.directories['psg_combined']) / get_filename(N2, N_ZFILL, 'rad')
-        psg_thermal_path2 = Path(
-            self.directories['psg_thermal']) / get_filename(N2, N_ZFILL, 'rad')
-
         reflected = []
 
-        for psg_combined_path, psg_thermal_path in zip([psg_combined_path1, psg_combined_path2],
-                                                       [psg_thermal_path1, psg_thermal_path2]):
-            combined = PSGrad.from_rad(psg_combined_path)
-            thermal = PSGrad.from_rad(psg_thermal_path)
+        for N in (N1, N2):
+            combined = self.get_psg_output('combined', N)
+            thermal = self.get_psg_output('thermal', N)
 
             
             planet_reflection_only = get_reflected(
@@ -751,16 +1509,11 @@ class ObservationModel:
         ValueError
             If the wavelength coordinates from the loaded spectra do not match.
         """
-        psg_cmb_path1 = Path(
-            self.directories['psg_combined']) / get_filename(N1, N_ZFILL, 'rad')
-        psg_cmb_path2 = Path(
-            self.directories['psg_combined']) / get_filename(N2, N_ZFILL, 'rad')
-
         wavelength = []
         transit = []
 
-        for psg_cmb_path in [psg_cmb_path1, psg_cmb_path2]:
-            cmb_rad = PSGrad.from_rad(psg_cmb_path)
+        for N in (N1, N2):
+            cmb_rad = self.get_psg_output('combined', N)
 
             wavelength.append(cmb_rad.data['Wave/freq'])
             try:
@@ -817,24 +1570,12 @@ class ObservationModel:
         ValueError
             If the wavelength coordinates from the loaded spectra do not match.
         """
-        psg_combined_path1 = Path(
-            self.directories['psg_combined']) / get_filename(N1, N_ZFILL, 'rad')
-        psg_noise_path1 = Path(
-            self.directories['psg_noise']) / get_filename(N1, N_ZFILL, 'noi')
-        psg_combined_path2 = Path(
-            self.directories['psg_combined']) / get_filename(N2, N_ZFILL, 'rad')
-        psg_noise_path2 = Path(
-            self.directories['psg_noise']) / get_filename(N2, N_ZFILL, 'noi')
-
         psg_noise_source = []
         psg_source = []
 
-        for psg_combined_path, psg_noise_path in zip(
-            [psg_combined_path1, psg_combined_path2],
-            [psg_noise_path1, psg_noise_path2]
-        ):
-            combined = PSGrad.from_rad(psg_combined_path)
-            noise = PSGrad.from_rad(psg_noise_path)
+        for N in (N1, N2):
+            combined = self.get_psg_output('combined', N)
+            noise = self.get_psg_output('noise', N)
 
             
             psg_noise_source.append(noise.data['Source'])
@@ -879,16 +1620,11 @@ class ObservationModel:
         ValueError
             If the wavelength coordinates from the loaded spectra do not match.
         """
-        psg_thermal_path1 = Path(
-            self.directories['psg_thermal']) / get_filename(N1, N_ZFILL, 'rad')
-        psg_thermal_path2 = Path(
-            self.directories['psg_thermal']) / get_filename(N2, N_ZFILL, 'rad')
-
         wavelength = []
         thermal = []
 
-        for psg_thermal_path in [psg_thermal_path1, psg_thermal_path2]:
-            thermal_rad = PSGrad.from_rad(psg_thermal_path)
+        for N in (N1, N2):
+            thermal_rad = self.get_psg_output('thermal', N)
 
             wavelength.append(thermal_rad.data['Wave/freq'])
             try:
@@ -924,12 +1660,8 @@ class ObservationModel:
         ValueError
             If the layer file columns of layer numbers do not match.
         """
-        psg_layers_path1 = Path(
-            self.directories['psg_layers']) / get_filename(N1, N_ZFILL, 'lyr')
-        psg_layers_path2 = Path(
-            self.directories['psg_layers']) / get_filename(N2, N_ZFILL, 'lyr')
-        layers1 = read_lyr(psg_layers_path1)
-        layers2 = read_lyr(psg_layers_path2)
+        layers1 = self.get_psg_output('layers', N1)
+        layers2 = self.get_psg_output('layers', N2)
         if not np.all(layers1.columns == layers2.columns) & (len(layers1) == len(layers2)):
             raise ValueError(
                 'Layer files must have matching columns and number of layers')
@@ -938,6 +1670,40 @@ class ObservationModel:
         df = pd.DataFrame(columns=cols, data=dat)
         return df
 
+    def warmup(self) -> dict:
+        """
+        Compile the JAX functions used in the epoch loop for the shapes of
+        this run, so that compilation does not happen inside the loop.
+        The spectral grid is evaluated at the photosphere, which also reads
+        any grid nodes it needs that are not yet loaded.
+
+        Returns
+        -------
+        dict
+            The compilation time of each component in seconds. This is
+            also stored in ``metadata['compile_time']``.
+
+        Notes
+        -----
+        Set ``VSPEC.config.JAX_CACHE_PATH`` to keep the compiled functions
+        between runs.
+        """
+        compile_time = {'spectra': self.spec.warmup(
+            self.wl, *self._grid_point(self.params.star.teff))}
+        if self.star is not None and self.star.granulation is not None:
+            compile_time['granulation'] = self.star.granulation.warmup(
+                self.params.obs.total_images)
+        self.metadata['compile_time'] = compile_time
+        return compile_time
+
+    def write_metadata(self):
+        """
+        Write ``metadata`` to ``run_metadata.json`` in the output directory.
+        """
+        path = Path(self.directories['all_model']) / 'run_metadata.json'
+        with open(path, 'w', encoding='UTF-8') as file:
+            json.dump(self.metadata, file, indent=2)
+
     def build_spectra(self):
         """
         Integrate our stellar model with PSG to produce a variable
@@ -963,87 +1729,124 @@ class ObservationModel:
 
         time_step = self.params.obs.integration_time
         planet_time_step = self.params.obs.integration_time * self.params.psg.phase_binning
-        granulation_fractions = self.star.get_granulation_coverage(
-            observation_info['time'])
-
-        for index in self.wrap_iterator(range(self.params.obs.total_images), desc='Build Spectra', total=self.params.obs.total_images, position=0, leave=True):
-            tindex = observation_info['time'][index]
-            tstart = tindex - observation_info['time'][0]
-            tfinish = tstart + time_step
-            planet_phase = observation_info['phase'][index]
-            sub_obs_lon = observation_info['sub_obs_lon'][index]
-            sub_obs_lat = observation_info['sub_obs_lat'][index]
-            orbital_radius = observation_info['orbit_radius'][index] * \
-                self.params.planet.semimajor_axis
-            granulation_fraction = granulation_fractions[index]
-            N1, N2 = get_planet_indicies(planet_times, tindex)
-            N1_frac = (planet_times[N2] - tindex)/planet_time_step
-            N1_frac = N1_frac.to_value(u.dimensionless_unscaled)
-
-            sub_planet_lon = observation_info['sub_planet_lon'][index]
-            sub_planet_lat = observation_info['sub_planet_lat'][index]
-
-            wave, transit_depth = self.get_transit(
-                N1, N2, N1_frac, planet_phase, orbital_radius)
-
-            comp_flux, pl_frac = self.calculate_composite_stellar_spectrum(
-                {'lat': sub_obs_lat, 'lon': sub_obs_lon}, tstart, tfinish,
-                granulation_fraction=granulation_fraction,
-                orbit_radius=orbital_radius,
-                planet_radius=self.params.planet.radius,
-                phase=planet_phase,
-                inclination=self.params.system.inclination,
-                transit_depth=transit_depth
-            )
-            true_star, _ = self.calculate_composite_stellar_spectrum(
-                {'lat': sub_obs_lat, 'lon': sub_obs_lon}, tstart, tfinish,
-                granulation_fraction=granulation_fraction,
-                orbit_radius=orbital_radius,
-                planet_radius=self.params.planet.radius,
-                phase=planet_phase,
-                inclination=self.params.system.inclination,
-                transit_depth=0.
-            )
-            to_planet_flux, _ = self.calculate_composite_stellar_spectrum(
-                {'lat': sub_planet_lat, 'lon': sub_planet_lon}, tstart, tfinish,
-                granulation_fraction=granulation_fraction
-            )
-            
-
-            reflection_flux_adj = self.calculate_reflected_spectra(
-                N1, N2, N1_frac, to_planet_flux, pl_frac)
-
-            thermal_spectrum = self.get_thermal_spectrum(
-                N1, N2, N1_frac, pl_frac)
-
-            combined_flux = comp_flux + reflection_flux_adj + thermal_spectrum
-
-            noise_flux_adj = self.calculate_noise(N1, N2, N1_frac,
-                                                        np.sqrt(
-                                                            (planet_time_step/time_step).to_value(u.dimensionless_unscaled)),
-                                                        combined_flux)
-            wl = self.wl
-
-            df = pd.DataFrame({
-                f'wavelength[{str(wl.unit)}]': wl.value,
-                f'star[{str(true_star.unit)}]': true_star.value,
-                f'star_towards_planet[{str(to_planet_flux.unit)}]': to_planet_flux.value,
-                f'reflected[{str(reflection_flux_adj.unit)}]': reflection_flux_adj.value,
-                f'planet_thermal[{str(thermal_spectrum.unit)}]': thermal_spectrum.value,
-                f'total[{str(combined_flux.unit)}]': combined_flux.value,
-                f'noise[{str(noise_flux_adj.unit)}]': noise_flux_adj.value
-            })
+        self.warmup()
+        self.write_metadata()
+        self._psg_output_cache.clear()
+        granulation_fractions = chain.from_iterable(
+            self.star.iter_granulation_coverage(observation_info['time']))
+
+        epochs = iter(self.wrap_iterator(range(self.params.obs.total_images), desc='Build Spectra', total=self.params.obs.total_images, position=0, leave=True))
+        while True:
+            block = list(islice(epochs, config.spectra_block_size))
+            if len(block) == 0:
+                break
+            # the star changes every epoch, so get each coverage before it ages,
+            # then combine the spectra of the whole block in one product
+            coverages = []
+            epoch_data = []
+            for index in block:
+                tindex = observation_info['time'][index]
+                tstart = tindex - observation_info['time'][0]
+                tfinish = tstart + time_step
+                planet_phase = observation_info['phase'][index]
+                orbital_radius = observation_info['orbit_radius'][index] * \
+                    self.params.planet.semimajor_axis
+                granulation_fraction = next(granulation_fractions)
+                sub_obs_coords = {'lat': observation_info['sub_obs_lat'][index],
+                                  'lon': observation_info['sub_obs_lon'][index]}
+                sub_planet_coords = {'lat': observation_info['sub_planet_lat'][index],
+                                     'lon': observation_info['sub_planet_lon'][index]}
+                total, covered, pl_frac = self.star.calc_coverage(
+                    sub_obs_coords,
+                    granulation_fraction=granulation_fraction,
+                    orbit_radius=orbital_radius,
+                    planet_radius=self.params.planet.radius,
+                    phase=planet_phase,
+                    inclination=self.params.system.inclination
+                )
+                to_planet, _, _ = self.star.calc_coverage(
+                    sub_planet_coords,
+                    granulation_fraction=granulation_fraction
+                )
+                coverages += [total, covered, to_planet]
+                epoch_data.append(dict(
+                    index=index,
+                    tindex=tindex,
+                    planet_phase=planet_phase,
+                    orbital_radius=orbital_radius,
+                    pl_frac=pl_frac,
+                    flare_flux=self.get_flare_spectrum(sub_obs_coords, tstart, tfinish),
+                    planet_flare_flux=self.get_flare_spectrum(sub_planet_coords, tstart, tfinish)
+                ))
+                self.star.birth_spots(time_step)
+                self.star.birth_faculae(time_step)
+                self.star.age(time_step)
+            fluxes = self.combine_spectra(coverages)
+
+            for j, epoch in enumerate(epoch_data):
+                self._write_epoch(
+                    fluxes[3*j:3*j + 3], planet_times, planet_time_step, time_step, **epoch)
+        self._psg_output_cache.clear()
+
+    def _write_epoch(
+        self,
+        fluxes: u.Quantity,
+        planet_times: u.Quantity,
+        planet_time_step: u.Quantity,
+        time_step: u.Quantity,
+        index: int,
+        tindex: u.Quantity,
+        planet_phase: u.Quantity,
+        orbital_radius: u.Quantity,
+        pl_frac: float,
+        flare_flux: u.Quantity,
+        planet_flare_flux: u.Quantity
+    ):
+        """
+        Add the planet to the stellar spectra of an epoch and write the output files.
+        """
+        N1, N2 = get_planet_indicies(planet_times, tindex)
+        N1_frac = (planet_times[N2] - tindex)/planet_time_step
+        N1_frac = N1_frac.to_value(u.dimensionless_unscaled)
+
+        wave, transit_depth = self.get_transit(
+            N1, N2, N1_frac, planet_phase, orbital_radius)
+
+        true_star, transit_flux, to_planet_flux = fluxes
+        true_star = true_star + flare_flux
+        comp_flux = true_star - transit_flux * transit_depth
+        to_planet_flux = to_planet_flux + planet_flare_flux
+
+        reflection_flux_adj = self.calculate_reflected_spectra(
+            N1, N2, N1_frac, to_planet_flux, pl_frac)
+
+        thermal_spectrum = self.get_thermal_spectrum(
+            N1, N2, N1_frac, pl_frac)
+
+        combined_flux = comp_flux + reflection_flux_adj + thermal_spectrum
+
+        noise_flux_adj = self.calculate_noise(N1, N2, N1_frac,
+                                              np.sqrt(
+                                                  (planet_time_step/time_step).to_value(u.dimensionless_unscaled)),
+                                              combined_flux)
+        wl = self.wl
+
+        df = pd.DataFrame({
+            f'wavelength[{str(wl.unit)}]': wl.value,
+            f'star[{str(true_star.unit)}]': true_star.value,
+            f'star_towards_planet[{str(to_planet_flux.unit)}]': to_planet_flux.value,
+            f'reflected[{str(reflection_flux_adj.unit)}]': reflection_flux_adj.value,
+            f'planet_thermal[{str(thermal_spectrum.unit)}]': thermal_spectrum.value,
+            f'total[{str(combined_flux.unit)}]': combined_flux.value,
+            f'noise[{str(noise_flux_adj.unit)}]': noise_flux_adj.value
+        })
+        outfile = self.directories['all_model'] / \
+            get_filename(index, N_ZFILL, 'csv')
+        df.to_csv(outfile, index=False, sep=',')
+
+        # layers
+        if self.params.psg.use_molecular_signatures:
+            layerdat = self.get_layer_data(N1, N2, N1_frac)
             outfile = self.directories['all_model'] / \
-                get_filename(index, N_ZFILL, 'csv')
-            df.to_csv(outfile, index=False, sep=',')
-
-            # layers
-            if self.params.psg.use_molecular_signatures:
-                layerdat = self.get_layer_data(N1, N2, N1_frac)
-                outfile = self.directories['all_model'] / \
-                    f'layer{str(index).zfill(N_ZFILL)}.csv'
-                layerdat.to_csv(outfile, index=False, sep=',')
-
-            self.star.birth_spots(time_step)
-            self.star.birth_faculae(time_step)
-            self.star.age(time_step)
+                f'layer{str(index).zfill(N_ZFILL)}.csv'
+            layerdat.to_csv(outfile, index=False, sep=',')
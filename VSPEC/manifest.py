@@ -0,0 +1,147 @@
+"""
+Record of the completed phases of a planet build
+"""
+from pathlib import Path
+from threading import Lock
+import hashlib
+import json
+import os
+import typing
+
+
+class PhaseManifest:
+    """
+    A record of the phases that ``ObservationModel.build_planet`` has finished.
+
+    Each finished phase is appended to a JSON lines file as soon as its
+    files are written, so the record survives if the build is killed.
+    A phase counts as complete only if it was built with the same
+    config and all of its files still exist.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The manifest file. The output files are recorded relative to its directory.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The manifest file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = Lock()
+
+    @staticmethod
+    def get_phase_hash(run_keys: typing.List[str]) -> str:
+        """
+        Get the hash of the config of a phase.
+
+        Parameters
+        ----------
+        run_keys : list of str
+            The ``VSPEC.psg_cache.PSGCache`` key of each PSG run of the phase.
+
+        Returns
+        -------
+        str
+            The SHA-256 digest of the keys.
+        """
+        return hashlib.sha256('|'.join(run_keys).encode('UTF-8')).hexdigest()
+
+    def load(self) -> typing.Dict[int, dict]:
+        """
+        Read the manifest.
+
+        Returns
+        -------
+        dict
+            The latest record of each phase, keyed by its index.
+            Each record has an ``index``, a ``hash``, and a list of ``files``.
+        """
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path, 'r', encoding='UTF-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line may be cut off if the build was killed while writing it
+                    continue
+                records[int(record['index'])] = record
+        return records
+
+    def add(self, index: int, phase_hash: str, files: typing.List[Path]):
+        """
+        Record a finished phase.
+
+        A last line that was cut off by a crash is removed first.
+
+        Parameters
+        ----------
+        index : int
+            The index of the phase.
+        phase_hash : str
+            The hash of the config of the phase.
+        files : list of pathlib.Path
+            The files written for the phase.
+        """
+        record = {
+            'index': int(index),
+            'hash': phase_hash,
+            'files': [Path(file).relative_to(self.path.parent).as_posix() for file in files]
+        }
+        with self._lock:
+            with open(self.path, 'a+b') as file:
+                self._drop_partial_line(file)
+                file.write((json.dumps(record) + '\n').encode('UTF-8'))
+                file.flush()
+                os.fsync(file.fileno())
+
+    @staticmethod
+    def _drop_partial_line(file: typing.BinaryIO):
+        """
+        Truncate a last line that was cut off by a crash, so that the
+        next record starts on a line of its own.
+        """
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b'\n':
+            return
+        file.seek(0)
+        file.truncate(file.read().rfind(b'\n') + 1)
+
+    def get_complete(self, phase_hashes: typing.Dict[int, str]) -> typing.Set[int]:
+        """
+        Get the phases that are already complete.
+
+        Parameters
+        ----------
+        phase_hashes : dict
+            The hash of the config of each phase, keyed by its index.
+
+        Returns
+        -------
+        set of int
+            The indices of the phases that were built with the same
+            config and whose files all exist.
+        """
+        records = self.load()
+        complete = set()
+        for index, phase_hash in phase_hashes.items():
+            record = records.get(index, None)
+            if record is None or record['hash'] != phase_hash:
+                continue
+            if all((self.path.parent / file).exists() for file in record['files']):
+                complete.add(index)
+        return complete
+
+    def clear(self):
+        """
+        Delete the manifest.
+        """
+        self.path.unlink(missing_ok=True)
@@ -396,6 +396,12 @@ class psgParameters(BaseParameters):
     api_key : APIkey
         An instance of the APIkey class representing the PSG API key. Provide either the
         path to the API key file or the API key value.
+    single_request : bool, default=False
+        Whether to send the config of each phase together with the request
+        to run PSG, rather than in a separate ``upd`` call beforehand.
+    store_outputs : bool, default=False
+        Whether to write the output of every phase to a single HDF5
+        file (see ``VSPEC.psg_store.PSGStore``) instead of separate text files.
 
     Attributes
     ----------
@@ -418,6 +424,11 @@ class psgParameters(BaseParameters):
         URL of the Planetary Spectrum Generator.
     api_key : APIkey
         An instance of the APIkey class representing the PSG API key.
+    single_request : bool
+        Whether to send the config of each phase together with the request
+        to run PSG.
+    store_outputs : bool
+        Whether to write the output of every phase to a single HDF5 file.
 
     """
 
@@ -430,7 +441,9 @@ class psgParameters(BaseParameters):
         lmax: int,
         continuum: list,
         url: str,
-        api_key: APIkey
+        api_key: APIkey,
+        single_request: bool = False,
+        store_outputs: bool = False
     ):
         self.gcm_binning = gcm_binning
         self.phase_binning = phase_binning
@@ -440,6 +453,8 @@ class psgParameters(BaseParameters):
         self.continuum = continuum
         self.url = url
         self.api_key = api_key
+        self.single_request = single_request
+        self.store_outputs = store_outputs
 
     @classmethod
     def _from_dict(cls, d: dict):
@@ -452,7 +467,9 @@ class psgParameters(BaseParameters):
             continuum = list(d['continuum']),
             url=str(d['url']),
             api_key=APIkey.none() if d.get(
-                'api_key', None) is None else APIkey.from_dict(d['api_key'])
+                'api_key', None) is None else APIkey.from_dict(d['api_key']),
+            single_request=bool(d.get('single_request', False)),
+            store_outputs=bool(d.get('store_outputs', False))
         )
 
     def to_psg(self):
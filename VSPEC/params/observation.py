@@ -88,6 +88,9 @@ class BandpassParameters(BaseParameters):
         The unit of wavelength used for the bandpass parameters.
     flux_unit : astropy.units.Unit
         The unit of flux used for the bandpass parameters.
+    lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+        The instrument line spread function. If given, the stellar
+        grid is convolved with it when it is loaded.
 
     Attributes
     ----------
@@ -101,6 +104,8 @@ class BandpassParameters(BaseParameters):
         The unit of wavelength used for the bandpass parameters.
     flux_unit : astropy.units.Unit
         The unit of flux used for the bandpass parameters.
+    lsf : VSPEC.spectra.lsf.LineSpreadFunction or None
+        The instrument line spread function.
     """
 
     psg_rad_mapper = {u.Unit('W m-2 um-1'): 'Wm2um'}
@@ -111,21 +116,29 @@ class BandpassParameters(BaseParameters):
         wl_red: u.Quantity,
         resolving_power: int,
         wavelength_unit: u.Unit,
-        flux_unit: u.Unit
+        flux_unit: u.Unit,
+        lsf: 'LineSpreadFunction' = None
     ):
         self.wl_blue = wl_blue
         self.wl_red = wl_red
         self.resolving_power = resolving_power
         self.wavelength_unit = wavelength_unit
         self.flux_unit = flux_unit
+        self.lsf = lsf
     @classmethod
     def _from_dict(cls, d: dict):
+        lsf = None
+        if d.get('lsf', None) is not None:
+            # imported here so that reading parameters does not load the spectra package
+            from VSPEC.spectra.lsf import LineSpreadFunction
+            lsf = LineSpreadFunction.from_dict(d['lsf'])
         return cls(
             wl_blue = u.Quantity(d['wl_blue']),
             wl_red = u.Quantity(d['wl_red']),
             resolving_power = int(d['resolving_power']),
             wavelength_unit = u.Unit(d['wavelength_unit']),
-            flux_unit = u.Unit(d['flux_unit'])
+            flux_unit = u.Unit(d['flux_unit']),
+            lsf = lsf
         )
     def to_psg(self):
         """
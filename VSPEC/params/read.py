@@ -30,6 +30,10 @@ class Header(BaseParameters):
         The level of verbosity for the simulation.
     desc : str, default=None
         A description of the run.
+    spectral_grid : pathlib.Path, default=None
+        A chunked grid file made by ``VSPEC.spectra.build_chunked_phoenix_grid``
+        to draw stellar spectra from. If ``None``, the PHOENIX spectra
+        are binned to the instrument when the run starts.
     
     Attributes
     ----------
@@ -45,6 +49,8 @@ class Header(BaseParameters):
         The level of verbosity for the simulation.
     desc : str or None
         A description of the run.
+    spectral_grid : pathlib.Path or None
+        A chunked grid file to draw stellar spectra from.
 
     """
     def __init__(
@@ -54,7 +60,8 @@ class Header(BaseParameters):
         teff_max:u.Quantity,
         seed: int,
         verbose: int=1,
-        desc:str=None
+        desc:str=None,
+        spectral_grid:Path=None
     ):
         self.data_path = data_path
         self.teff_min = teff_min
@@ -62,6 +69,7 @@ class Header(BaseParameters):
         self.seed = seed
         self.verbose = verbose
         self.desc = desc
+        self.spectral_grid = spectral_grid
     @classmethod
     def _from_dict(cls, d: dict):
         return cls(
@@ -69,7 +77,8 @@ class Header(BaseParameters):
             teff_min = u.Quantity(d['teff_min']),
             teff_max = u.Quantity(d['teff_max']),
             seed = None if d.get('seed',None) is None else int(d.get('seed',None)),
-            desc = None if d.get('desc',None) is None else str(d.get('desc',None))
+            desc = None if d.get('desc',None) is None else str(d.get('desc',None)),
+            spectral_grid = None if d.get('spectral_grid',None) is None else Path(d.get('spectral_grid',None))
         )
 
 
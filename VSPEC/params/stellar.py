@@ -624,6 +624,12 @@ class StarParameters(BaseParameters):
         Number of latitudes in the stellar surface.
     Nlon : int
         Number of longitudes in the stellar surface.
+    logg : float, default=None
+        The surface gravity of the star in dex (cgs). Only used by
+        grids that have a log g axis.
+    feh : float, default=None
+        The metallicity of the star in dex. Only used by
+        grids that have a [Fe/H] axis.
     
     Attributes
     ----------
@@ -655,6 +661,10 @@ class StarParameters(BaseParameters):
         Number of latitudes in the stellar surface.
     Nlon : int
         Number of longitudes in the stellar surface.
+    logg : float or None
+        The surface gravity of the star in dex (cgs).
+    feh : float or None
+        The metallicity of the star in dex.
     """
 
     def __init__(
@@ -672,7 +682,9 @@ class StarParameters(BaseParameters):
         flares: FlareParameters,
         granulation: GranulationParameters,
         Nlat: int,
-        Nlon: int
+        Nlon: int,
+        logg: float = None,
+        feh: float = None
     ):
         self.psg_star_template = psg_star_template
         self.teff = teff
@@ -688,6 +700,8 @@ class StarParameters(BaseParameters):
         self.granulation = granulation
         self.Nlat = Nlat
         self.Nlon = Nlon
+        self.logg = logg
+        self.feh = feh
     @classmethod
     def from_dict(cls, d: dict):
         """
@@ -719,7 +733,9 @@ class StarParameters(BaseParameters):
             flares=FlareParameters.from_dict(d['flares']),
             granulation=GranulationParameters.from_dict(d['granulation']),
             Nlat=int(d['Nlat']),
-            Nlon=int(d['Nlon'])
+            Nlon=int(d['Nlon']),
+            logg=None if d.get('logg', None) is None else float(d['logg']),
+            feh=None if d.get('feh', None) is None else float(d['feh'])
         )
     def to_psg(self)->dict:
         """
@@ -4,16 +4,18 @@ This module communucates between `VSPEC` and
 and the Planetary Spectrum Generator via the API.
 """
 
-from io import StringIO
+import asyncio
 import re
 import warnings
 from astropy import units as u
-import pandas as pd
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Union
 
 from VSPEC.params.read import InternalParameters
+from VSPEC import config
 
 warnings.simplefilter('ignore', category=u.UnitsWarning)
 
@@ -61,6 +63,243 @@ def call_api(
     return reply.content
 
 
+def count_cfg_lines(config_data: Union[str, bytes]) -> int:
+    """
+    Count the lines that a config adds to the config stored by PSG.
+
+    A GCM is stored as a single ``<BINARY>`` value, so newline bytes
+    inside the binary data are not counted.
+
+    Parameters
+    ----------
+    config_data : str or bytes
+        The content of a config.
+
+    Returns
+    -------
+    int
+        The number of config lines.
+    """
+    if config_data is None:
+        return 0
+    if isinstance(config_data, str):
+        config_data = config_data.encode('UTF-8')
+    text, *binary = config_data.split(b'<BINARY>', 1)
+    if binary:
+        # the binary data ends the line it starts on
+        return text.count(b'\n') + 1
+    return len(text.splitlines())
+
+
+class PSGClient:
+    """
+    A client for the PSG API that reuses its connections.
+
+    Every call goes through one ``requests.Session``, so the TCP connection
+    to PSG is kept alive between calls instead of being opened for each one.
+    Failures to connect and server errors are retried with exponential backoff.
+    A call that fails while waiting for the response is not sent again,
+    since PSG may have already run it.
+
+    Parameters
+    ----------
+    psg_url : str, default='https://psg.gsfc.nasa.gov'
+        The URL of the `PSG` API. Use 'http://localhost:3000' if running locally.
+    api_key : str, default=None
+        The key for the public API. Needed only if not runnning `PSG` locally.
+    timeout : float or tuple, default=``VSPEC.config.PSG_TIMEOUT``
+        The number of seconds to wait for PSG, as a ``(connect, read)``
+        tuple or a single number for both. A read timeout of ``None``
+        waits for as long as PSG takes.
+    retries : int, default=``VSPEC.config.PSG_RETRIES``
+        The number of times to retry a failed call.
+    backoff : float, default=``VSPEC.config.PSG_RETRY_BACKOFF``
+        The backoff factor between retries, in seconds.
+
+    Attributes
+    ----------
+    psg_url : str
+        The URL of the `PSG` API.
+    api_key : str or None
+        The key for the public API.
+    timeout : float or tuple
+        The number of seconds to wait for PSG.
+    session : requests.Session
+        The session used for every call.
+    needs_set : bool
+        Whether the config on the server must be replaced with a ``set``
+        call before the next run. For security reasons, PSG config files
+        can contain a maximum of ~2000 lines, after which the server no
+        longer updates after our API call. A new client starts as ``True``
+        because nothing has been uploaded to its server yet.
+    cfg_lines : int
+        An estimate of the length of the config stored on the server.
+        A ``set`` call replaces it and an ``upd`` call adds to it, as if
+        every line sent were kept. It can be corrected with the length
+        of a config that the server returns.
+    cfg_growth : int
+        The number of lines that the last phase of a phase curve added
+        to the stored config.
+    upd_lines : int
+        The total number of lines sent with ``upd`` calls.
+    cfg_checked : bool
+        Whether a config returned by the server has been checked since
+        the last ``set`` call.
+    """
+
+    def __init__(
+        self,
+        psg_url: str = 'https://psg.gsfc.nasa.gov',
+        api_key: str = None,
+        timeout: Union[float, tuple] = None,
+        retries: int = None,
+        backoff: float = None
+    ):
+        self.psg_url = psg_url
+        self.api_key = api_key
+        self.timeout = config.PSG_TIMEOUT if timeout is None else timeout
+        retry = Retry(
+            total=config.PSG_RETRIES if retries is None else retries,
+            backoff_factor=config.PSG_RETRY_BACKOFF if backoff is None else backoff,
+            # a request that was sent may already be running, so do not send it again
+            read=False,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=None,
+            raise_on_status=False
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.needs_set = True
+        self.cfg_lines = 0
+        self.cfg_growth = 0
+        self.upd_lines = 0
+        self.cfg_checked = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the session and its connections.
+        """
+        self.session.close()
+
+    def call(
+        self,
+        output_type: str = None,
+        app: str = None,
+        config_data: str = None
+    ) -> bytes:
+        """
+        Call the PSG API.
+
+        Parameters
+        ----------
+        output_type : str, default=None
+            The type of output to retrieve from `PSG`. Options include 'cfg', 'rad',
+            'noi', 'lyr', 'all'.
+        app : str, default=None
+            The PSG app to call. For example: 'globes'
+        config_data : str, default=None
+            The data contained by a config file.
+
+        Returns
+        -------
+        bytes
+            The content of the response from PSG.
+        """
+        data = {}
+        data['file'] = config_data
+        if self.api_key is not None:
+            data['key'] = self.api_key
+        if app is not None:
+            data['app'] = app
+        if output_type is not None:
+            data['type'] = output_type
+        url = f'{self.psg_url}/api.php'
+        reply = self.session.post(url, data=data, timeout=self.timeout)
+        n_lines = count_cfg_lines(config_data)
+        if output_type == 'set':
+            self.cfg_lines = n_lines
+            self.cfg_checked = False
+        elif output_type == 'upd':
+            self.cfg_lines += n_lines
+            self.upd_lines += n_lines
+        return reply.content
+
+
+class AsyncPSGClient:
+    """
+    An asyncio wrapper around a ``PSGClient``.
+
+    Each call is made by the wrapped client in a worker thread, so the event
+    loop can parse and write other results while it waits for PSG.
+
+    Parameters
+    ----------
+    client : PSGClient
+        The client to make the calls with.
+
+    Attributes
+    ----------
+    client : PSGClient
+        The client to make the calls with.
+    lock : asyncio.Lock
+        Held by a task while it makes a sequence of calls that depends on the
+        config stored on the server, such as an update followed by a run.
+        Waiting tasks acquire it in the order they asked for it.
+    """
+
+    def __init__(self, client: PSGClient):
+        self.client = client
+        self.lock = asyncio.Lock()
+
+    @property
+    def psg_url(self) -> str:
+        """
+        The URL of the `PSG` API.
+
+        :type: str
+        """
+        return self.client.psg_url
+
+    async def call(
+        self,
+        output_type: str = None,
+        app: str = None,
+        config_data: str = None
+    ) -> bytes:
+        """
+        Call the PSG API.
+
+        Parameters
+        ----------
+        output_type : str, default=None
+            The type of output to retrieve from `PSG`. Options include 'cfg', 'rad',
+            'noi', 'lyr', 'all'.
+        app : str, default=None
+            The PSG app to call. For example: 'globes'
+        config_data : str, default=None
+            The data contained by a config file.
+
+        Returns
+        -------
+        bytes
+            The content of the response from PSG.
+        """
+        return await asyncio.to_thread(
+            self.client.call,
+            output_type=output_type,
+            app=app,
+            config_data=config_data
+        )
+
+
 def call_api_from_file(config_path: str = None, psg_url: str = 'https://psg.gsfc.nasa.gov',
              api_key: str = None, output_type: str = None, app: str = None) -> Union[None,bytes]:
     """
@@ -232,14 +471,14 @@ class PSGrad:
         Create a `PSGrad` object from a file. This is designed to load in
         the raw `.rad` output from PSG
         """
-        raw_header = []
-        raw_data = []
-        with open(filename, 'r', encoding='UTF-8') as file:
-            for line in file:
-                if line[0] == '#':
-                    raw_header.append(line.replace('\n', ''))
-                else:
-                    raw_data.append(line.replace('\n', ''))
+        with open(filename, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+    @staticmethod
+    def _parse_header(raw_header: list) -> dict:
+        """
+        Read the information in the comment lines of a `.rad` file.
+        """
         header = {
             'warnings': [],
             'errors': [],
@@ -276,18 +515,82 @@ class PSGrad:
             elif 'Radiance unit' in item:
                 header['radiance_unit'] = u.Unit(
                     re.findall(r'\[([\w\d/]+)\]', item)[0].replace('W/m2/um','W m-2 um-1')) # avoid UnitWarning
-        columns = raw_header[-1][1:].strip().split()
-        dat = StringIO('\n'.join(raw_data))
-        df = pd.read_csv(dat, names=columns, delim_whitespace=True)
-        if len(df) == 0:
+        return header
+
+    @classmethod
+    def from_bytes(cls, content: bytes):
+        """
+        Create a `PSGrad` object from the content of a `.rad` file, such
+        as an entry of the output of ``parse_full_output``.
+
+        Parameters
+        ----------
+        content : bytes
+            The content of the file.
+
+        Returns
+        -------
+        PSGrad
+            The parsed file.
+
+        Raises
+        ------
+        ValueError
+            If there is no data or the columns are not as expected.
+
+        Notes
+        -----
+        The numeric block is parsed in one call to ``numpy.loadtxt``. The
+        units are only read once from the header, and each column is a
+        `Quantity` view of the parsed array rather than a copy.
+        """
+        raw_header = []
+        raw_data = []
+        for line in content.splitlines():
+            if line.startswith(b'#'):
+                raw_header.append(line.decode('UTF-8'))
+            elif line.strip():
+                raw_data.append(line)
+        if len(raw_data) == 0:
             raise ValueError(
                 'It looks like there might not be any data in this rad file.')
-        data = {}
+        values = np.loadtxt(raw_data, dtype='float64', ndmin=2)
+        return cls.from_table(raw_header, values.T)
+
+    @classmethod
+    def from_table(cls, raw_header: list, values: np.ndarray):
+        """
+        Create a `PSGrad` object from the comment lines and the numeric
+        block of a `.rad` file.
+
+        Parameters
+        ----------
+        raw_header : list of str
+            The comment lines of the file. The last one names the columns.
+        values : numpy.ndarray
+            The data, with shape ``(n_columns, n_points)``.
+
+        Returns
+        -------
+        PSGrad
+            The parsed file.
+
+        Raises
+        ------
+        ValueError
+            If the columns are not as expected.
+        """
+        header = cls._parse_header(raw_header)
+        columns = raw_header[-1][1:].strip().split()
         if not columns[0] == 'Wave/freq':
             raise ValueError('.rad format is incorrect')
-        data[columns[0]] = df[columns[0]].values * header['spectral_unit']
-        for col in columns[1:]:
-            data[col] = df[col].values * header['radiance_unit']
+        if values.shape[0] != len(columns):
+            raise ValueError('.rad format is incorrect')
+        # one contiguous row per column, so each column is a cheap view
+        values = np.ascontiguousarray(values, dtype='float64')
+        data = {columns[0]: values[0] << header['spectral_unit']}
+        for col, value in zip(columns[1:], values[1:]):
+            data[col] = value << header['radiance_unit']
         return cls(header, data)
 
 
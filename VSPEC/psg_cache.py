@@ -0,0 +1,286 @@
+"""
+Persistent cache of PSG responses
+
+The cache can be inspected and cleared from the command line::
+
+    python -m VSPEC.psg_cache info
+    python -m VSPEC.psg_cache clear
+    python -m VSPEC.psg_cache evict --max-bytes 100000000
+"""
+from pathlib import Path
+from typing import Union
+import argparse
+import hashlib
+import os
+import tempfile
+
+from VSPEC import config
+from VSPEC.psg_api import parse_full_output
+
+CACHE_VERSION = 1
+"""
+The version of the cache file format. Changing this invalidates
+every existing entry.
+"""
+
+
+class PSGCache:
+    """
+    A size-bounded, on-disk cache of the output of PSG ``all`` calls.
+
+    Entries are addressed by a hash of everything that PSG uses to
+    compute the output, so a run that has been done before can be
+    read back without calling PSG. Each entry stores the key it was
+    written for and a checksum of the response. Entries that fail
+    either check are deleted and treated as missing.
+
+    Parameters
+    ----------
+    path : pathlib.Path, default=None
+        The cache directory. Defaults to ``config.PSG_CACHE_PATH``.
+    max_bytes : int, default=None
+        The maximum total size of the cache. Defaults to
+        ``config.PSG_CACHE_MAX_BYTES``.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The cache directory.
+    max_bytes : int
+        The maximum total size of the cache.
+    """
+
+    def __init__(self, path: Path = None, max_bytes: int = None):
+        self.path = Path(config.PSG_CACHE_PATH if path is None else path)
+        self.max_bytes = config.PSG_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    @staticmethod
+    def get_prefix(gcm_content: bytes, static_config: bytes) -> 'hashlib._Hash':
+        """
+        Hash the inputs that are shared by the runs of a build.
+
+        Parameters
+        ----------
+        gcm_content : bytes
+            The GCM uploaded to PSG.
+        static_config : bytes
+            The config that does not change between phases.
+
+        Returns
+        -------
+        hashlib._Hash
+            The partial SHA-256 digest, to be completed by ``get_key_from_prefix``.
+        """
+        digest = hashlib.sha256(f'v{CACHE_VERSION}'.encode('UTF-8'))
+        for part in (gcm_content, static_config):
+            # prefix each part with its length so that the parts cannot run together
+            digest.update(len(part).to_bytes(8, 'little'))
+            digest.update(part)
+        return digest
+
+    @staticmethod
+    def get_key_from_prefix(prefix: 'hashlib._Hash', phase_config: bytes) -> str:
+        """
+        Get the key of a PSG run from the digest of its shared inputs.
+
+        Parameters
+        ----------
+        prefix : hashlib._Hash
+            The output of ``get_prefix``. It is not modified.
+        phase_config : bytes
+            The config of this phase.
+
+        Returns
+        -------
+        str
+            The SHA-256 digest of the inputs.
+        """
+        digest = prefix.copy()
+        digest.update(len(phase_config).to_bytes(8, 'little'))
+        digest.update(phase_config)
+        return digest.hexdigest()
+
+    @classmethod
+    def get_key(cls, gcm_content: bytes, static_config: bytes, phase_config: bytes) -> str:
+        """
+        Get the key of a PSG run.
+
+        Parameters
+        ----------
+        gcm_content : bytes
+            The GCM uploaded to PSG.
+        static_config : bytes
+            The config that does not change between phases.
+        phase_config : bytes
+            The config of this phase.
+
+        Returns
+        -------
+        str
+            The SHA-256 digest of the inputs.
+        """
+        return cls.get_key_from_prefix(cls.get_prefix(gcm_content, static_config), phase_config)
+
+    def get_filename(self, key: str) -> Path:
+        """
+        Get the file that stores an entry.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        pathlib.Path
+            The path to the entry.
+        """
+        return self.path / f'{key}.psg'
+
+    def get(self, key: str) -> Union[dict, None]:
+        """
+        Read an entry from the cache.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        dict or None
+            The parsed output, as returned by ``VSPEC.psg_api.parse_full_output``,
+            or ``None`` if the entry is missing or corrupt.
+        """
+        filename = self.get_filename(key)
+        try:
+            with open(filename, 'rb') as file:
+                stored_key = file.readline().strip().decode('UTF-8')
+                checksum = file.readline().strip().decode('UTF-8')
+                response = file.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError):
+            stored_key, checksum, response = None, None, b''
+        if stored_key != key or checksum != hashlib.sha256(response).hexdigest():
+            filename.unlink(missing_ok=True)
+            return None
+        # mark as recently used
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            pass
+        return parse_full_output(response)
+
+    def put(self, key: str, response: bytes):
+        """
+        Write an entry to the cache and evict old entries if needed.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        response : bytes
+            The content of the response from PSG.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(f'{key}\n{hashlib.sha256(response).hexdigest()}\n'.encode('UTF-8'))
+                file.write(response)
+            os.replace(tmp, self.get_filename(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def _stat_entries(self) -> list:
+        """
+        Get each entry and its ``os.stat_result``, skipping entries deleted by another process.
+        """
+        if not self.path.exists():
+            return []
+        entries = []
+        for file in self.path.glob('*.psg'):
+            try:
+                entries.append((file, file.stat()))
+            except FileNotFoundError:
+                pass
+        return entries
+
+    def __len__(self) -> int:
+        return len(self._stat_entries())
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the cache in bytes.
+
+        Returns
+        -------
+        int
+            The size of all entries.
+        """
+        return sum(stat.st_size for _, stat in self._stat_entries())
+
+    def evict(self, max_bytes: int = None):
+        """
+        Delete the least recently used entries until the cache fits.
+
+        Parameters
+        ----------
+        max_bytes : int, default=None
+            The size to fit in. Defaults to `max_bytes`.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self._stat_entries()
+        total = sum(stat.st_size for _, stat in entries)
+        for file, stat in sorted(entries, key=lambda item: item[1].st_mtime):
+            if total <= max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def clear(self):
+        """
+        Delete every entry in the cache.
+        """
+        for file, _ in self._stat_entries():
+            file.unlink(missing_ok=True)
+
+
+def main(argv: list = None):
+    """
+    Inspect or invalidate the PSG cache from the command line.
+
+    Parameters
+    ----------
+    argv : list of str, default=None
+        The command line arguments. Defaults to ``sys.argv[1:]``.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m VSPEC.psg_cache',
+        description='Inspect or invalidate the cache of PSG responses.'
+    )
+    parser.add_argument('--path', type=Path, default=None,
+                        help='The cache directory. Defaults to VSPEC.config.PSG_CACHE_PATH.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('info', help='Print the number and total size of the entries.')
+    commands.add_parser('clear', help='Delete every entry.')
+    evict = commands.add_parser('evict', help='Delete the least recently used entries.')
+    evict.add_argument('--max-bytes', type=int, default=None,
+                       help='The size to fit in. Defaults to VSPEC.config.PSG_CACHE_MAX_BYTES.')
+    args = parser.parse_args(argv)
+
+    cache = PSGCache(path=args.path)
+    if args.command == 'clear':
+        cache.clear()
+    elif args.command == 'evict':
+        cache.evict(args.max_bytes)
+    print(f'{cache.path}: {len(cache)} entries, {cache.size} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Single-file store of PSG outputs
+"""
+from pathlib import Path
+from threading import Lock
+import typing
+import numpy as np
+import pandas as pd
+import h5py
+
+from VSPEC.config import N_ZFILL
+from VSPEC.psg_api import PSGrad
+from VSPEC.helpers import parse_lyr
+
+TABLE_EXTENSIONS = ('rad', 'noi')
+"""
+The output files that are read as a ``VSPEC.psg_api.PSGrad``.
+"""
+
+
+class PSGStore:
+    """
+    An HDF5 file that holds the output of ``ObservationModel.build_planet``.
+
+    There is one group per phase, with one subgroup per output
+    file named after the directory the file would otherwise be
+    written to. Each subgroup keeps the text of the file in a
+    gzip-compressed ``raw`` dataset. Spectra and layer files are
+    also parsed when they are written, and their numeric data is
+    kept in a ``values`` dataset with shape ``(n_columns, n_points)``
+    so that it can be read back without parsing the text again.
+
+    The file is opened for each write, so every finished run is on
+    disk before the next one starts.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The HDF5 file.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The HDF5 file.
+    """
+    # shared by every store, as HDF5 files cannot be safely opened by several threads at once
+    _lock = Lock()
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @staticmethod
+    def get_group_name(index: int) -> str:
+        """
+        Get the name of the group of a phase.
+
+        Parameters
+        ----------
+        index : int
+            The index of the phase.
+
+        Returns
+        -------
+        str
+            The zero-padded index.
+        """
+        return str(int(index)).zfill(N_ZFILL)
+
+    @staticmethod
+    def _write_file(group: h5py.Group, ext: str, content: bytes):
+        """
+        Write the text and, if it can be parsed, the numeric data of one file.
+        """
+        group.attrs['ext'] = ext
+        raw = np.frombuffer(content, dtype='uint8')
+        if len(raw) > 0:
+            group.create_dataset('raw', data=raw, compression='gzip')
+        else:
+            group.create_dataset('raw', data=raw)
+        try:
+            if ext in TABLE_EXTENSIONS:
+                rad = PSGrad.from_bytes(content)
+                values = np.stack([column.value for column in rad.data.values()])
+                group.attrs['header'] = [
+                    line.decode('UTF-8') for line in content.splitlines() if line.startswith(b'#')]
+            elif ext == 'lyr':
+                layers = parse_lyr(content.decode('UTF-8'))
+                if not all(dtype.kind == 'f' for dtype in layers.dtypes):
+                    return
+                values = layers.to_numpy(dtype='float64').T
+                group.attrs['columns'] = list(layers.columns)
+            else:
+                return
+        except (ValueError, IndexError):
+            # not a complete table, such as an empty layer file; only the text is kept
+            return
+        group.create_dataset('values', data=values,
+                             compression='gzip', shuffle=True)
+
+    def write(self, index: int, files: typing.List[tuple]):
+        """
+        Write output files of a phase, replacing any with the same name.
+
+        Parameters
+        ----------
+        index : int
+            The index of the phase.
+        files : list of tuple
+            The name, extension (e.g. ``'rad'``), and content of each file.
+        """
+        with self._lock:
+            with h5py.File(self.path, 'a') as fh5:
+                phase = fh5.require_group(self.get_group_name(index))
+                for name, ext, content in files:
+                    if name in phase:
+                        del phase[name]
+                    self._write_file(phase.create_group(name), ext, content)
+
+    def __contains__(self, index: int) -> bool:
+        if not self.path.exists():
+            return False
+        with self._lock:
+            with h5py.File(self.path, 'r') as fh5:
+                return self.get_group_name(index) in fh5
+
+    def get_raw(self, index: int, name: str) -> bytes:
+        """
+        Read the text of an output file.
+
+        Parameters
+        ----------
+        index : int
+            The index of the phase.
+        name : str
+            The name of the file.
+
+        Returns
+        -------
+        bytes
+            The content of the file.
+
+        Raises
+        ------
+        KeyError
+            If the file is not in the store.
+        """
+        with self._lock:
+            with h5py.File(self.path, 'r') as fh5:
+                return fh5[self.get_group_name(index)][name]['raw'][()].tobytes()
+
+    def get(self, index: int, name: str) -> typing.Union[PSGrad, pd.DataFrame, bytes]:
+        """
+        Read an output file.
+
+        Parameters
+        ----------
+        index : int
+            The index of the phase.
+        name : str
+            The name of the file.
+
+        Returns
+        -------
+        VSPEC.psg_api.PSGrad or pandas.DataFrame or bytes
+            A ``PSGrad`` for spectra, a DataFrame for layer files,
+            and the raw content of any other file.
+
+        Raises
+        ------
+        KeyError
+            If the file is not in the store.
+        """
+        with self._lock:
+            with h5py.File(self.path, 'r') as fh5:
+                group = fh5[self.get_group_name(index)][name]
+                ext = group.attrs['ext']
+                if 'values' not in group:
+                    content = group['raw'][()].tobytes()
+                elif ext in TABLE_EXTENSIONS:
+                    return PSGrad.from_table(list(group.attrs['header']), group['values'][()])
+                else:
+                    return pd.DataFrame(dict(zip(group.attrs['columns'], group['values'][()])))
+        if ext in TABLE_EXTENSIONS:
+            return PSGrad.from_bytes(content)
+        if ext == 'lyr':
+            return parse_lyr(content.decode('UTF-8'))
+        return content
+
+    def clear(self):
+        """
+        Delete the store.
+        """
+        with self._lock:
+            self.path.unlink(missing_ok=True)
@@ -1,4 +1,7 @@
 from VSPEC.spectra.binning import get_wavelengths, bin_spectra
 from VSPEC.spectra.phoenix import read_phoenix
-from VSPEC.spectra.grid import GridSpectra
+from VSPEC.spectra.cache import SpectraCache
+from VSPEC.spectra.lsf import LineSpreadFunction, GaussianLSF, TabulatedLSF
+from VSPEC.spectra.grid import GridSpectra, LazyGridSpectra
+from VSPEC.spectra.chunked import ChunkedGridSpectra
 from VSPEC.spectra.forward import ForwardSpectra
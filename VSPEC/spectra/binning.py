@@ -12,6 +12,9 @@ def get_wavelengths(resolving_power: int, lam1: float, lam2: float) -> np.ndarra
     Get wavelength points given a resolving power and a desired spectral range.
     Provides one more point than PSG, which is alows us to set a red bound on the last pixel.
 
+    Each point is :math:`1 + 1/R` times the one before it, starting at `lam1` and
+    ending with the first point at or beyond `lam2`.
+
     Parameters
     ----------
     resolving_power : int
@@ -26,13 +29,16 @@ def get_wavelengths(resolving_power: int, lam1: float, lam2: float) -> np.ndarra
     numpy.ndarray
         Wavelength points.
     """
-    lam = lam1
-    lams = [lam]
-    while lam < lam2:
-        dlam = lam / resolving_power
-        lam = lam + dlam
-        lams.append(lam)
-    lams = np.array(lams)
+    if lam1 >= lam2:
+        return np.array([lam1], dtype=float)
+    # each pixel is (1 + 1/R) times the last, so this is a geometric series
+    log_step = np.log1p(1/resolving_power)
+    n_steps = int(np.ceil(np.log(lam2/lam1)/log_step))
+    lams = lam1*np.exp(log_step*np.arange(n_steps+2))
+    # keep everything up to and including the first point at or beyond lam2
+    n_pixels = np.searchsorted(lams, lam2, side='left') + 1
+    lams = lams[:n_pixels]
+    lams[0] = lam1
     return lams
 
 
@@ -40,7 +46,10 @@ def bin_spectra(wl_old: np.array, fl_old: np.array, wl_new: np.array):
     """
     Bin spectra
 
-    This is a generic binning funciton.
+    This is a generic binning funciton. Each new pixel is the mean of the
+    old flux values between the midpoints to its neighbors. The bin edges
+    are located with ``numpy.searchsorted``, so this scales as
+    :math:`O(N \\log N)` rather than :math:`O(N_{new} N_{old})`.
 
     Parameters
     ----------
@@ -56,21 +65,27 @@ def bin_spectra(wl_old: np.array, fl_old: np.array, wl_new: np.array):
     fl_new : np.ndarray
         The new flux values.
     """
-    binned_flux = []
-    for i in range(len(wl_new) - 1):
-        lam_cen = wl_new[i]
-        upper = 0.5*(lam_cen + wl_new[i+1])
-        if i == 0:
-            # dl = upper - lam_cen # uncomment to sample blue of first pixel
-            lower = lam_cen  # - dl
-        else:
-            lower = 0.5*(lam_cen + wl_new[i-1])
-        if lower >= upper:
-            raise ValueError('Somehow lower is greater than upper!')
-        reg = (wl_old >= lower) & (wl_old < upper)
-        if not np.any(reg):
-            raise ValueError(
-                f'Some pixels must be selected!\nlower={lower}, upper={upper}')
-        binned_flux.append(fl_old[reg].mean())
-    binned_flux = np.array(binned_flux)
-    return binned_flux
+    wl_old = np.asarray(wl_old)
+    fl_old = np.asarray(fl_old)
+    wl_new = np.asarray(wl_new)
+    if len(wl_new) < 2:
+        return np.array([])
+    if np.any(np.diff(wl_old) < 0):
+        order = np.argsort(wl_old, kind='stable')
+        wl_old = wl_old[order]
+        fl_old = fl_old[order]
+    # pixel i spans [lower[i], upper[i]), split halfway to its neighbors
+    upper = 0.5*(wl_new[:-1] + wl_new[1:])
+    lower = np.append(wl_new[:1], upper[:-1])
+    if np.any(lower >= upper):
+        raise ValueError('Somehow lower is greater than upper!')
+    start = np.searchsorted(wl_old, lower, side='left')
+    stop = np.searchsorted(wl_old, upper, side='left')
+    counts = stop - start
+    if np.any(counts == 0):
+        i = np.argmax(counts == 0)
+        raise ValueError(
+            f'Some pixels must be selected!\nlower={lower[i]}, upper={upper[i]}')
+    # the pixels are contiguous, so each sum runs from one start to the next
+    sums = np.add.reduceat(fl_old[:stop[-1]], start)
+    return sums/counts
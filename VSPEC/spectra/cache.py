@@ -0,0 +1,219 @@
+"""
+Persistent cache of binned spectra
+"""
+from pathlib import Path
+from typing import Tuple, Union
+import hashlib
+import os
+import tempfile
+import zipfile
+from astropy import units as u
+import numpy as np
+
+from VSPEC import config
+
+CACHE_VERSION = 3
+"""
+The version of the cache file format. Changing this invalidates
+every existing entry.
+"""
+
+
+class SpectraCache:
+    """
+    A size-bounded, on-disk cache of binned spectra.
+
+    Each entry is a ``.npz`` file that stores the wavelength and flux
+    arrays along with the key it was written for and a checksum of the
+    data. Entries that fail either check are deleted and treated
+    as missing.
+
+    Parameters
+    ----------
+    path : pathlib.Path, default=None
+        The cache directory. Defaults to ``config.SPECTRA_CACHE_PATH``.
+    max_bytes : int, default=None
+        The maximum total size of the cache. Defaults to
+        ``config.SPECTRA_CACHE_MAX_BYTES``.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The cache directory.
+    max_bytes : int
+        The maximum total size of the cache.
+    """
+
+    def __init__(self, path: Path = None, max_bytes: int = None):
+        self.path = Path(config.SPECTRA_CACHE_PATH if path is None else path)
+        self.max_bytes = config.SPECTRA_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    @staticmethod
+    def get_key(teff: u.Quantity, R: int, w1: u.Quantity, w2: u.Quantity, lsf=None) -> str:
+        """
+        Get the key of a binned spectrum.
+
+        Parameters
+        ----------
+        teff : astropy.units.Quantity
+            The effective temperature of the model.
+        R : int
+            The resolving power.
+        w1 : astropy.units.Quantity
+            The blue wavelength limit.
+        w2 : astropy.units.Quantity
+            The red wavelength limit.
+        lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+            The line spread function the spectrum was convolved with, if any.
+
+        Returns
+        -------
+        str
+            A string that uniquely identifies the spectrum.
+        """
+        parts = [
+            f'v{CACHE_VERSION}',
+            f'{teff.to_value(config.teff_unit):.1f}',
+            f'{int(R)}',
+            f'{float(w1.to_value(config.wl_unit))!r}',
+            f'{float(w2.to_value(config.wl_unit))!r}'
+        ]
+        if lsf is not None:
+            parts.append(lsf.key)
+        return '|'.join(parts)
+
+    def get_filename(self, key: str) -> Path:
+        """
+        Get the file that stores an entry.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        pathlib.Path
+            The path to the entry.
+        """
+        digest = hashlib.sha256(key.encode('UTF-8')).hexdigest()
+        return self.path / f'{digest}.npz'
+
+    @staticmethod
+    def _checksum(wl: np.ndarray, fl: np.ndarray) -> str:
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(wl).tobytes())
+        digest.update(np.ascontiguousarray(fl).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Union[Tuple[u.Quantity, u.Quantity], None]:
+        """
+        Read an entry from the cache.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        tuple of astropy.units.Quantity or None
+            The wavelength and flux, or ``None`` if the entry is missing
+            or corrupt.
+        """
+        filename = self.get_filename(key)
+        if not filename.exists():
+            return None
+        try:
+            with np.load(filename, allow_pickle=False) as data:
+                wl = data['wl']
+                fl = data['fl']
+                valid = (
+                    str(data['key']) == key
+                    and str(data['checksum']) == self._checksum(wl, fl)
+                )
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            valid = False
+        if not valid:
+            filename.unlink(missing_ok=True)
+            return None
+        # mark as recently used
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            # evicted by another thread after it was read
+            pass
+        return wl*config.wl_unit, fl*config.flux_unit
+
+    def put(self, key: str, wl: u.Quantity, fl: u.Quantity):
+        """
+        Write an entry to the cache and evict old entries if needed.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        wl : astropy.units.Quantity
+            The wavelength axis.
+        fl : astropy.units.Quantity
+            The flux values.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        wl = np.asarray(wl.to_value(config.wl_unit), dtype='float64')
+        fl = np.asarray(fl.to_value(config.flux_unit), dtype='float64')
+        # write to a temporary file first so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(file, wl=wl, fl=fl, key=key,
+                         checksum=self._checksum(wl, fl))
+            os.replace(tmp, self.get_filename(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def _stat_entries(self) -> list:
+        """
+        Get each entry and its ``os.stat_result``, skipping entries deleted by another thread.
+        """
+        if not self.path.exists():
+            return []
+        entries = []
+        for file in self.path.glob('*.npz'):
+            try:
+                entries.append((file, file.stat()))
+            except FileNotFoundError:
+                pass
+        return entries
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the cache in bytes.
+
+        Returns
+        -------
+        int
+            The size of all entries.
+        """
+        return sum(stat.st_size for _, stat in self._stat_entries())
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache fits in `max_bytes`.
+        """
+        files = self._stat_entries()
+        total = sum(stat.st_size for _, stat in files)
+        for file, stat in sorted(files, key=lambda item: item[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def clear(self):
+        """
+        Delete every entry in the cache.
+        """
+        for file, _ in self._stat_entries():
+            file.unlink(missing_ok=True)
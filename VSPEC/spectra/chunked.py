@@ -0,0 +1,290 @@
+"""
+Multi-parameter spectral grids stored in chunked HDF5 files
+"""
+from collections import OrderedDict
+from itertools import product
+from pathlib import Path
+from typing import Tuple
+from astropy import units as u
+import numpy as np
+import h5py
+from tqdm.auto import tqdm
+
+from VSPEC import config
+from VSPEC.spectra.binning import get_wavelengths, bin_spectra
+from VSPEC.spectra.phoenix import RawReader, get_slice
+from VSPEC.spectra.grid import GridSpectra, get_axis_weights
+from VSPEC.spectra.lsf import LineSpreadFunction
+
+GRID_AXES = ('teff', 'logg', 'feh')
+"""
+The parameter axes of a chunked grid, in order. The wavelength
+axis is always last.
+"""
+
+
+def create_chunked_grid(
+    path: Path,
+    wl: u.Quantity,
+    teffs: u.Quantity,
+    loggs: np.ndarray,
+    fehs: np.ndarray,
+    chunk_size: int = None
+) -> h5py.File:
+    """
+    Create an empty chunked grid file.
+
+    The flux has shape ``(len(teffs), len(loggs), len(fehs), len(wl))`` and is
+    stored in gzip-compressed chunks of one spectrum by `chunk_size` pixels, so
+    a single node and wavelength range can be read without touching the rest.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to create.
+    wl : astropy.units.Quantity
+        The wavelength axis.
+    teffs : astropy.units.Quantity
+        The effective temperature axis.
+    loggs : numpy.ndarray
+        The surface gravity axis in dex (cgs).
+    fehs : numpy.ndarray
+        The metallicity axis in dex.
+    chunk_size : int, default=None
+        The number of wavelength points in each chunk. Defaults to
+        ``VSPEC.config.grid_wl_chunk_size``.
+
+    Returns
+    -------
+    h5py.File
+        The open file, ready for ``write_chunked_node``.
+    """
+    if chunk_size is None:
+        chunk_size = config.grid_wl_chunk_size
+    axes = (
+        np.sort(teffs.to_value(config.teff_unit)),
+        np.sort(np.atleast_1d(loggs).astype(float)),
+        np.sort(np.atleast_1d(fehs).astype(float))
+    )
+    wl_value = wl.to_value(config.wl_unit)
+    fh5 = h5py.File(path, 'w')
+    fh5['wavelength'] = wl_value
+    for name, axis in zip(GRID_AXES, axes):
+        fh5[name] = axis
+    fh5.create_dataset(
+        'flux',
+        shape=tuple(len(axis) for axis in axes) + (len(wl_value),),
+        dtype='float64',
+        chunks=(1, 1, 1, min(chunk_size, len(wl_value))),
+        compression='gzip',
+        shuffle=True,
+        fillvalue=np.nan
+    )
+    return fh5
+
+
+def write_chunked_node(
+    fh5: h5py.File,
+    teff: u.Quantity,
+    logg: float,
+    feh: float,
+    flux: u.Quantity
+):
+    """
+    Write the spectrum of one grid node.
+
+    Parameters
+    ----------
+    fh5 : h5py.File
+        A file made by ``create_chunked_grid``.
+    teff : astropy.units.Quantity
+        The effective temperature of the node.
+    logg : float
+        The surface gravity of the node.
+    feh : float
+        The metallicity of the node.
+    flux : astropy.units.Quantity
+        The flux of the node.
+
+    Raises
+    ------
+    ValueError
+        If the node is not on the grid.
+    """
+    index = []
+    for name, value in zip(GRID_AXES, (teff.to_value(config.teff_unit), logg, feh)):
+        matches = np.flatnonzero(fh5[name][()] == value)
+        if len(matches) == 0:
+            raise ValueError(f'{name}={value} is not on the grid.')
+        index.append(int(matches[0]))
+    fh5['flux'][tuple(index)] = flux.to_value(config.flux_unit)
+
+
+def build_chunked_phoenix_grid(
+    path: Path,
+    R: int,
+    w1: u.Quantity,
+    w2: u.Quantity,
+    teffs: u.Quantity,
+    loggs: np.ndarray = (5.0,),
+    fehs: np.ndarray = (0.0,),
+    lsf: LineSpreadFunction = None
+):
+    """
+    Bin raw PHOENIX models into a chunked grid file.
+
+    Each model is read, binned, and written before the next is loaded, so
+    memory use does not depend on the size of the grid.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to create.
+    R : int
+        The resolving power to bin to.
+    w1 : astropy.units.Quantity
+        The blue wavelength limit.
+    w2 : astropy.units.Quantity
+        The red wavelength limit.
+    teffs : astropy.units.Quantity
+        The effective temperature axis.
+    loggs : numpy.ndarray, default=(5.0,)
+        The surface gravity axis in dex (cgs).
+    fehs : numpy.ndarray, default=(0.0,)
+        The metallicity axis in dex.
+    lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+        An instrument line spread function to convolve each spectrum with.
+    """
+    wl = get_wavelengths(R, w1.to_value(config.wl_unit),
+                         w2.to_value(config.wl_unit))*config.wl_unit
+    with RawReader() as reader, create_chunked_grid(path, wl[:-1], teffs, loggs, fehs) as fh5:
+        nodes = list(product(teffs, np.atleast_1d(loggs), np.atleast_1d(fehs)))
+        for teff, logg, feh in tqdm(nodes, desc='Binning Spectra', total=len(nodes)):
+            wl_raw, fl_raw = reader.read(teff, wl[0], wl[-1], logg=logg, feh=feh)
+            flux = bin_spectra(
+                wl_old=wl_raw.to_value(config.wl_unit),
+                fl_old=fl_raw.to_value(config.flux_unit),
+                wl_new=wl.to_value(config.wl_unit)
+            )*config.flux_unit
+            if lsf is not None:
+                flux = lsf.convolve(wl[:-1], flux)
+            write_chunked_node(fh5, teff, float(logg), float(feh), flux)
+
+
+class ChunkedGridSpectra(GridSpectra):
+    """
+    A (Teff, log g, [Fe/H]) grid of spectra read from a chunked HDF5 file.
+
+    Only the wavelength range between `w1` and `w2` of the nodes that
+    bracket a requested point are read, and they are kept until ``close``
+    is called.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        A file made by ``create_chunked_grid``.
+    w1 : astropy.units.Quantity, default=None
+        The blue wavelength limit. If ``None``, start at the beginning of the grid.
+    w2 : astropy.units.Quantity, default=None
+        The red wavelength limit. If ``None``, stop at the end of the grid.
+    cache_size : int, default=None
+        The maximum number of spectra to keep in the
+        ``evaluate_cached`` memo. Defaults to
+        ``VSPEC.config.spectrum_cache_size``.
+
+    Attributes
+    ----------
+    axes : tuple of numpy.ndarray
+        The Teff, log g, and [Fe/H] node coordinates.
+    loaded : dict
+        The flux of each node that has been read, keyed by its index.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        w1: u.Quantity = None,
+        w2: u.Quantity = None,
+        cache_size: int = None
+    ):
+        self._file = h5py.File(path, 'r')
+        self.axes = tuple(self._file[name][()] for name in GRID_AXES)
+        self._axes = self.axes
+        wl = self._file['wavelength'][()]
+        self._slice = get_slice(
+            wl,
+            None if w1 is None else w1.to_value(config.wl_unit),
+            None if w2 is None else w2.to_value(config.wl_unit)
+        )
+        self._wl = wl[self._slice]
+        self.loaded = {}
+        self.cache_size = config.spectrum_cache_size if cache_size is None else cache_size
+        self._cache = OrderedDict()
+        self._cache_wl = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the grid file.
+        """
+        self._file.close()
+
+    @property
+    def wl(self) -> u.Quantity:
+        """
+        The wavelength axis of the loaded range.
+
+        :type: astropy.units.Quantity
+        """
+        return self._wl*config.wl_unit
+
+    def _get_node(self, index: Tuple[int, int, int]) -> np.ndarray:
+        if index not in self.loaded:
+            self.loaded[index] = self._file['flux'][index + (self._slice,)]
+        return self.loaded[index]
+
+    def _get_weights(self, *args) -> dict:
+        """
+        Get the interpolation weight of each node needed to reach a point.
+        """
+        weights = []
+        for name, axis, value in zip(GRID_AXES, self.axes, args + (None,)*(len(GRID_AXES) - len(args))):
+            if value is None:
+                if len(axis) != 1:
+                    raise ValueError(f'A value of {name} is required for this grid.')
+                value = axis[0]
+            weights.append(get_axis_weights(axis, float(value)))
+        return {
+            tuple(index for index, _ in combo): np.prod([weight for _, weight in combo])
+            for combo in product(*(weight.items() for weight in weights))
+        }
+
+    def evaluate(self, wl: u.Quantity, *args):
+        """
+        Evaluate the grid, reading any nodes that are needed.
+
+        Parameters
+        ----------
+        wl : astropy.units.Quantity
+            The wavelength coordinates to evaluate at.
+        args : list of float
+            The Teff, log g, and [Fe/H] to evaluate the grid at. Trailing
+            axes with a single node can be left out.
+
+        Returns
+        -------
+        numpy.ndarray
+            The flux of the grid at the evaluated points. Points outside
+            of the grid are ``nan``.
+        """
+        weights = self._get_weights(*args)
+        wl_value = np.atleast_1d(wl.to_value(config.wl_unit))
+        if len(weights) == 0:
+            return np.full(wl_value.shape, np.nan)
+        flux = sum(weight*self._get_node(index) for index, weight in weights.items())
+        return np.interp(wl_value, self._wl, flux, left=np.nan, right=np.nan)
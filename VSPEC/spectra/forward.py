@@ -3,6 +3,33 @@ import numpy as np
 from astropy import units as u, constants as c
 from VSPEC import config
 
+_BB_C1 = (2*c.h*c.c**2).to_value(config.flux_unit*config.wl_unit**5)
+_BB_C2 = (c.h*c.c/c.k_B).to_value(config.wl_unit*config.teff_unit)
+
+
+def blackbody_kernel(wl: np.ndarray, teff: np.ndarray) -> np.ndarray:
+    """
+    Evaluate Planck's law without units.
+
+    Parameters
+    ----------
+    wl : numpy.ndarray
+        The wavelength values in ``config.wl_unit``.
+    teff : float or numpy.ndarray
+        The temperature, or temperatures, in ``config.teff_unit``.
+
+    Returns
+    -------
+    numpy.ndarray
+        The flux in ``config.flux_unit``. If `teff` is an array the result
+        has shape ``(len(teff), len(wl))``.
+    """
+    wl = np.asarray(wl, dtype=float)
+    teff = np.asarray(teff, dtype=float)
+    if teff.ndim > 0:
+        teff = teff[:, np.newaxis]
+    return _BB_C1/wl**5/np.expm1(_BB_C2/(wl*teff))
+
 
 class ForwardSpectra:
     """
@@ -39,23 +66,25 @@ class ForwardSpectra:
 
             Parameters
             ----------
-            wl : jax.numpy.ndarray
-                The array of wavelength values in micrometers.
-            teff : float
-                The temperature in Kelvin.
+            wl : astropy.units.Quantity
+                The wavelength values.
+            teff : astropy.units.Quantity
+                The temperature, or an array of temperatures.
 
             Returns
             -------
-            jax.numpy.ndarray
+            astropy.units.Quantity
                 The flux values of the blackbody spectra at the given wavelength and temperature.
+                If `teff` is an array the result has shape ``(len(teff), len(wl))``.
 
             """
             if not wl.unit.physical_type == u.um.physical_type:
                 raise u.UnitTypeError('wl is wrong physical type')
             if not teff.unit.physical_type == u.K.physical_type:
                 raise u.UnitTypeError('teff is wrong physical type')
-            A = 2 * c.h * c.c**2/wl**5
-            B = np.exp(((c.h*c.c)/(wl*c.k_B*teff)
-                        ).to(u.dimensionless_unscaled)) - 1
-            return (A/B).to(config.flux_unit)
+            flux = blackbody_kernel(
+                wl.to_value(config.wl_unit),
+                teff.to_value(config.teff_unit, equivalencies=u.temperature())
+            )
+            return flux*config.flux_unit
         return cls(func)
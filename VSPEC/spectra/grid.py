@@ -1,4 +1,9 @@
 
+from collections import OrderedDict
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
 import numpy as np
 from jax import numpy as jnp
 from jax import jit
@@ -7,6 +12,9 @@ from astropy import units as u
 from tqdm.auto import tqdm
 
 from VSPEC.spectra import read_phoenix
+from VSPEC.spectra.binning import get_wavelengths
+from VSPEC.spectra.phoenix import get_binned_options
+from VSPEC.spectra.lsf import LineSpreadFunction
 from VSPEC.helpers import isclose
 from VSPEC import config
 
@@ -23,6 +31,10 @@ class GridSpectra:
         The flux values to place in the grid.
     params : tuple of numpy.ndarray
         The other axes of the grid.
+    cache_size : int, default=None
+        The maximum number of spectra to keep in the
+        ``evaluate_cached`` memo. Defaults to
+        ``VSPEC.config.spectrum_cache_size``.
 
     Examples
     --------
@@ -43,11 +55,15 @@ class GridSpectra:
 
     """
 
-    def __init__(self, wl: u.Quantity, spectra: list, *params):
+    def __init__(self, wl: u.Quantity, spectra: list, *params, cache_size: int = None):
         params = params + (wl.to_value(config.wl_unit),)
         spectra = np.array(spectra)
         # assert np.shape(spectra) == tuple([len(param) for param in params])
         self._evaluate = jit(RegularGridInterpolator(params, spectra))
+        self._axes = params[:-1]
+        self.cache_size = config.spectrum_cache_size if cache_size is None else cache_size
+        self._cache = OrderedDict()
+        self._cache_wl = None
 
     def evaluate(self, wl: u.Quantity, *args):
         """
@@ -70,13 +86,103 @@ class GridSpectra:
                       [wl.to_value(config.wl_unit)]).T
         return self._evaluate(X)
 
+    def warmup(self, wl: u.Quantity, *args) -> float:
+        """
+        Evaluate the grid once so that the first call in the epoch loop
+        does not pay for compiling the interpolator or reading nodes.
+
+        Parameters
+        ----------
+        wl : astropy.units.Quantity
+            The wavelength coordinates that will be evaluated.
+        args : list of float
+            The point on the other axes to evaluate. Defaults to the
+            first node of the grid.
+
+        Returns
+        -------
+        float
+            The time spent, in seconds.
+        """
+        if len(args) == 0:
+            args = [np.asarray(axis)[0] for axis in self._axes]
+        start = perf_counter()
+        np.asarray(self.evaluate(wl, *args))
+        return perf_counter() - start
+
+    def evaluate_cached(self, wl: u.Quantity, *args, scale: float = 1.0) -> np.ndarray:
+        """
+        Evaluate the grid, reusing the result of previous calls with the same `args`.
+
+        The stellar model only ever asks for a small set of Teffs, so each
+        one is interpolated once and then recalled. At most `cache_size`
+        spectra are kept, and the least recently used is evicted first.
+
+        Parameters
+        ----------
+        wl : astropy.units.Quantity
+            The wavelength coordinates to evaluate at.
+        args : list of float
+            The points on the other axes to evaluate the grid.
+        scale : float, default=1.0
+            A factor to multiply the flux by before it is stored.
+
+        Returns
+        -------
+        numpy.ndarray
+            The read-only flux of the grid at the evaluated points, times `scale`.
+        """
+        wl_value = wl.to_value(config.wl_unit)
+        if self._cache_wl is None or not np.array_equal(wl_value, self._cache_wl):
+            self._cache.clear()
+            self._cache_wl = np.array(wl_value)
+        key = (tuple(None if arg is None else float(arg) for arg in args), float(scale))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        flux = np.asarray(self.evaluate(wl, *args))*scale
+        flux.setflags(write=False)
+        self._cache[key] = flux
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return flux
+
+    def evaluate_matrix(self, wl: u.Quantity, points: list, scale: float = 1.0) -> np.ndarray:
+        """
+        Evaluate the grid at several points and stack the results.
+
+        Parameters
+        ----------
+        wl : astropy.units.Quantity
+            The wavelength coordinates to evaluate at.
+        points : list of float or list of tuple
+            The points on the other axes to evaluate the grid. Each element
+            is either a single value or a tuple in the order of `params`.
+        scale : float, default=1.0
+            A factor to multiply the flux by.
+
+        Returns
+        -------
+        numpy.ndarray
+            A dense array with shape ``(len(points), len(wl))``. Row ``i``
+            is the flux at ``points[i]``.
+        """
+        if len(points) == 0:
+            return np.zeros((0, len(wl)))
+        return np.vstack([
+            self.evaluate_cached(wl, *np.atleast_1d(point), scale=scale)
+            for point in points
+        ])
+
     @classmethod
     def from_vspec(
         cls,
         w1: u.Quantity,
         w2: u.Quantity,
         R: int,
-        teffs: u.Quantity
+        teffs: u.Quantity,
+        n_workers: int = None,
+        lsf: LineSpreadFunction = None
     ):
         """
         Load the default VSPEC PHOENIX grid.
@@ -91,12 +197,24 @@ class GridSpectra:
             The resolving power to use.
         teffs : astropy.units.Quantity
             The temperature coordinates to load.
+        n_workers : int, default=None
+            The number of spectra to load at once. Defaults to
+            ``VSPEC.config.spectra_load_workers``, or the number of CPUs
+            if that is ``None``. Use ``1`` to load serially.
+        lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+            An instrument line spread function to convolve each spectrum with.
 
+        Notes
+        -----
+        Each Teff is read and binned independently, and the work is spread
+        over threads. Raw models can instead be binned in a process pool
+        by setting ``VSPEC.config.spectra_load_processes``.
+        The grid is always assembled in the order of `teffs`.
         """
         specs = []
         wl = None
-        for teff in tqdm(teffs, desc='Loading Spectra', total=len(teffs)):
-            wave, flux = read_phoenix(teff, R, w1, w2)
+        results = iter_phoenix(teffs, R, w1, w2, n_workers, lsf)
+        for wave, flux in tqdm(results, desc='Loading Spectra', total=len(teffs)):
             specs.append(flux.to_value(config.flux_unit))
             if wl is None:
                 wl = wave
@@ -104,3 +222,243 @@ class GridSpectra:
                 if not np.all(isclose(wl, wave, 1e-6*u.um)):
                     raise ValueError('Wavelength values are different!')
         return cls(wl, np.array(specs), np.array([teff.to_value(config.teff_unit) for teff in teffs]))
+
+
+class LazyGridSpectra(GridSpectra):
+    """
+    A grid of PHOENIX spectra that are loaded the first time they are needed.
+
+    Only the Teff nodes that bracket a requested Teff are read and binned,
+    so startup time and memory depend on the temperatures a simulation
+    actually uses rather than on the size of the grid.
+
+    Parameters
+    ----------
+    w1 : astropy.units.Quantity
+        The blue wavelength limit.
+    w2 : astropy.units.Quantity
+        The red wavelength limit.
+    R : int
+        The resolving power to use.
+    teffs : astropy.units.Quantity
+        The temperature coordinates of the grid nodes.
+    lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+        An instrument line spread function to convolve each spectrum with.
+    cache_size : int, default=None
+        The maximum number of spectra to keep in the
+        ``evaluate_cached`` memo. Defaults to
+        ``VSPEC.config.spectrum_cache_size``.
+
+    Attributes
+    ----------
+    teffs : numpy.ndarray
+        The temperature of each grid node in ``config.teff_unit``.
+    loaded : dict
+        The flux of each node that has been loaded, keyed by its index.
+    """
+
+    def __init__(
+        self,
+        w1: u.Quantity,
+        w2: u.Quantity,
+        R: int,
+        teffs: u.Quantity,
+        lsf: LineSpreadFunction = None,
+        cache_size: int = None
+    ):
+        self.w1 = w1
+        self.w2 = w2
+        self.R = R
+        self.lsf = lsf
+        self.teffs = np.sort(teffs.to_value(config.teff_unit))
+        self._axes = (self.teffs,)
+        self.loaded = {}
+        # the wavelength of each pixel, without the red edge of the last one
+        self._wl = get_wavelengths(
+            R, w1.to_value(config.wl_unit), w2.to_value(config.wl_unit))[:-1]
+        self.cache_size = config.spectrum_cache_size if cache_size is None else cache_size
+        self._cache = OrderedDict()
+        self._cache_wl = None
+
+    def _add_node(self, index: int, wave: u.Quantity, flux: u.Quantity):
+        """
+        Store the output of ``read_phoenix`` for a node. `wave` holds the
+        pixel edges, so it has one more point than `flux`.
+        """
+        if len(wave) != len(self._wl) + 1 or not np.all(isclose(self._wl*config.wl_unit, wave[:-1], 1e-6*u.um)):
+            raise ValueError('Wavelength values are different!')
+        if len(flux) != len(self._wl):
+            raise ValueError(
+                f'Expected {len(self._wl)} flux values but got {len(flux)}.')
+        self.loaded[index] = flux.to_value(config.flux_unit)
+
+    def _get_node(self, index: int) -> np.ndarray:
+        if index not in self.loaded:
+            wave, flux = read_phoenix(
+                self.teffs[index]*config.teff_unit, self.R, self.w1, self.w2, lsf=self.lsf)
+            self._add_node(index, wave, flux)
+        return self.loaded[index]
+
+    def _get_weights(self, teff: float) -> dict:
+        """
+        Get the interpolation weight of each node needed to reach `teff`.
+        """
+        return get_axis_weights(self.teffs, teff)
+
+    def preload(self, teffs: u.Quantity, n_workers: int = None):
+        """
+        Load every node needed to evaluate the grid at `teffs`.
+
+        Parameters
+        ----------
+        teffs : astropy.units.Quantity
+            The temperatures that will be requested.
+        n_workers : int, default=None
+            The number of spectra to load at once. See ``GridSpectra.from_vspec``.
+        """
+        indices = set()
+        for teff in np.atleast_1d(teffs.to_value(config.teff_unit)):
+            indices.update(self._get_weights(teff).keys())
+        indices = sorted(indices - set(self.loaded))
+        if len(indices) == 0:
+            return
+        results = iter_phoenix(
+            self.teffs[indices]*config.teff_unit, self.R, self.w1, self.w2, n_workers, self.lsf)
+        for index, (wave, flux) in zip(indices, tqdm(results, desc='Loading Spectra', total=len(indices))):
+            self._add_node(index, wave, flux)
+
+    def evaluate(self, wl: u.Quantity, *args):
+        """
+        Evaluate the grid, loading any nodes that are needed.
+
+        Parameters
+        ----------
+        wl : astropy.units.Quantity
+            The wavelength coordinates to evaluate at.
+        args : list of float
+            The temperature to evaluate the grid at.
+
+        Returns
+        -------
+        numpy.ndarray
+            The flux of the grid at the evaluated points. Points outside
+            of the grid are ``nan``.
+        """
+        teff, = args
+        weights = self._get_weights(float(teff))
+        wl_value = np.atleast_1d(wl.to_value(config.wl_unit))
+        if len(weights) == 0:
+            return np.full(wl_value.shape, np.nan)
+        flux = sum(weight*self._get_node(index) for index, weight in weights.items())
+        return np.interp(
+            wl_value,
+            self._wl,
+            flux,
+            left=np.nan,
+            right=np.nan
+        )
+
+
+def get_axis_weights(axis: np.ndarray, value: float) -> dict:
+    """
+    Get the linear interpolation weights of the nodes on one grid axis.
+
+    Parameters
+    ----------
+    axis : numpy.ndarray
+        The sorted node coordinates.
+    value : float
+        The point to interpolate to.
+
+    Returns
+    -------
+    dict
+        The weight of each node needed to reach `value`, keyed by its index.
+        Empty if `value` is outside of `axis`.
+    """
+    if value < axis[0] or value > axis[-1]:
+        return {}
+    upper = int(np.searchsorted(axis, value, side='left'))
+    if axis[upper] == value:
+        return {upper: 1.0}
+    lower = upper - 1
+    frac = (value - axis[lower])/(axis[upper] - axis[lower])
+    return {lower: 1.0 - frac, upper: frac}
+
+
+def iter_phoenix(
+    teffs: u.Quantity,
+    R: int,
+    w1: u.Quantity,
+    w2: u.Quantity,
+    n_workers: int = None,
+    lsf: LineSpreadFunction = None,
+    use_processes: bool = None
+):
+    """
+    Read and bin several PHOENIX models, possibly in parallel.
+
+    Parameters
+    ----------
+    teffs : astropy.units.Quantity
+        The temperatures to load.
+    R : int
+        The resolving power to use.
+    w1 : astropy.units.Quantity
+        The blue wavelength limit.
+    w2 : astropy.units.Quantity
+        The red wavelength limit.
+    n_workers : int, default=None
+        The number of spectra to load at once. Defaults to
+        ``VSPEC.config.spectra_load_workers``, or the number of CPUs
+        if that is ``None``.
+    lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+        An instrument line spread function to convolve each spectrum with.
+    use_processes : bool, default=None
+        Whether to bin raw models in a process pool. Defaults to
+        ``VSPEC.config.spectra_load_processes``.
+
+    Yields
+    ------
+    tuple of astropy.units.Quantity
+        The output of ``read_phoenix`` for each Teff, in the order of `teffs`.
+
+    Notes
+    -----
+    Spectra are loaded in threads by default. If `use_processes` is set
+    and no pre-binned grid can be used, the raw models are binned in
+    processes started with ``spawn``, so the workers do not inherit the
+    threads or open files of this process. Spawned workers import the
+    ``__main__`` module again, so the calling script must guard its
+    entry point with ``if __name__ == '__main__':``.
+    """
+    if use_processes is None:
+        use_processes = config.spectra_load_processes
+    if n_workers is None:
+        n_workers = config.spectra_load_workers
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(teffs)))
+    args = [(teff, R, w1, w2, True, lsf) for teff in teffs]
+    if n_workers == 1:
+        yield from map(_read_phoenix, args)
+        return
+    if use_processes and not np.any(get_binned_options() >= R):
+        # spawn rather than fork, since JAX threads are running and HDF5 files may be open
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        executor = ThreadPoolExecutor(max_workers=n_workers)
+    with executor:
+        try:
+            yield from executor.map(_read_phoenix, args)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def _read_phoenix(args: tuple):
+    """
+    Unpack the arguments to ``read_phoenix``. Defined at module level so
+    that it can be sent to a process pool.
+    """
+    return read_phoenix(*args)
@@ -0,0 +1,287 @@
+"""
+Instrument line spread functions
+"""
+from astropy import units as u
+import numpy as np
+from scipy import sparse
+
+from VSPEC import config
+
+
+class LineSpreadFunction:
+    """
+    An instrument line spread function (LSF) with a width that may
+    change with wavelength.
+
+    The shape of the LSF is given by ``profile`` as a function of
+    :math:`x = \\Delta \\lambda / w(\\lambda)`, where :math:`w` is the
+    full width at half maximum. The width can be a constant, tabulated
+    against wavelength, or set by a resolving power.
+
+    Parameters
+    ----------
+    fwhm : astropy.units.Quantity, default=None
+        The full width at half maximum. A scalar, or an array tabulated at `wl`.
+    wl : astropy.units.Quantity, default=None
+        The wavelengths at which `fwhm` is tabulated.
+    resolving_power : float, default=None
+        If given, the FWHM is :math:`\\lambda / R` instead.
+
+    Attributes
+    ----------
+    fwhm : numpy.ndarray or None
+        The full width at half maximum in ``config.wl_unit``.
+    wl : numpy.ndarray or None
+        The wavelengths at which `fwhm` is tabulated in ``config.wl_unit``.
+    resolving_power : float or None
+        The resolving power of the LSF.
+
+    Raises
+    ------
+    ValueError
+        If not exactly one of `fwhm` and `resolving_power` is given.
+    """
+    support = 1.0
+    """
+    The half width of the kernel in units of FWHM. The profile is
+    zero outside of this range.
+
+    :type: float
+    """
+
+    def __init__(
+        self,
+        fwhm: u.Quantity = None,
+        wl: u.Quantity = None,
+        resolving_power: float = None
+    ):
+        if (fwhm is None) == (resolving_power is None):
+            raise ValueError(
+                'Exactly one of `fwhm` and `resolving_power` must be given.')
+        self.fwhm = None if fwhm is None else np.atleast_1d(
+            fwhm.to_value(config.wl_unit)).astype(float)
+        self.wl = None if wl is None else np.atleast_1d(
+            wl.to_value(config.wl_unit)).astype(float)
+        self.resolving_power = None if resolving_power is None else float(
+            resolving_power)
+
+    def profile(self, x: np.ndarray) -> np.ndarray:
+        """
+        The un-normalized shape of the LSF.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            The distance from line center in units of FWHM.
+
+        Returns
+        -------
+        numpy.ndarray
+            The value of the LSF at each `x`.
+        """
+        raise NotImplementedError
+
+    def get_fwhm(self, wl: np.ndarray) -> np.ndarray:
+        """
+        Get the full width at half maximum at each wavelength.
+
+        Parameters
+        ----------
+        wl : numpy.ndarray
+            The wavelengths in ``config.wl_unit``.
+
+        Returns
+        -------
+        numpy.ndarray
+            The FWHM in ``config.wl_unit``.
+        """
+        if self.resolving_power is not None:
+            return wl/self.resolving_power
+        if self.wl is None:
+            return np.full(np.shape(wl), self.fwhm[0])
+        return np.interp(wl, self.wl, self.fwhm)
+
+    @property
+    def key(self) -> str:
+        """
+        A string that identifies this LSF, used to cache convolved spectra.
+
+        :type: str
+        """
+        arrays = [] if self.fwhm is None else [self.fwhm]
+        if self.wl is not None:
+            arrays.append(self.wl)
+        values = ','.join(repr(float(v)) for arr in arrays for v in arr)
+        return f'{type(self).__name__}({self.resolving_power!r};{values})'
+
+    def get_matrix(self, wl: np.ndarray) -> sparse.csr_matrix:
+        """
+        Get the banded matrix that convolves a spectrum with this LSF.
+
+        Parameters
+        ----------
+        wl : numpy.ndarray
+            The sorted wavelength axis of the spectrum in ``config.wl_unit``.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            A square matrix. Row ``i`` holds the weights of each pixel
+            that contributes to pixel ``i`` and sums to one.
+
+        Notes
+        -----
+        Each row only spans the pixels within ``support`` FWHM of its
+        center, so building and applying the matrix scales as
+        :math:`O(N K)` for a kernel that is :math:`K` pixels wide.
+        """
+        wl = np.asarray(wl, dtype=float)
+        n = len(wl)
+        half_width = self.support*self.get_fwhm(wl)
+        start = np.searchsorted(wl, wl - half_width, side='left')
+        stop = np.searchsorted(wl, wl + half_width, side='right')
+        counts = stop - start
+        rows = np.repeat(np.arange(n), counts)
+        # column index of each nonzero: start of the row plus its offset in the row
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = np.repeat(start, counts) + offsets
+        # weight each pixel by its width so that uneven sampling is handled
+        pixel_width = np.gradient(wl) if n > 1 else np.ones(n)
+        x = (wl[cols] - wl[rows])/self.get_fwhm(wl)[rows]
+        weights = self.profile(x)*pixel_width[cols]
+        norm = np.bincount(rows, weights=weights, minlength=n)
+        norm[norm == 0] = 1
+        return sparse.csr_matrix((weights/norm[rows], (rows, cols)), shape=(n, n))
+
+    def convolve(self, wl: u.Quantity, flux: u.Quantity) -> u.Quantity:
+        """
+        Convolve a spectrum with this LSF.
+
+        Parameters
+        ----------
+        wl : astropy.units.Quantity
+            The wavelength of each point of `flux`.
+        flux : astropy.units.Quantity
+            The flux of the spectrum.
+
+        Returns
+        -------
+        astropy.units.Quantity
+            The convolved flux.
+
+        Raises
+        ------
+        ValueError
+            If `wl` and `flux` do not have the same length.
+        """
+        wl_value = np.atleast_1d(wl.to_value(config.wl_unit))
+        if len(wl_value) != len(flux):
+            raise ValueError(
+                f'`wl` has {len(wl_value)} points but `flux` has {len(flux)}.')
+        return (self.get_matrix(wl_value) @ flux.value)*flux.unit
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        """
+        Construct an LSF from a dictionary.
+
+        Parameters
+        ----------
+        d : dict
+            The ``kind`` key is ``'gaussian'`` or ``'tabulated'``. The width
+            is given by either ``resolving_power`` or ``fwhm`` (optionally
+            tabulated at ``wl``). A tabulated LSF also needs ``x`` and
+            ``profile``.
+
+        Returns
+        -------
+        LineSpreadFunction
+            The LSF described by `d`.
+        """
+        kinds = {'gaussian': GaussianLSF, 'tabulated': TabulatedLSF}
+        kind = str(d['kind']).lower()
+        if kind not in kinds:
+            raise ValueError(f'Unknown LSF kind: {kind}')
+        kwargs = dict(
+            fwhm=None if 'fwhm' not in d else _to_quantity(d['fwhm']),
+            wl=None if 'wl' not in d else _to_quantity(d['wl']),
+            resolving_power=d.get('resolving_power', None)
+        )
+        if kind == 'tabulated':
+            kwargs.update(x=np.array(d['x'], dtype=float),
+                          profile=np.array(d['profile'], dtype=float))
+        return kinds[kind](**kwargs)
+
+
+def _to_quantity(value) -> u.Quantity:
+    """
+    Read a quantity, or a list of quantities, from a parameter file.
+    """
+    if isinstance(value, (list, tuple)):
+        return u.Quantity([u.Quantity(v) for v in value])
+    return u.Quantity(value)
+
+
+class GaussianLSF(LineSpreadFunction):
+    """
+    A Gaussian line spread function.
+
+    Parameters
+    ----------
+    fwhm : astropy.units.Quantity, default=None
+        The full width at half maximum. A scalar, or an array tabulated at `wl`.
+    wl : astropy.units.Quantity, default=None
+        The wavelengths at which `fwhm` is tabulated.
+    resolving_power : float, default=None
+        If given, the FWHM is :math:`\\lambda / R` instead.
+    """
+    support = 1.5
+    """
+    The Gaussian is truncated at 1.5 FWHM (about 3.5 sigma).
+
+    :type: float
+    """
+
+    def profile(self, x: np.ndarray) -> np.ndarray:
+        return np.exp(-4*np.log(2)*x**2)
+
+
+class TabulatedLSF(LineSpreadFunction):
+    """
+    A line spread function with a tabulated shape.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        The distance from line center in units of FWHM.
+    profile : numpy.ndarray
+        The value of the LSF at each `x`.
+    fwhm : astropy.units.Quantity, default=None
+        The full width at half maximum. A scalar, or an array tabulated at `wl`.
+    wl : astropy.units.Quantity, default=None
+        The wavelengths at which `fwhm` is tabulated.
+    resolving_power : float, default=None
+        If given, the FWHM is :math:`\\lambda / R` instead.
+    """
+
+    def __init__(
+        self,
+        x: np.ndarray,
+        profile: np.ndarray,
+        fwhm: u.Quantity = None,
+        wl: u.Quantity = None,
+        resolving_power: float = None
+    ):
+        super().__init__(fwhm=fwhm, wl=wl, resolving_power=resolving_power)
+        order = np.argsort(x)
+        self.x = np.asarray(x, dtype=float)[order]
+        self.values = np.asarray(profile, dtype=float)[order]
+        self.support = float(np.max(np.abs(self.x)))
+
+    def profile(self, x: np.ndarray) -> np.ndarray:
+        return np.interp(x, self.x, self.values, left=0.0, right=0.0)
+
+    @property
+    def key(self) -> str:
+        table = ','.join(repr(float(v)) for v in np.concatenate([self.x, self.values]))
+        return f'{super().key}[{table}]'
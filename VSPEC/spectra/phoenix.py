@@ -6,15 +6,54 @@ from astropy import units as u
 import numpy as np
 import pandas as pd
 from os import listdir
+from threading import Lock
+import atexit
 import h5py
 
 from VSPEC.config import RAW_PHOENIX_PATH, BINNED_PHOENIX_PATH
 from VSPEC import config
 from VSPEC.spectra import get_wavelengths, bin_spectra
+from VSPEC.spectra.cache import SpectraCache
+from VSPEC.spectra.lsf import LineSpreadFunction
 
 WL_UNIT_NEXTGEN = u.AA
 FL_UNIT_NEXGEN = u.Unit('erg cm-2 s-1 cm-1')
 
+STACK_FILENAMES = {
+    'wavelength': 'wavelength.npy',
+    'teff': 'teff.npy',
+    'flux': 'flux.npy'
+}
+"""
+The files that make up the binary stack of binned spectra for a single
+resolving power. They are stored in ``config`` units.
+"""
+
+
+def get_slice(wl: np.ndarray, w1: float = None, w2: float = None) -> slice:
+    """
+    Get the slice of a sorted wavelength axis that covers a wavelength range.
+
+    One extra point is kept on each side so that the range is bracketed.
+
+    Parameters
+    ----------
+    wl : numpy.ndarray
+        The sorted wavelength axis.
+    w1 : float, default=None
+        The blue limit. If ``None``, start at the beginning of `wl`.
+    w2 : float, default=None
+        The red limit. If ``None``, stop at the end of `wl`.
+
+    Returns
+    -------
+    slice
+        The slice of `wl` to keep.
+    """
+    start = 0 if w1 is None else max(np.searchsorted(wl, w1, side='left') - 1, 0)
+    stop = None if w2 is None else np.searchsorted(wl, w2, side='right') + 1
+    return slice(start, stop)
+
 
 def get_binned_options():
     """
@@ -31,13 +70,32 @@ def get_binned_options():
 
 
 class RawReader:
+    """
+    Reader for the raw PHOENIX models.
+
+    Files are opened the first time they are read and kept open until
+    ``close`` is called, and the wavelength axis, which is shared by every
+    model, is read once and reused. A reader can be shared by several
+    threads.
+    """
     _path = RAW_PHOENIX_PATH
     _teff_unit = config.teff_unit
     _wl_unit_model = WL_UNIT_NEXTGEN
     _fl_unit_model = FL_UNIT_NEXGEN
 
+    def __init__(self):
+        self._files = {}
+        self._wl = None
+        self._lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     @staticmethod
-    def get_filename(teff: u.Quantity) -> str:
+    def get_filename(teff: u.Quantity, logg: float = 5.0, feh: float = 0.0) -> str:
         """
         Get the filename for a raw PHOENIX model.
 
@@ -45,15 +103,61 @@ class RawReader:
         ----------
         teff : astropy.units.Quantity
             The effective temperature of the model
+        logg : float, default=5.0
+            The surface gravity of the model in dex (cgs).
+        feh : float, default=0.0
+            The metallicity of the model in dex.
 
         Returns
         -------
         str
             The filename of the model.
         """
-        return f'lte0{teff.to_value(config.teff_unit):.0f}-5.00-0.0.PHOENIX-ACES-AGSS-COND-2011.HR.h5'
+        # PHOENIX writes solar metallicity as -0.0
+        feh_str = '-0.0' if feh == 0 else f'{feh:+.1f}'
+        return f'lte{teff.to_value(config.teff_unit):05.0f}-{logg:.2f}{feh_str}.PHOENIX-ACES-AGSS-COND-2011.HR.h5'
+
+    def _open(self, teff: u.Quantity, logg: float = 5.0, feh: float = 0.0) -> h5py.File:
+        path = self._path/self.get_filename(teff, logg, feh)
+        with self._lock:
+            if path not in self._files:
+                self._files[path] = h5py.File(path, 'r')
+            return self._files[path]
+
+    def _get_wavelength(self, dset: h5py.Dataset) -> np.ndarray:
+        """
+        Get the wavelength axis of a model in model units.
 
-    def read(self, teff: u.Quantity):
+        The cached axis is reused if the dataset has the same shape
+        and end points.
+        """
+        with self._lock:
+            if (
+                self._wl is None
+                or self._wl.shape != dset.shape
+                or self._wl[0] != dset[0]
+                or self._wl[-1] != dset[-1]
+            ):
+                self._wl = dset[()]
+            return self._wl
+
+    def close(self):
+        """
+        Close every open file.
+        """
+        with self._lock:
+            for fh5 in self._files.values():
+                fh5.close()
+            self._files.clear()
+
+    def read(
+        self,
+        teff: u.Quantity,
+        w1: u.Quantity = None,
+        w2: u.Quantity = None,
+        logg: float = 5.0,
+        feh: float = 0.0
+    ):
         """
         Read a raw PHOENIX model.
 
@@ -61,6 +165,14 @@ class RawReader:
         ----------
         teff : astropy.units.Quantity
             The effective temperature of the model.
+        w1 : astropy.units.Quantity, default=None
+            The blue wavelength limit. If ``None``, read from the start of the model.
+        w2 : astropy.units.Quantity, default=None
+            The red wavelength limit. If ``None``, read to the end of the model.
+        logg : float, default=5.0
+            The surface gravity of the model in dex (cgs).
+        feh : float, default=0.0
+            The metallicity of the model in dex.
 
         Returns
         -------
@@ -68,15 +180,31 @@ class RawReader:
             The wavelength axis of the model.
         fl : astropy.units.Quantity
             The flux values of the model.
+
+        Notes
+        -----
+        Only the part of the model between `w1` and `w2`, plus one point on
+        either side, is read from disk.
         """
-        fh5 = h5py.File(self._path/self.get_filename(teff), 'r')
-        wl = fh5['PHOENIX_SPECTRUM/wl'][()] * self._wl_unit_model
-        fl = 10.**fh5['PHOENIX_SPECTRUM/flux'][()] * self._fl_unit_model
+        fh5 = self._open(teff, logg, feh)
+        wl = self._get_wavelength(fh5['PHOENIX_SPECTRUM/wl'])
+        s = get_slice(
+            wl,
+            None if w1 is None else w1.to_value(self._wl_unit_model),
+            None if w2 is None else w2.to_value(self._wl_unit_model)
+        )
+        wl = wl[s] * self._wl_unit_model
+        fl = 10.**fh5['PHOENIX_SPECTRUM/flux'][s] * self._fl_unit_model
         wl = wl.to(config.wl_unit)
         fl = fl.to(config.flux_unit)
         return wl, fl
 
 
+# shared by every call to ``read_phoenix`` so that files stay open across Teffs
+_RAW_READER = RawReader()
+atexit.register(_RAW_READER.close)
+
+
 class BinnedReader:
     _path = BINNED_PHOENIX_PATH
     _teff_unit = config.teff_unit
@@ -117,16 +245,116 @@ class BinnedReader:
         """
         return f'binned{teff.to_value(config.teff_unit):.0f}StellarModel.txt'
 
-    def read(self, R: int, teff: u.Quantity):
+    def get_stack_path(self, R: int) -> Path:
+        """
+        Get the directory of the binary stack of models with a resolving power ``R``.
+
+        Parameters
+        ----------
+        R : int
+            The resolving power.
+
+        Returns
+        -------
+        pathlib.Path
+            The directory containing the stack files.
+        """
+        return self._path / self.get_dirname(R)
+
+    def has_stack(self, R: int) -> bool:
+        """
+        Check if a binary stack exists for a resolving power ``R``.
+
+        Parameters
+        ----------
+        R : int
+            The resolving power.
+
+        Returns
+        -------
+        bool
+            True if all of the stack files exist.
+        """
+        path = self.get_stack_path(R)
+        return all((path/filename).exists() for filename in STACK_FILENAMES.values())
+
+    def read_stack(self, R: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Memory-map the binary stack of models with a resolving power ``R``.
+
+        Parameters
+        ----------
+        R : int
+            The resolving power.
+
+        Returns
+        -------
+        wl : numpy.ndarray
+            The shared wavelength axis in ``config.wl_unit``.
+        teffs : numpy.ndarray
+            The effective temperatures in ``config.teff_unit``.
+        fl : numpy.ndarray
+            The flux with shape ``(len(teffs), len(wl))`` in
+            ``config.flux_unit``.
+        """
+        path = self.get_stack_path(R)
+        wl = np.load(path/STACK_FILENAMES['wavelength'], mmap_mode='r')
+        teffs = np.load(path/STACK_FILENAMES['teff'])
+        fl = np.load(path/STACK_FILENAMES['flux'], mmap_mode='r')
+        return wl, teffs, fl
+
+    def read(self, R: int, teff: u.Quantity, w1: u.Quantity = None, w2: u.Quantity = None):
         """
         Read a binned PHOENIX model spectrum
 
+        The binary stack is used if it exists and contains `teff`. Otherwise
+        the text file is parsed.
+
+        Parameters
+        ----------
+        R : int
+            The resolving power
+        teff : astropy.units.Quantity
+            The effective temperature
+        w1 : astropy.units.Quantity, default=None
+            The blue wavelength limit. If given with `w2`, only the points
+            needed to cover the range are read.
+        w2 : astropy.units.Quantity, default=None
+            The red wavelength limit.
+
+        Returns
+        -------
+        wl : astropy.units.Quantity
+            The wavelength axis of the model.
+        fl : astropy.units.Quantity
+            The flux values of the model.
+        """
+        w1 = None if w1 is None else w1.to_value(config.wl_unit)
+        w2 = None if w2 is None else w2.to_value(config.wl_unit)
+        if self.has_stack(R):
+            wl, teffs, fl = self.read_stack(R)
+            index = np.flatnonzero(np.isclose(teffs, teff.to_value(config.teff_unit)))
+            if len(index) > 0:
+                sl = get_slice(wl, w1, w2)
+                wl = np.array(wl[sl])*config.wl_unit
+                fl = np.array(fl[index[0], sl], dtype='float64')*config.flux_unit
+                return wl, fl
+        return self.read_text(R, teff, w1, w2)
+
+    def read_text(self, R: int, teff: u.Quantity, w1: float = None, w2: float = None):
+        """
+        Read a binned PHOENIX model spectrum from its text file.
+
         Parameters
         ----------
         R : int
             The resolving power
         teff : astropy.units.Quantity
             The effective temperature
+        w1 : float, default=None
+            The blue wavelength limit in ``config.wl_unit``.
+        w2 : float, default=None
+            The red wavelength limit in ``config.wl_unit``.
 
         Returns
         -------
@@ -145,14 +373,17 @@ class BinnedReader:
         fl = data[flux_col].values * u.Unit(flux_unit_str)
         wl = wl.to(config.wl_unit)
         fl = fl.to(config.flux_unit)
-        return wl, fl
+        sl = get_slice(wl.value, w1, w2)
+        return wl[sl], fl[sl]
 
 
 def read_phoenix(
     teff: u.Quantity,
     R: int,
     w1: u.Quantity,
-    w2: u.Quantity
+    w2: u.Quantity,
+    use_cache: bool = True,
+    lsf: LineSpreadFunction = None
 ) -> Tuple[u.Quantity, u.Quantity]:
     """
     Read a PHOENIX model and return an appropriately binned version
@@ -167,23 +398,41 @@ def read_phoenix(
         The blue wavelength limit.
     w2 : astropy.units.Quantity
         The red wavelenght limit.
+    use_cache : bool, default=True
+        If there is no pre-binned grid with a resolving power of at least `R`,
+        look for the result in the user-level ``SpectraCache`` before binning
+        the raw model, and store it there afterwards.
+    lsf : VSPEC.spectra.lsf.LineSpreadFunction, default=None
+        If given, convolve the binned spectrum with this instrument line
+        spread function. Convolved spectra are always kept in the
+        ``SpectraCache`` when `use_cache` is ``True``.
 
     Returns
     -------
     wl_new : astropy.units.Quantity
-            The wavelength axis of the model.
+            The wavelength axis of the model. The last point is the red
+            edge of the last pixel, so there is one more point than in `fl_new`.
     fl_new : astropy.units.Quantity
         The flux values of the model.
     """
+    wl_new: u.Quantity = get_wavelengths(R, w1.to_value(
+        config.wl_unit), w2.to_value(config.wl_unit))*config.wl_unit
     binned_options = get_binned_options()
     options_gte = binned_options >= R
+    cache = None
+    if use_cache and (lsf is not None or not np.any(options_gte)):
+        cache = SpectraCache()
+        key = cache.get_key(teff, R, w1, w2, lsf)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     if not np.any(options_gte):
-        wl, flux = RawReader().read(teff)
+        wl, flux = _RAW_READER.read(teff, wl_new[0], wl_new[-1])
     else:
         binned_R = np.min(binned_options[options_gte])
-        wl, flux = BinnedReader().read(binned_R, teff)
-    wl_new: u.Quantity = get_wavelengths(R, w1.to_value(
-        config.wl_unit), w2.to_value(config.wl_unit))*config.wl_unit
+        wl, flux = BinnedReader().read(binned_R, teff, wl_new[0], wl_new[-1])
+    # the last point is only the red edge of the last pixel
+    pixel_wl = wl_new[:-1]
     try:
         fl_new = bin_spectra(
             wl_old=wl.to_value(config.wl_unit),
@@ -195,7 +444,11 @@ def read_phoenix(
             points=[wl.to_value(config.wl_unit)],
             values=flux.to_value(config.flux_unit)
         )
-        fl_new = interp(wl_new.to_value(config.wl_unit))*config.flux_unit
+        fl_new = interp(pixel_wl.to_value(config.wl_unit))*config.flux_unit
+    if lsf is not None:
+        fl_new = lsf.convolve(pixel_wl, fl_new)
+    if cache is not None:
+        cache.put(key, wl_new, fl_new)
     return wl_new, fl_new
 
 
@@ -218,9 +471,83 @@ def write_binned_spectrum(
     """
     if not path.parent.exists():
         path.parent.mkdir()
-    with open(path, 'w', encoding='UTF-8') as file:
-        wavelength_unit_str = str(wavelength.unit)
-        flux_unit_str = str(flux.unit)
-        file.write(f'wavelength[{wavelength_unit_str}], flux[{flux_unit_str}]')
-        for wl, fl in zip(wavelength.value, flux.value):
-            file.write(f'\n{wl:.6e}, {fl:.6e}')
+    wavelength_unit_str = str(wavelength.unit)
+    flux_unit_str = str(flux.unit)
+    np.savetxt(
+        path,
+        np.column_stack([wavelength.value, flux.value]),
+        fmt='%.6e',
+        delimiter=', ',
+        header=f'wavelength[{wavelength_unit_str}], flux[{flux_unit_str}]',
+        comments='',
+        encoding='UTF-8'
+    )
+
+
+def write_binned_stack(
+    path: Path,
+    wavelength: u.Quantity,
+    teffs: u.Quantity,
+    flux: u.Quantity
+):
+    """
+    Write a binary stack of binned spectra that share a wavelength axis.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The directory to write the stack files to.
+    wavelength : astropy.units.Quantity
+        The shared wavelength axis.
+    teffs : astropy.units.Quantity
+        The effective temperature of each spectrum.
+    flux : astropy.units.Quantity
+        The flux values with shape ``(len(teffs), len(wavelength))``.
+        These are stored as ``float64``, since the flux of cool models
+        falls below the range of ``float32`` at short wavelengths.
+    """
+    if flux.shape != (len(teffs), len(wavelength)):
+        raise ValueError('flux must have shape (len(teffs), len(wavelength)).')
+    if not path.exists():
+        path.mkdir(parents=True)
+    np.save(path/STACK_FILENAMES['wavelength'],
+            wavelength.to_value(config.wl_unit).astype('float64'))
+    np.save(path/STACK_FILENAMES['teff'],
+            teffs.to_value(config.teff_unit).astype('float64'))
+    np.save(path/STACK_FILENAMES['flux'],
+            flux.to_value(config.flux_unit).astype('float64'))
+
+
+def convert_binned_to_stack(R: int):
+    """
+    Convert the text files of binned spectra at a resolving power ``R`` into a binary stack.
+
+    Parameters
+    ----------
+    R : int
+        The resolving power.
+
+    Raises
+    ------
+    ValueError
+        If the spectra do not share a wavelength axis.
+    """
+    reader = BinnedReader()
+    path = reader.get_stack_path(R)
+    filenames = sorted(listdir(path))
+    teffs = [
+        int(filename.replace('binned', '').replace('StellarModel.txt', ''))
+        for filename in filenames if filename.endswith('StellarModel.txt')
+    ]*config.teff_unit
+    teffs = np.sort(teffs)
+    wl = None
+    fluxes = []
+    for teff in teffs:
+        # read the text files, not a stack that is about to be replaced
+        wave, flux = reader.read_text(R, teff)
+        if wl is None:
+            wl = wave
+        elif not np.all(np.isclose(wl, wave, rtol=1e-6)):
+            raise ValueError('Wavelength values are different!')
+        fluxes.append(flux.to_value(config.flux_unit))
+    write_binned_stack(path, wl, teffs, np.array(fluxes)*config.flux_unit)
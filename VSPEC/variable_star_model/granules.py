@@ -1,13 +1,16 @@
 """
 Granulation model for VSPEC
 """
+from time import perf_counter
 import jax
 import jax.numpy as jnp
 from tinygp import kernels, GaussianProcess
+from tinygp.kernels import quasisep
 from astropy import units as u
 import numpy as np
 
 from VSPEC.params import GranulationParameters
+from VSPEC import config
 
 time_unit = u.hr
 
@@ -66,6 +69,171 @@ def build_gp(params: dict, X: np.ndarray) -> GaussianProcess:
     )
 
 
+def build_quasisep_kernel(params: dict) -> quasisep.Quasisep:
+    """
+    Build the state-space form of the granulation kernel.
+
+    Parameters
+    ----------
+    params : dict
+        GP parameters for this instance.
+
+    Returns
+    -------
+    tinygp.kernels.quasisep.Quasisep
+        A kernel equivalent to ``GranulationKernel``.
+
+    Notes
+    -----
+    ``GranulationKernel`` is a damped simple harmonic oscillator with
+    :math:`Q = 1/\\sqrt{2}`, so each term can be written as a
+    ``tinygp.kernels.quasisep.SHO`` kernel with :math:`\\omega_0 = 1/P` and
+    :math:`\\sigma^2 = S/(\\sqrt{2}P)`.
+    """
+    scales = np.atleast_1d(params['scale'])
+    periods = np.atleast_1d(params['period'])*np.ones_like(scales)
+    return sum(
+        quasisep.SHO(
+            omega=1/period,
+            quality=1/np.sqrt(2),
+            sigma=np.sqrt(scale/period/np.sqrt(2))
+        ) for scale, period in zip(scales, periods)
+    )
+
+
+def _psd_sqrt(cov: jnp.ndarray) -> jnp.ndarray:
+    """
+    Matrix square root of a positive semi-definite matrix.
+
+    Small negative eigenvalues caused by round-off are clipped to zero.
+    """
+    eigval, eigvec = jnp.linalg.eigh(cov)
+    return eigvec * jnp.sqrt(jnp.clip(eigval, 0, None))
+
+
+@jax.jit
+def _propagate_state(
+    kernel: quasisep.Quasisep,
+    X: jnp.ndarray,
+    key: jax.Array,
+    state: jnp.ndarray = None,
+    x_prev: float = None
+):
+    """
+    Propagate the GP state across `X`.
+
+    If `state` is ``None`` the first state is drawn from the stationary
+    distribution. Otherwise the process continues from `state`, which
+    was reached at `x_prev`.
+
+    Returns the zero-mean sample at each point in `X` and the final state.
+    """
+    p_inf = kernel.stationary_covariance()
+    h = jax.vmap(kernel.observation_model)(X)
+    if state is None:
+        state = jnp.zeros(p_inf.shape[0])
+        X_prev = jnp.append(X[0], X[:-1])
+    else:
+        X_prev = jnp.append(x_prev, X[:-1])
+    # tinygp stores the transpose of the state transition matrix
+    trans = jax.vmap(kernel.transition_matrix)(X_prev, X).transpose(0, 2, 1)
+    process_cov = p_inf - trans @ p_inf @ trans.transpose(0, 2, 1)
+    if x_prev is None:
+        process_cov = process_cov.at[0].set(p_inf)
+    noise = jnp.einsum(
+        'nij,nj->ni',
+        jax.vmap(_psd_sqrt)(process_cov),
+        jax.random.normal(key, (X.shape[0], p_inf.shape[0]))
+    )
+
+    def step(state, inputs):
+        transition, innovation = inputs
+        state = transition @ state + innovation
+        return state, state
+    state, states = jax.lax.scan(step, state, (trans, noise))
+    return jnp.sum(h*states, axis=1), state
+
+
+def sample_state_space(
+    kernel: quasisep.Quasisep,
+    X: np.ndarray,
+    key: jax.Array,
+    mean: float = 0.0
+) -> jnp.ndarray:
+    """
+    Draw a sample from a GP using its state-space representation.
+
+    Parameters
+    ----------
+    kernel : tinygp.kernels.quasisep.Quasisep
+        The kernel of the GP.
+    X : np.ndarray
+        The sorted time coordinates to sample at.
+    key : jax.Array
+        The random key to use.
+    mean : float, default=0.0
+        The mean of the GP.
+
+    Returns
+    -------
+    jax.numpy.ndarray
+        The sample at each point in `X`.
+
+    Notes
+    -----
+    The state is propagated exactly between samples, so this scales as
+    :math:`O(N)` in time and memory rather than the :math:`O(N^3)` and
+    :math:`O(N^2)` of a dense ``tinygp.GaussianProcess``. No diagonal
+    jitter is needed.
+    """
+    sample, _ = _propagate_state(kernel, jnp.asarray(X), key)
+    return mean + sample
+
+
+def iter_state_space(
+    kernel: quasisep.Quasisep,
+    X: np.ndarray,
+    key: jax.Array,
+    mean: float = 0.0,
+    chunk_size: int = 10000
+):
+    """
+    Draw a sample from a GP one chunk at a time.
+
+    Each chunk is conditioned on the final state of the previous chunk, so
+    the series is continuous across chunk boundaries and memory use is
+    bounded by `chunk_size`.
+
+    Parameters
+    ----------
+    kernel : tinygp.kernels.quasisep.Quasisep
+        The kernel of the GP.
+    X : np.ndarray
+        The sorted time coordinates to sample at.
+    key : jax.Array
+        The random key to use.
+    mean : float, default=0.0
+        The mean of the GP.
+    chunk_size : int, default=10000
+        The number of points to draw at once.
+
+    Yields
+    ------
+    jax.numpy.ndarray
+        The sample at each point in the next chunk of `X`.
+    """
+    if chunk_size < 1:
+        raise ValueError('`chunk_size` must be positive.')
+    state = None
+    x_prev = None
+    for i, start in enumerate(range(0, len(X), chunk_size)):
+        chunk = jnp.asarray(X[start:start+chunk_size])
+        sample, state = _propagate_state(
+            kernel, chunk, jax.random.fold_in(key, i), state, x_prev)
+        x_prev = chunk[-1]
+        yield mean + sample
+
+
 def save_cast_coverage(coverage: np.ndarray):
     """
     Safely cast coverage array so that each value is on [0,1]
@@ -138,21 +306,115 @@ class Granulation:
     def _build_gp(self, X: np.ndarray) -> GaussianProcess:
         return build_gp(self.params, X)
 
-    def get_coverage(self, time: u.Quantity) -> np.ndarray:
+    def get_coverage(self, time: u.Quantity, chunk_size: int = None) -> np.ndarray:
         """
         Get low-Teff region coverage at each point in time.
 
+        The GP is sampled through its state-space representation, so the
+        cost is linear in the number of epochs.
+
         Parameters
         ----------
         time : astropy.units.Quantity
             The time axis to generate coverages of.
+        chunk_size : int, default=None
+            If given, draw the GP `chunk_size` points at a time
+            (see ``Granulation.iter_coverage``).
 
         Returns
         -------
         np.ndarray
             The coverage corresponding to each point in `time`.
         """
-        key = jax.random.PRNGKey(seed=self.seed)
-        gp = self._build_gp(time.to_value(time_unit))
-        coverage = gp.sample(key)
-        return save_cast_coverage(np.array(coverage))
+        X = time.to_value(time_unit)
+        order = np.argsort(X)
+        coverage = np.empty_like(X, dtype=float)
+        if chunk_size is None:
+            coverage[order] = sample_state_space(
+                build_quasisep_kernel(self.params),
+                X[order],
+                jax.random.PRNGKey(seed=self.seed),
+                mean=self.params['mean']
+            )
+        else:
+            coverage[order] = np.concatenate(
+                list(self.iter_coverage(time[order], chunk_size)))
+        return save_cast_coverage(coverage)
+
+    def iter_coverage(self, time: u.Quantity, chunk_size: int = None):
+        """
+        Get low-Teff region coverage one chunk at a time.
+
+        Each chunk is conditioned on the end of the previous one, so the
+        series is continuous across chunk boundaries. Only one chunk is
+        held in memory at once.
+
+        Parameters
+        ----------
+        time : astropy.units.Quantity
+            The time axis to generate coverages of. Must be sorted.
+        chunk_size : int, default=None
+            The number of epochs to draw at once. Defaults to
+            ``VSPEC.config.granulation_chunk_size``.
+
+        Yields
+        ------
+        np.ndarray
+            The coverage of each point in the next chunk of `time`.
+
+        Raises
+        ------
+        ValueError
+            If `time` is not sorted.
+        """
+        if chunk_size is None:
+            chunk_size = config.granulation_chunk_size
+        X = time.to_value(time_unit)
+        if np.any(np.diff(X) < 0):
+            raise ValueError('`time` must be sorted to draw in chunks.')
+        chunks = iter_state_space(
+            build_quasisep_kernel(self.params),
+            X,
+            jax.random.PRNGKey(seed=self.seed),
+            mean=self.params['mean'],
+            chunk_size=chunk_size
+        )
+        for chunk in chunks:
+            yield save_cast_coverage(np.array(chunk))
+
+    def warmup(self, n_epochs: int, chunk_size: int = None) -> float:
+        """
+        Compile the sampler for every chunk shape ``iter_coverage`` will use.
+
+        Parameters
+        ----------
+        n_epochs : int
+            The number of epochs that will be sampled.
+        chunk_size : int, default=None
+            The number of epochs to draw at once. Defaults to
+            ``VSPEC.config.granulation_chunk_size``.
+
+        Returns
+        -------
+        float
+            The time spent compiling, in seconds.
+        """
+        if chunk_size is None:
+            chunk_size = config.granulation_chunk_size
+        start = perf_counter()
+        kernel = build_quasisep_kernel(self.params)
+        key = jax.random.PRNGKey(0)
+        shapes = []
+        for i, first in enumerate(range(0, n_epochs, chunk_size)):
+            shape = (i > 0, min(chunk_size, n_epochs - first))
+            if shape not in shapes:
+                shapes.append(shape)
+        for has_state, size in shapes:
+            X = jnp.asarray(np.arange(size, dtype=float))
+            if has_state:
+                state = jnp.zeros(kernel.stationary_covariance().shape[0])
+                out = _propagate_state(kernel, X, key, state, X[0])
+            else:
+                out = _propagate_state(kernel, X, key)
+            jax.block_until_ready(out)
+        return perf_counter() - start
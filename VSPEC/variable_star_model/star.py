@@ -33,6 +33,7 @@ from VSPEC.variable_star_model.faculae import FaculaCollection, FaculaGenerator,
 from VSPEC.variable_star_model.flares import FlareCollection, FlareGenerator
 from VSPEC.variable_star_model.granules import Granulation
 from VSPEC.config import MSH
+from VSPEC import config
 from VSPEC.params import FaculaParameters, SpotParameters, FlareParameters, StarParameters
 
 
@@ -727,3 +728,33 @@ class Star:
         else:
             coverage = self.granulation.get_coverage(time)
             return np.where(np.isnan(coverage), 0, coverage)
+
+    def iter_granulation_coverage(
+        self,
+        time: u.Quantity,
+        chunk_size: int = None
+    ):
+        """
+        Calculate the coverage by granulation one chunk of `time` at a time.
+
+        Parameters
+        ----------
+        time : astropy.units.Quantity
+            The sorted points on the time axis.
+        chunk_size : int, default=None
+            The number of points to compute at once. Defaults to
+            ``VSPEC.config.granulation_chunk_size``.
+
+        Yields
+        ------
+        np.ndarray
+            The coverage corresponding to each point in the next chunk of `time`.
+        """
+        if chunk_size is None:
+            chunk_size = config.granulation_chunk_size
+        if self.granulation is None:
+            for start in range(0, len(time), chunk_size):
+                yield np.zeros(shape=time[start:start+chunk_size].shape)
+        else:
+            for coverage in self.granulation.iter_coverage(time, chunk_size):
+                yield np.where(np.isnan(coverage), 0, coverage)
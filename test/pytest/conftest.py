@@ -0,0 +1,156 @@
+"""
+Shared fixtures for the VSPEC tests.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from urllib.parse import parse_qs
+import pytest
+
+
+def parse_cfg(content: bytes) -> dict:
+    """
+    Parse a PSG config into a dictionary. It is decoded as latin-1 so
+    that binary GCM data survives the round trip through ``format_cfg``.
+    """
+    cfg = {}
+    for line in content.decode('latin-1').split('\n'):
+        line = line.strip()
+        if line.startswith('<') and '>' in line:
+            key, value = line[1:].split('>', 1)
+            cfg[key] = value
+    return cfg
+
+
+def format_cfg(cfg: dict) -> bytes:
+    """
+    Write a dictionary as a PSG config.
+    """
+    return '\n'.join(f'<{key}>{value}' for key, value in cfg.items()).encode('latin-1')
+
+
+class FakePSGHandler(BaseHTTPRequestHandler):
+    """
+    Answer PSG API calls from a ``FakePSG`` server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('latin-1'), encoding='latin-1')
+        fields = {key: value[0].encode('latin-1') for key, value in form.items()}
+        status, body = self.server.respond(fields, self.client_address)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakePSG(ThreadingHTTPServer):
+    """
+    A stand-in for the PSG API.
+
+    It keeps a config that ``set`` replaces and ``upd`` updates, returns it
+    for ``cfg`` calls, and answers ``all`` calls with a ``cfg``, ``rad``,
+    ``noi`` and ``lyr`` file that depend on the config of that run.
+
+    Attributes
+    ----------
+    cfg : dict
+        The stored config.
+    calls : list of dict
+        The type, app, file, and client address of every call.
+    fail_next : int
+        The number of upcoming calls to answer with a server error.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakePSGHandler)
+        self.cfg = {}
+        self.calls = []
+        self.fail_next = 0
+        self.lock = Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @staticmethod
+    def run(cfg: dict) -> bytes:
+        """
+        The output of an ``all`` call with config `cfg`.
+        """
+        rad = (
+            f"# season={cfg.get('OBJECT-SEASON')} star={cfg.get('OBJECT-STAR-TYPE')}\n"
+            '# Wave/freq Total\n'
+            f"1.0 {cfg.get('OBJECT-SEASON')}\n"
+        ).encode('UTF-8')
+        return b'\n'.join([
+            b'results_cfg.txt', format_cfg(cfg),
+            b'results_rad.txt', rad,
+            b'results_noi.txt', b'# noise\n1.0 0.1',
+            b'results_lyr.txt', b'# layers\n1.0 2.0'
+        ])
+
+    def respond(self, fields: dict, client_address) -> tuple:
+        with self.lock:
+            output_type = fields.get('type', b'').decode('UTF-8')
+            content = fields.get('file', b'')
+            self.calls.append(dict(type=output_type, app=fields.get('app'),
+                                   file=content, client=client_address))
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 503, b'busy'
+            if output_type == 'set':
+                self.cfg = parse_cfg(content)
+                return 200, b'OK'
+            if output_type == 'upd':
+                self.cfg.update(parse_cfg(content))
+                return 200, b'OK'
+            if output_type == 'cfg':
+                return 200, format_cfg({**self.cfg, **parse_cfg(content)})
+            if output_type == 'all':
+                return 200, self.run({**self.cfg, **parse_cfg(content)})
+            return 400, b'unknown type'
+
+
+def start_server() -> FakePSG:
+    """
+    Start a ``FakePSG`` server in a background thread.
+    """
+    server = FakePSG()
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stop_server(server: FakePSG):
+    """
+    Stop a server made by ``start_server``.
+    """
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def psg_server():
+    """
+    Run a ``FakePSG`` server for the duration of a test.
+    """
+    server = start_server()
+    yield server
+    stop_server(server)
+
+
+@pytest.fixture
+def psg_servers():
+    """
+    Run three independent ``FakePSG`` servers for the duration of a test.
+    """
+    servers = [start_server() for _ in range(3)]
+    yield servers
+    for server in servers:
+        stop_server(server)
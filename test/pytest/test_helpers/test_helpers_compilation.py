@@ -0,0 +1,18 @@
+import jax
+
+from VSPEC import helpers, config
+
+
+def test_enable_compilation_cache(tmp_path, monkeypatch):
+    """
+    Test `VSPEC.helpers.enable_compilation_cache`
+    """
+    monkeypatch.setattr(config, 'JAX_CACHE_PATH', None)
+    assert not helpers.enable_compilation_cache()
+    previous = jax.config.jax_compilation_cache_dir
+    try:
+        assert helpers.enable_compilation_cache(tmp_path/'jax')
+        assert (tmp_path/'jax').is_dir()
+        assert jax.config.jax_compilation_cache_dir == str(tmp_path/'jax')
+    finally:
+        jax.config.update('jax_compilation_cache_dir', previous)
@@ -65,3 +65,22 @@ def test_clip_teff():
     teff = 3000 * u.K
     clipped_teff = helpers.clip_teff(teff)
     assert clipped_teff == teff
+
+
+def test_get_required_teffs():
+    """
+    Test `VSPEC.helpers.get_required_teffs`
+    """
+    from VSPEC.params import StarParameters, FaculaParameters
+    params = StarParameters.static_proxima()
+    assert np.all(helpers.get_required_teffs(params) == [3300]*u.K)
+
+    params = StarParameters.spotted_proxima()
+    assert np.all(helpers.get_required_teffs(params) == [2500, 2700, 3300]*u.K)
+
+    params.faculae = FaculaParameters.std()
+    assert np.all(helpers.get_required_teffs(params) == [2500, 2700, 3100, 3300, 3400]*u.K)
+
+    params.teff = 3350*u.K
+    assert np.all(helpers.get_required_teffs(params) == [
+                  2500, 2700, 3100, 3200, 3300, 3400, 3500]*u.K)
@@ -11,6 +11,7 @@ import numpy as np
 
 from VSPEC.main import ObservationModel
 from VSPEC.params.read import InternalParameters
+from VSPEC import config
 
 cfg_path = Path(__file__).parent / 'test_params' / 'test.yaml'
 chdir(Path(__file__).parent / 'data')
@@ -71,3 +72,376 @@ def test_get_observation_plan(observation_model:ObservationModel):
 
 
 
+def test_combine_spectra(observation_model:ObservationModel):
+    teff = observation_model.params.star.teff
+    n_wl = len(observation_model.wl)
+    flux = observation_model.combine_spectra([
+        {teff: 1.0},
+        {teff: 0.5, teff+100*u.K: 0.0},
+        {}
+    ])
+    assert flux.shape == (3, n_wl)
+    expected = observation_model.get_model_spectrum(teff)
+    assert np.allclose(flux[0], expected)
+    assert np.allclose(flux[1], 0.5*expected)
+    assert np.all(flux[2] == 0)
+
+def test_wl(observation_model:ObservationModel):
+    wl = observation_model.wl
+    assert observation_model.wl is wl
+    assert not wl.flags.writeable
+    observation_model.params.inst.bandpass.resolving_power *= 2
+    assert len(observation_model.wl) > len(wl)
+
+
+def test_warmup(observation_model:ObservationModel):
+    compile_time = observation_model.warmup()
+    assert set(compile_time) == {'spectra'}
+    assert observation_model.metadata['compile_time'] == compile_time
+    observation_model.write_metadata()
+    path = observation_model.directories['all_model'] / 'run_metadata.json'
+    assert path.exists()
+
+def test_chunked_spectral_grid(tmp_path):
+    from VSPEC.spectra import ChunkedGridSpectra
+    from VSPEC.spectra.chunked import create_chunked_grid, write_chunked_node
+    params = InternalParameters.from_yaml(cfg_path)
+    wl = ObservationModel(params).wl
+    with create_chunked_grid(tmp_path/'grid.h5', wl, [3200, 3400]*u.K, [4.5, 5.0], [0.0]) as fh5:
+        for teff, logg in [(3200, 4.5), (3200, 5.0), (3400, 4.5), (3400, 5.0)]:
+            write_chunked_node(fh5, teff*u.K, logg, 0.0,
+                               np.full(len(wl), teff + logg)*config.flux_unit)
+    params.header.spectral_grid = tmp_path/'grid.h5'
+    params.star.logg = 4.75
+    model = ObservationModel(params)
+    assert isinstance(model.spec, ChunkedGridSpectra)
+    assert model.warmup()['spectra'] > 0
+    assert set(model.spec.loaded) == {(0, 0, 0), (0, 1, 0), (1, 0, 0), (1, 1, 0)}
+    flux = model.get_model_spectrum(3300*u.K).to_value(config.flux_unit)
+    assert np.allclose(flux, 3304.75*params.flux_correction)
+    assert np.allclose(model.get_spectra_matrix([3300]*u.K), flux)
+    params.star.logg = None
+    with pytest.raises(ValueError):
+        model.get_model_spectrum(3300*u.K)
+    model.spec.close()
+
+
+def test_psg_client(observation_model:ObservationModel):
+    from VSPEC.params import APIkey
+    observation_model.params.psg.api_key = APIkey.none()
+    client = observation_model.psg_client
+    assert observation_model.psg_client is client
+    assert client.psg_url == observation_model.params.psg.url
+    observation_model.params.psg.url = 'http://localhost:3001'
+    assert observation_model.psg_client is not client
+
+PSG_OUTPUTS = (('psg_combined', 'rad'), ('psg_noise', 'noi'), ('psg_configs', 'cfg'),
+               ('psg_thermal', 'rad'), ('psg_layers', 'lyr'))
+
+def read_outputs(model:ObservationModel) -> dict:
+    """
+    Read every output of a planet build, from its files or from the store.
+    """
+    from VSPEC.helpers import get_filename
+    from VSPEC.config import N_ZFILL
+    outputs = {}
+    for directory, ext in PSG_OUTPUTS:
+        name = model._directories[directory]
+        for i in range(model.params.planet_total_images):
+            if model.params.psg.store_outputs:
+                outputs[name, i] = model.psg_store.get_raw(i, name)
+            else:
+                outputs[name, i] = (Path(model.directories[directory]) / get_filename(i, N_ZFILL, ext)).read_bytes()
+    outputs['observation_info'] = (Path(model.directories['parent']) / 'observation_info.csv').read_bytes()
+    return outputs
+
+def get_seasons(server) -> list:
+    """
+    Get the phase of each ``upd`` call made to a ``FakePSG``.
+    """
+    return [
+        float(call['file'].split(b'<OBJECT-SEASON>')[1].split(b'\n')[0])
+        for call in server.calls if call['type'] == 'upd' and b'OBJECT-SEASON' in call['file']
+    ]
+
+def build_parallel(model:ObservationModel, serial, pool, tmp_path, monkeypatch):
+    model.build_planet(psg_urls=[server.url for server in pool])
+    # each instance gets its own set upload and config
+    for server in pool:
+        assert server.calls[0]['type'] == 'set'
+        assert 0 < sum(call['type'] == 'all' for call in server.calls) < len(serial.calls)
+    n_all = sum(call['type'] == 'all' for server in pool for call in server.calls)
+    assert n_all == 2*model.params.planet_total_images
+
+def build_async(n_servers:int):
+    def build(model:ObservationModel, serial, pool, tmp_path, monkeypatch):
+        import asyncio
+        urls = [server.url for server in pool[:n_servers]]
+        asyncio.run(model.build_planet_async(psg_urls=urls, max_concurrency=1))
+        # each instance runs its phases in order
+        n_block = len(np.array_split(np.arange(model.params.planet_total_images), n_servers)[0])
+        for server in pool[:n_servers]:
+            seasons = get_seasons(server)
+            assert len(seasons) == 2*n_block
+            assert seasons == sorted(seasons)
+    return build
+
+def build_cache(model:ObservationModel, serial, pool, tmp_path, monkeypatch):
+    import asyncio
+    from VSPEC import config
+    monkeypatch.setattr(config, 'PSG_CACHE_PATH', tmp_path / 'cache')
+    model.build_planet(use_cache=True)
+    assert len(list((tmp_path / 'cache').glob('*.psg'))) == 2*model.params.planet_total_images
+    # the second build is written from the cache without calling PSG
+    pool[0].calls.clear()
+    asyncio.run(model.build_planet_async(use_cache=True))
+    assert not any(call['type'] == 'all' for call in pool[0].calls)
+
+def build_single_request(model:ObservationModel, serial, pool, tmp_path, monkeypatch):
+    model.params.psg.single_request = True
+    model.build_planet()
+    n_phases = model.params.planet_total_images
+    assert len(serial.calls) == 2 + 4*n_phases
+    # only the initial set and static config are sent separately
+    assert len(pool[0].calls) == 2 + 2*n_phases
+    assert [call['type'] for call in pool[0].calls[2:]] == ['all']*2*n_phases
+
+def build_store(model:ObservationModel, serial, pool, tmp_path, monkeypatch):
+    model.params.psg.store_outputs = True
+    model.build_planet()
+    assert model.psg_store.path == tmp_path / 'feature' / 'psg_output.h5'
+    assert not any(path.is_file() for path in (tmp_path / 'feature').glob('PSG*/*'))
+    assert model.get_psg_output('combined', 1).data['Total'].shape == (1,)
+    # resuming checks that each phase is in the store
+    n_phases = model.params.planet_total_images
+    manifest = model.planet_manifest
+    lines = manifest.path.read_text().splitlines()[:4]
+    manifest.path.write_text('\n'.join(lines) + '\n')
+    pool[0].calls.clear()
+    model.build_planet(resume=True)
+    assert sum(call['type'] == 'all' for call in pool[0].calls) == 2*(n_phases - 4)
+    pool[0].calls.clear()
+    model.build_planet(resume=True)
+    assert len(pool[0].calls) == 0
+
+def build_cfg_tracking(model:ObservationModel, serial, pool, tmp_path, monkeypatch):
+    from VSPEC import config, main
+    from VSPEC.psg_api import count_cfg_lines
+    checked = []
+    check_config = model.check_config
+    def count_checks(cfg, client=None, run_config=None):
+        checked.append(cfg)
+        check_config(cfg, client=client, run_config=run_config)
+    monkeypatch.setattr(model, 'check_config', count_checks)
+    monkeypatch.setattr(config, 'PSG_CFG_CHECK_INTERVAL', 100)
+    # allow a few phases of growth past the config PSG returns after a reset
+    n_lines = count_cfg_lines(serial.calls[2]['file'])
+    cfg_lines = len(model.params.to_psg()) + 10
+    monkeypatch.setattr(main, 'PSG_CFG_MAX_LINES', cfg_lines + 3*2*n_lines)
+    model.build_planet()
+    n_sets = sum(call['type'] == 'set' for call in pool[0].calls)
+    # resets are made before the config is too long, and each is followed by one check
+    assert 1 < n_sets < model.params.planet_total_images
+    assert len(checked) == n_sets
+    assert all(len(cfg.split('\n')) <= main.PSG_CFG_MAX_LINES for cfg in checked)
+
+@pytest.mark.parametrize('build', [
+    pytest.param(build_parallel, id='parallel'),
+    pytest.param(build_async(1), id='async-1'),
+    pytest.param(build_async(2), id='async-2'),
+    pytest.param(build_cache, id='cache'),
+    pytest.param(build_single_request, id='single_request'),
+    pytest.param(build_store, id='store'),
+    pytest.param(build_cfg_tracking, id='cfg_tracking'),
+])
+def test_build_planet_matches_serial(observation_model:ObservationModel, psg_servers, tmp_path, monkeypatch, build):
+    """
+    Every way of building the planet writes the same outputs as a plain serial build.
+    """
+    from VSPEC.params import APIkey
+    serial, *pool = psg_servers
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.psg.url = serial.url
+    params.header.data_path = tmp_path / 'serial'
+    observation_model.build_directories()
+    observation_model.build_planet()
+    expected = read_outputs(observation_model)
+    assert len(expected) == 5*params.planet_total_images + 1
+
+    params.psg.url = pool[0].url
+    params.header.data_path = tmp_path / 'feature'
+    observation_model.build_directories()
+    build(observation_model, serial, pool, tmp_path, monkeypatch)
+    assert read_outputs(observation_model) == expected
+
+def test_build_planet_async_order(observation_model:ObservationModel, psg_server, tmp_path, monkeypatch):
+    import asyncio
+    import time
+    from VSPEC.params import APIkey
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.psg.url = psg_server.url
+    params.header.data_path = tmp_path
+    observation_model.build_directories()
+    # earlier phases take longer to read, so their reads finish last
+    read = observation_model._read_phase_cache
+    def slow_read(obs_time, *args):
+        time.sleep(0.2/(1 + obs_time.to_value(u.day)))
+        return read(obs_time, *args)
+    monkeypatch.setattr(observation_model, '_read_phase_cache', slow_read)
+    asyncio.run(observation_model.build_planet_async())
+    seasons = get_seasons(psg_server)
+    assert len(seasons) == 2*params.planet_total_images
+    assert seasons == sorted(seasons)
+
+def test_build_planet_cache_checked(observation_model:ObservationModel, psg_server, tmp_path, monkeypatch):
+    from VSPEC.params import APIkey
+    from VSPEC import config
+    monkeypatch.setattr(config, 'PSG_CACHE_PATH', tmp_path / 'cache')
+    monkeypatch.setattr(config, 'PSG_CFG_CHECK_INTERVAL', 100)
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.psg.url = psg_server.url
+    params.header.data_path = tmp_path / 'run'
+    observation_model.build_directories()
+    # the third run, the first of phase 1, returns a config that does not match
+    key = next(iter(params.to_psg()))
+    run = psg_server.run
+    def bad_run(cfg):
+        if sum(call['type'] == 'all' for call in psg_server.calls) == 3:
+            cfg = dict(cfg, **{key: 'wrong'})
+        return run(cfg)
+    psg_server.run = bad_run
+    with pytest.raises(RuntimeError):
+        observation_model.build_planet(use_cache=True)
+    # checks are not due, but only the responses that were checked are cached
+    assert len(list((tmp_path / 'cache').glob('*.psg'))) == 2
+
+def test_build_planet_resume(observation_model:ObservationModel, psg_server, tmp_path):
+    from VSPEC.params import APIkey
+    from VSPEC.helpers import get_filename
+    from VSPEC.config import N_ZFILL
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.psg.url = psg_server.url
+    params.header.data_path = tmp_path
+    observation_model.build_directories()
+    observation_model.build_planet()
+    files = {path: path.read_bytes() for path in tmp_path.rglob('*.*') if path.parent != tmp_path}
+
+    # pretend the build died after phase 3, and that a file of phase 1 was lost
+    manifest = observation_model.planet_manifest
+    lines = manifest.path.read_text().splitlines()[:4]
+    manifest.path.write_text('\n'.join(lines) + '\n')
+    (observation_model.directories['psg_thermal'] / get_filename(1, N_ZFILL, 'rad')).unlink()
+    psg_server.calls.clear()
+    observation_model.build_planet(resume=True)
+    n_runs = sum(call['type'] == 'all' for call in psg_server.calls)
+    assert n_runs == 2*(params.planet_total_images - 3)
+    assert psg_server.calls[0]['type'] == 'set'
+    assert len(manifest.load()) == params.planet_total_images
+    for path, content in files.items():
+        assert path.read_bytes() == content
+
+    # nothing is left to do
+    psg_server.calls.clear()
+    observation_model.build_planet(resume=True)
+    assert len(psg_server.calls) == 0
+
+def test_build_planet_resume_truncated(observation_model:ObservationModel, psg_server, tmp_path):
+    import asyncio
+    from VSPEC.params import APIkey
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.psg.url = psg_server.url
+    params.header.data_path = tmp_path
+    observation_model.build_directories()
+    observation_model.build_planet()
+    expected = read_outputs(observation_model)
+
+    # pretend the build was killed while writing the record of phase 3
+    manifest = observation_model.planet_manifest
+    text = manifest.path.read_text()
+    lines = text.splitlines(keepends=True)
+    manifest.path.write_text(''.join(lines[:3]) + lines[3][:len(lines[3])//2])
+    assert set(manifest.load()) == {0, 1, 2}
+    psg_server.calls.clear()
+    asyncio.run(observation_model.build_planet_async(resume=True))
+    assert sum(call['type'] == 'all' for call in psg_server.calls) == 2*(params.planet_total_images - 3)
+    # the partial line is replaced, and every other line is whole
+    records = manifest.path.read_text().splitlines()
+    assert len(records) == params.planet_total_images
+    assert set(manifest.load()) == set(range(params.planet_total_images))
+    assert read_outputs(observation_model) == expected
+
+def test_build_planet_parallel_gcm_lock(observation_model:ObservationModel, psg_servers, tmp_path, monkeypatch):
+    import time
+    from threading import Lock
+    from VSPEC.params import APIkey
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.header.data_path = tmp_path
+    observation_model.build_directories()
+    active = []
+    overlaps = []
+    lock = Lock()
+    content = params.gcm.content
+    def slow_content(**kwargs):
+        with lock:
+            active.append(1)
+            overlaps.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        return content(**kwargs)
+    monkeypatch.setattr(params.gcm, 'content', slow_content)
+    observation_model.build_planet(psg_urls=[server.url for server in psg_servers])
+    # every instance uploads the GCM, but never two at once
+    assert len(overlaps) >= len(psg_servers)
+    assert max(overlaps) == 1
+
+def test_build_planet_gcm_reads(observation_model:ObservationModel, psg_server, tmp_path, monkeypatch):
+    from VSPEC.params import APIkey
+    params = observation_model.params
+    params.psg.api_key = APIkey.none()
+    params.psg.url = psg_server.url
+    params.header.data_path = tmp_path
+    observation_model.build_directories()
+    reads = []
+    get_gcm_content = observation_model.get_gcm_content
+    def count_reads(obstime=0*u.s):
+        reads.append(obstime)
+        return get_gcm_content(obstime)
+    monkeypatch.setattr(observation_model, 'get_gcm_content', count_reads)
+    assert params.gcm.is_staic
+    observation_model.build_planet()
+    # a static GCM is read for each reset and once for the manifest, not for every phase
+    n_sets = sum(call['type'] == 'set' for call in psg_server.calls)
+    assert len(reads) == n_sets + 1 < params.planet_total_images
+    reads.clear()
+    observation_model.build_planet(resume=True)
+    assert len(reads) == 1
+
+def test_get_psg_output(observation_model:ObservationModel, monkeypatch):
+    from VSPEC import config, main
+    parsed = []
+    def parse(path):
+        parsed.append(Path(path).name)
+        return object()
+    monkeypatch.setattr(main.PSGrad, 'from_rad', parse)
+    monkeypatch.setattr(main, 'read_lyr', parse)
+    monkeypatch.setattr(config, 'psg_output_cache_size', 4)
+    kinds = ('combined', 'thermal', 'noise', 'layers')
+    outputs = {kind: observation_model.get_psg_output(kind, 1) for kind in kinds}
+    assert [Path(name).suffix for name in parsed] == ['.rad', '.rad', '.noi', '.lyr']
+    for kind in kinds:
+        assert observation_model.get_psg_output(kind, 1) is outputs[kind]
+    assert len(parsed) == 4
+    # the least recently used output is dropped
+    observation_model.get_psg_output('combined', 2)
+    observation_model.get_psg_output('combined', 1)
+    assert len(parsed) == 6
+    observation_model.get_psg_output('noise', 1)
+    assert len(parsed) == 6
+
@@ -0,0 +1,46 @@
+"""
+Tests for `VSPEC.manifest`
+"""
+from VSPEC.manifest import PhaseManifest
+
+
+def test_phase_manifest(tmp_path):
+    manifest = PhaseManifest(tmp_path / 'manifest.jsonl')
+    assert manifest.load() == {}
+    files = [tmp_path / f'phase{i}.rad' for i in range(3)]
+    hashes = {i: manifest.get_phase_hash([f'key{i}']) for i in range(3)}
+    for i, file in enumerate(files):
+        file.write_text('data')
+        manifest.add(i, hashes[i], [file])
+    assert manifest.load()[1]['files'] == ['phase1.rad']
+    assert manifest.get_complete(hashes) == {0, 1, 2}
+
+    # a phase is not complete if its config changed or a file is missing
+    files[0].unlink()
+    hashes[1] = manifest.get_phase_hash(['changed'])
+    assert manifest.get_complete(hashes) == {2}
+
+    # a line cut off by a crash is ignored
+    with open(manifest.path, 'a', encoding='UTF-8') as file:
+        file.write('{"index": 0, "ha')
+    assert set(manifest.load()) == {0, 1, 2}
+    manifest.clear()
+    assert manifest.load() == {}
+
+
+def test_phase_manifest_partial_line(tmp_path):
+    manifest = PhaseManifest(tmp_path / 'manifest.jsonl')
+    hashes = {i: manifest.get_phase_hash([f'key{i}']) for i in range(3)}
+    manifest.add(0, hashes[0], [])
+    # the build is killed while phase 1 is being recorded
+    with open(manifest.path, 'a', encoding='UTF-8') as file:
+        file.write('{"index": 1, "ha')
+    assert set(manifest.load()) == {0}
+    # the resumed build records phase 1 again, on a line of its own
+    manifest.add(1, hashes[1], [])
+    manifest.add(2, hashes[2], [])
+    assert set(manifest.load()) == {0, 1, 2}
+    assert manifest.get_complete(hashes) == {0, 1, 2}
+    assert len(manifest.path.read_text().splitlines()) == 3
+    manifest.clear()
+    assert manifest.load() == {}
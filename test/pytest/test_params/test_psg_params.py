@@ -118,6 +118,12 @@ def test_psgParameters_from_dict():
     assert isinstance(psg_params.api_key, APIkey)
     assert psg_params.api_key.path == Path('api_key.txt')
     assert psg_params.api_key._value is None
+    assert psg_params.single_request is False
+    psg_params = psgParameters.from_dict(dict(psg_params_data, single_request=True))
+    assert psg_params.single_request is True
+    assert psg_params.store_outputs is False
+    psg_params = psgParameters.from_dict(dict(psg_params_data, store_outputs=True))
+    assert psg_params.store_outputs is True
 
 def test_psgParameters_to_psg():
     # Create a psgParameters instance
@@ -68,6 +68,9 @@ def test_custom_from_dict():
     params = StarParameters.from_dict(params_dict)
     assert params.psg_star_template == 'G'
     assert params.mass == 1.2 * u.M_sun
+    assert params.logg is None and params.feh is None
+    params = StarParameters.from_dict(dict(params_dict, logg=4.5, feh='-0.5'))
+    assert params.logg == 4.5 and params.feh == -0.5
 
 def test_preset_from_dict():
     params_dict = {
@@ -4,11 +4,14 @@
 Tests for `VSPEC.psg_api` module
 """
 from pathlib import Path
+import asyncio
+import numpy as np
 import pytest
 from astropy import units as u
 import matplotlib.pyplot as plt
 
-from VSPEC.psg_api import call_api,call_api_from_file, PSGrad, get_reflected, parse_full_output
+from VSPEC.psg_api import call_api,call_api_from_file, PSGrad, get_reflected, parse_full_output, PSGClient
+from VSPEC.psg_api import AsyncPSGClient, count_cfg_lines
 from VSPEC.helpers import is_port_in_use,set_psg_state
 
 API_KEY_PATH = Path.home() / 'psg_key.txt'
@@ -118,3 +121,115 @@ def test_text_parse():
     result = parse_full_output(content)
     assert b'cfg' in result.keys()
     set_psg_state(previous_state)
+
+
+def test_psg_client(psg_server):
+    """
+    Test `VSPEC.psg_api.PSGClient`
+    """
+    with PSGClient(psg_server.url) as client:
+        assert client.call(output_type='set', app='globes', config_data=b'<OBJECT-SEASON>10') == b'OK'
+        client.call(output_type='upd', app='globes', config_data=b'<OBJECT-STAR-TYPE>M')
+        cfg = client.call(output_type='cfg', app='globes')
+    assert b'<OBJECT-SEASON>10' in cfg
+    assert b'<OBJECT-STAR-TYPE>M' in cfg
+    # every call reused the same connection
+    assert len({call['client'] for call in psg_server.calls}) == 1
+
+
+def test_psg_client_cfg_lines(psg_server):
+    """
+    Test that `VSPEC.psg_api.PSGClient` does not count newline bytes in a binary GCM.
+    """
+    binary = np.arange(256, dtype='uint8').tobytes()*4
+    assert binary.count(b'\n') == 4
+    gcm = b'<ATMOSPHERE-GCM-PARAMETERS>1,2\n<ATMOSPHERE-LAYERS>3\n<BINARY>' + binary + b'</BINARY>'
+    assert count_cfg_lines(gcm) == 3
+    assert count_cfg_lines('<OBJECT-SEASON>10\n<OBJECT-STAR-TYPE>M') == 2
+    with PSGClient(psg_server.url) as client:
+        client.call(output_type='set', app='globes', config_data=b'<OBJECT-SEASON>10')
+        assert client.cfg_lines == 1
+        client.call(output_type='upd', app='globes', config_data=gcm)
+        client.call(output_type='upd', app='globes', config_data=gcm)
+    assert client.upd_lines == 6
+    assert client.cfg_lines == 7
+
+
+def test_psg_client_retry(psg_server):
+    """
+    Test that `VSPEC.psg_api.PSGClient` retries server errors.
+    """
+    psg_server.fail_next = 2
+    with PSGClient(psg_server.url, retries=2, backoff=0) as client:
+        assert client.call(output_type='set', config_data=b'<A>1') == b'OK'
+    assert len(psg_server.calls) == 3
+    psg_server.fail_next = 2
+    with PSGClient(psg_server.url, retries=1, backoff=0) as client:
+        assert client.call(output_type='set', config_data=b'<A>1') == b'busy'
+
+
+def test_psg_client_timeout(psg_server):
+    """
+    Test that `VSPEC.psg_api.PSGClient` does not resend a call that times out.
+    """
+    import time
+    import requests
+    with PSGClient(psg_server.url) as client:
+        assert client.timeout[1] is None
+    respond = psg_server.respond
+    def slow_respond(fields, client_address):
+        time.sleep(0.5)
+        return respond(fields, client_address)
+    psg_server.respond = slow_respond
+    with PSGClient(psg_server.url, timeout=(5, 0.1), retries=3, backoff=0) as client:
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client.call(output_type='set', config_data=b'<A>1')
+    time.sleep(0.5)
+    assert len(psg_server.calls) == 1
+
+
+def test_async_psg_client(psg_server):
+    """
+    Test `VSPEC.psg_api.AsyncPSGClient`
+    """
+    async def update_and_run(client, season):
+        async with client.lock:
+            await client.call(output_type='upd', config_data=f'<OBJECT-SEASON>{season}'.encode())
+            return await client.call(output_type='all', config_data=b'')
+
+    async def main():
+        with PSGClient(psg_server.url) as sync_client:
+            client = AsyncPSGClient(sync_client)
+            await client.call(output_type='set', config_data=b'<OBJECT-STAR-TYPE>M')
+            return await asyncio.gather(*(update_and_run(client, season) for season in range(5)))
+
+    results = asyncio.run(main())
+    for season, result in enumerate(results):
+        assert f'<OBJECT-SEASON>{season}'.encode() in parse_full_output(result)[b'cfg']
+    # the lock is acquired in the order the tasks asked for it
+    seasons = [call['file'] for call in psg_server.calls if call['type'] == 'upd']
+    assert seasons == [f'<OBJECT-SEASON>{season}'.encode() for season in range(5)]
+
+
+def test_PSGrad_from_bytes():
+    """
+    Test `VSPEC.psg_api.PSGrad.from_bytes`
+    """
+    file = Path(__file__).parent / 'data' / 'test_rad.rad'
+    content = file.read_bytes()
+    rad = PSGrad.from_bytes(content)
+    assert list(rad.data.keys()) == ['Wave/freq', 'Total', 'Noise', 'Stellar', 'Planet']
+    assert rad.data['Wave/freq'][0] == 1*u.um
+    assert rad.data['Total'].unit == u.Unit('W m-2 um-1')
+    assert rad.data['Planet'][1].value == 1.6037800e-19
+    assert rad.header['binning'] == 39
+    assert len(rad.header['warnings']) == 2
+
+    # the payload of a full PSG output can be parsed without writing it to a file
+    output = parse_full_output(b'results_cfg.txt\n<A>1\nresults_rad.txt\n' + content)
+    rad_from_output = PSGrad.from_bytes(output[b'rad'])
+    for key, value in rad.data.items():
+        assert np.all(rad_from_output.data[key] == value)
+
+    with pytest.raises(ValueError):
+        PSGrad.from_bytes(content.replace(b'# Wave/freq', b'# Wave/freq Extra'))
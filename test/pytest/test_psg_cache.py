@@ -0,0 +1,50 @@
+"""
+Tests for `VSPEC.psg_cache`
+"""
+from VSPEC.psg_cache import PSGCache, main
+
+
+RESPONSE = b'results_cfg.txt\n<OBJECT-NAME>Exoplanet\nresults_rad.txt\n1.0 2.0'
+
+
+def test_psg_cache(tmp_path):
+    cache = PSGCache(path=tmp_path)
+    key = cache.get_key(b'<GCM>', b'<STATIC>', b'<PHASE>1')
+    assert key != cache.get_key(b'<GCM>', b'<STATIC>', b'<PHASE>2')
+    assert key != cache.get_key(b'<GCM><STATIC>', b'', b'<PHASE>1')
+    prefix = cache.get_prefix(b'<GCM>', b'<STATIC>')
+    assert cache.get_key_from_prefix(prefix, b'<PHASE>1') == key
+    assert cache.get_key_from_prefix(prefix, b'<PHASE>1') == key
+    assert cache.get(key) is None
+    cache.put(key, RESPONSE)
+    output = cache.get(key)
+    assert output[b'cfg'] == b'<OBJECT-NAME>Exoplanet'
+    assert output[b'rad'] == b'1.0 2.0'
+
+    # a corrupt entry is deleted
+    filename = cache.get_filename(key)
+    filename.write_bytes(filename.read_bytes()[:-1])
+    assert cache.get(key) is None
+    assert not filename.exists()
+
+
+def test_psg_cache_evict(tmp_path):
+    cache = PSGCache(path=tmp_path, max_bytes=10**9)
+    keys = [cache.get_key(b'', b'', bytes([i])) for i in range(3)]
+    for key in keys:
+        cache.put(key, RESPONSE)
+    assert len(cache) == 3
+    size = cache.get_filename(keys[0]).stat().st_size
+    cache.evict(2*size)
+    assert len(cache) == 2
+    assert cache.get(keys[0]) is None
+
+
+def test_psg_cache_cli(tmp_path, capsys):
+    cache = PSGCache(path=tmp_path)
+    cache.put(cache.get_key(b'', b'', b''), RESPONSE)
+    main(['--path', str(tmp_path), 'info'])
+    assert '1 entries' in capsys.readouterr().out
+    main(['--path', str(tmp_path), 'clear'])
+    assert '0 entries' in capsys.readouterr().out
+    assert len(cache) == 0
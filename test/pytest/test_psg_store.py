@@ -0,0 +1,59 @@
+"""
+Tests for `VSPEC.psg_store`
+"""
+from pathlib import Path
+import numpy as np
+import h5py
+
+from VSPEC.psg_store import PSGStore
+from VSPEC.psg_api import PSGrad
+from VSPEC.helpers import parse_lyr
+
+RAD_PATH = Path(__file__).parent / 'data' / 'test_reflected' / 'atm_cmb.rad'
+
+LYR = b"""# Layers
+# Alt[km] Pressure[bar] Temperature[K] H2O size[um]
+# -----------
+#  0.0 1.0 288.0 0.01 1.0
+#  1.0 0.9 280.0 0.02 1.5
+# -----------
+"""
+
+
+def test_psg_store(tmp_path):
+    store = PSGStore(tmp_path / 'psg_output.h5')
+    assert 3 not in store
+    rad = RAD_PATH.read_bytes()
+    store.write(3, [
+        ('PSGCombinedSpectra', 'rad', rad),
+        ('PSGNoise', 'noi', b'# noise\n1.0 0.1'),
+        ('PSGConfig', 'cfg', b'<OBJECT>Exoplanet'),
+        ('PSGLayers', 'lyr', LYR)
+    ])
+    store.write(4, [('PSGLayers', 'lyr', b'')])
+    assert 3 in store and 4 in store and 5 not in store
+
+    expected = PSGrad.from_bytes(rad)
+    stored = store.get(3, 'PSGCombinedSpectra')
+    assert stored.header == expected.header
+    for key, value in expected.data.items():
+        assert stored.data[key].unit == value.unit
+        assert np.all(stored.data[key] == value)
+    assert store.get_raw(3, 'PSGCombinedSpectra') == rad
+    assert store.get(3, 'PSGConfig') == b'<OBJECT>Exoplanet'
+    assert store.get(3, 'PSGLayers').equals(parse_lyr(LYR.decode('UTF-8')))
+    assert store.get_raw(4, 'PSGLayers') == b''
+
+    # only tables that can be parsed are stored as numbers
+    with h5py.File(store.path, 'r') as fh5:
+        assert 'values' in fh5['00003/PSGCombinedSpectra']
+        assert 'values' in fh5['00003/PSGLayers']
+        assert 'values' not in fh5['00003/PSGNoise']
+        assert 'values' not in fh5['00004/PSGLayers']
+
+    # writing a file again replaces it
+    store.write(3, [('PSGConfig', 'cfg', b'<OBJECT>Planet')])
+    assert store.get(3, 'PSGConfig') == b'<OBJECT>Planet'
+    assert store.get_raw(3, 'PSGCombinedSpectra') == rad
+    store.clear()
+    assert not store.path.exists()
@@ -41,6 +41,30 @@ def test_get_wavelengths_parametrized(resolving_power, lam1, lam2):
     assert np.all(np.diff(np.diff(wavelengths)) > 0)
 
 
+@pytest.mark.parametrize(
+    "resolving_power, lam1, lam2",
+    [
+        (1000, 400, 800),
+        (50, 1, 18),
+        (100000, 1, 2),
+    ],
+)
+def test_get_wavelengths_recurrence(resolving_power, lam1, lam2):
+    """
+    `get_wavelengths()` should match stepping by `lam/R` from `lam1` until `lam2` is reached.
+    """
+    lam = lam1
+    expected = [lam]
+    while lam < lam2:
+        lam = lam + lam/resolving_power
+        expected.append(lam)
+    wavelengths = get_wavelengths(resolving_power, lam1, lam2)
+
+    assert len(wavelengths) == len(expected)
+    assert wavelengths[0] == lam1
+    assert np.allclose(wavelengths, expected, rtol=1e-12, atol=0)
+
+
 @pytest.mark.parametrize(
     "wl_old, fl_old, wl_new, expected",
     [
@@ -62,3 +86,30 @@ def test_bin_spectra_parametrized(wl_old, fl_old, wl_new, expected):
     assert isinstance(binned_flux, np.ndarray)
     assert len(binned_flux) == len(wl_new) - 1
     assert np.all(binned_flux == expected)
+
+
+def test_bin_spectra_matches_masked_mean():
+    """
+    `bin_spectra()` should match averaging over a boolean mask for each pixel.
+    """
+    rng = np.random.default_rng(10)
+    wl_old = np.sort(rng.uniform(1, 5, 10000))
+    fl_old = rng.random(10000)
+    wl_new = get_wavelengths(200, 1.5, 4.5)
+    binned_flux = bin_spectra(wl_old, fl_old, wl_new)
+
+    upper = 0.5*(wl_new[:-1] + wl_new[1:])
+    lower = np.append(wl_new[0], upper[:-1])
+    expected = [fl_old[(wl_old >= lo) & (wl_old < hi)].mean()
+                for lo, hi in zip(lower, upper)]
+    assert np.allclose(binned_flux, expected, rtol=1e-12, atol=0)
+
+
+def test_bin_spectra_empty_pixel():
+    """
+    `bin_spectra()` should raise an error if a pixel contains no points.
+    """
+    wl_old = np.array([400, 410, 420, 430])
+    fl_old = np.ones(4)
+    with pytest.raises(ValueError):
+        bin_spectra(wl_old, fl_old, np.array([400, 401, 402, 430]))
@@ -0,0 +1,97 @@
+import os
+import numpy as np
+from astropy import units as u
+
+from VSPEC.spectra.cache import SpectraCache
+from VSPEC.spectra import phoenix
+from VSPEC import config
+
+
+def test_spectra_cache_roundtrip(tmp_path):
+    cache = SpectraCache(tmp_path, max_bytes=10**6)
+    key = cache.get_key(3000*u.K, 5000, 1*u.um, 2*u.um)
+    assert cache.get(key) is None
+
+    wl = np.linspace(1, 2, 100)*u.um
+    fl = np.random.rand(100)*config.flux_unit
+    cache.put(key, wl, fl)
+    wl_cached, fl_cached = cache.get(key)
+    assert np.all(wl_cached == wl)
+    assert np.all(fl_cached == fl)
+    assert cache.get(cache.get_key(3100*u.K, 5000, 1*u.um, 2*u.um)) is None
+
+
+def test_spectra_cache_corrupt(tmp_path):
+    cache = SpectraCache(tmp_path)
+    key = cache.get_key(3000*u.K, 5000, 1*u.um, 2*u.um)
+    cache.put(key, np.linspace(1, 2, 100)*u.um, np.ones(100)*config.flux_unit)
+    with open(cache.get_filename(key), 'wb') as file:
+        file.write(b'not a spectrum')
+    assert cache.get(key) is None
+    assert not cache.get_filename(key).exists()
+
+
+def test_spectra_cache_evict(tmp_path):
+    cache = SpectraCache(tmp_path, max_bytes=10**9)
+    wl = np.linspace(1, 2, 1000)*u.um
+    fl = np.ones(1000)*config.flux_unit
+    keys = [cache.get_key(teff*u.K, 5000, 1*u.um, 2*u.um) for teff in (3000, 3100, 3200)]
+    for i, key in enumerate(keys):
+        cache.put(key, wl, fl)
+        os.utime(cache.get_filename(key), (i, i))
+    entry_size = cache.get_filename(keys[0]).stat().st_size
+    cache.max_bytes = 2*entry_size
+    cache.evict()
+    assert not cache.get_filename(keys[0]).exists()
+    assert cache.get_filename(keys[1]).exists()
+    assert cache.size <= cache.max_bytes
+    cache.clear()
+    assert cache.size == 0
+
+
+def test_spectra_cache_vanished(tmp_path, monkeypatch):
+    from VSPEC.spectra import cache as cache_module
+    cache = SpectraCache(tmp_path, max_bytes=10**9)
+    wl = np.linspace(1, 2, 100)*u.um
+    fl = np.ones(100)*config.flux_unit
+    key = cache.get_key(3000*u.K, 5000, 1*u.um, 2*u.um)
+    cache.put(key, wl, fl)
+    entry_size = cache.get_filename(key).stat().st_size
+
+    # another thread deletes an entry between the glob and the stat
+    glob = type(tmp_path).glob
+    def glob_with_vanished(self, pattern):
+        yield from glob(self, pattern)
+        yield self / 'vanished.npz'
+    monkeypatch.setattr(type(tmp_path), 'glob', glob_with_vanished)
+    assert cache.size == entry_size
+    cache.evict()
+
+    # or between the read and the access time update
+    utime = os.utime
+    def evict_then_utime(path, *args):
+        os.unlink(path)
+        utime(path, *args)
+    monkeypatch.setattr(cache_module.os, 'utime', evict_then_utime)
+    wl_cached, fl_cached = cache.get(key)
+    assert np.all(fl_cached == fl)
+    assert cache.size == 0
+
+
+def test_read_phoenix_cache(tmp_path, monkeypatch):
+    calls = []
+
+    def read(self, teff, w1=None, w2=None):
+        calls.append(teff)
+        wl = np.linspace(0.5, 5, 100000)*u.um
+        return wl, np.ones(len(wl))*config.flux_unit
+
+    monkeypatch.setattr(phoenix.RawReader, 'read', read)
+    monkeypatch.setattr(config, 'SPECTRA_CACHE_PATH', tmp_path)
+    R = 10*phoenix.get_binned_options().max()
+    wl1, fl1 = phoenix.read_phoenix(3000*u.K, R, 1*u.um, 1.1*u.um)
+    wl2, fl2 = phoenix.read_phoenix(3000*u.K, R, 1*u.um, 1.1*u.um)
+    assert len(calls) == 1
+    assert np.all(wl1 == wl2) and np.all(fl1 == fl2)
+    phoenix.read_phoenix(3000*u.K, R, 1*u.um, 1.1*u.um, use_cache=False)
+    assert len(calls) == 2
@@ -0,0 +1,95 @@
+import numpy as np
+from astropy import units as u
+import h5py
+
+from VSPEC.spectra.chunked import (
+    ChunkedGridSpectra,
+    create_chunked_grid,
+    write_chunked_node,
+)
+from VSPEC.spectra.phoenix import RawReader
+from VSPEC import config
+
+
+def make_grid(path):
+    wl = np.linspace(1, 5, 401)*u.um
+    teffs = [3000, 3100]*u.K
+    loggs = np.array([4.5, 5.0])
+    fehs = np.array([0.0])
+    with create_chunked_grid(path, wl, teffs, loggs, fehs, chunk_size=64) as fh5:
+        for i, teff in enumerate(teffs):
+            for j, logg in enumerate(loggs):
+                flux = np.full(len(wl), 10*i + j)*config.flux_unit
+                write_chunked_node(fh5, teff, logg, 0.0, flux)
+    return wl
+
+
+def test_create_chunked_grid(tmp_path):
+    make_grid(tmp_path/'grid.h5')
+    with h5py.File(tmp_path/'grid.h5', 'r') as fh5:
+        assert fh5['flux'].shape == (2, 2, 1, 401)
+        assert fh5['flux'].chunks == (1, 1, 1, 64)
+        assert fh5['flux'].compression == 'gzip'
+
+
+def test_chunked_grid_config(tmp_path, monkeypatch):
+    # the defaults are read when the grid is made
+    monkeypatch.setattr(config, 'grid_wl_chunk_size', 32)
+    monkeypatch.setattr(config, 'spectrum_cache_size', 5)
+    with create_chunked_grid(tmp_path/'grid.h5', np.linspace(1, 5, 401)*u.um,
+                             [3000]*u.K, np.array([4.5]), np.array([0.0])) as fh5:
+        assert fh5['flux'].chunks == (1, 1, 1, 32)
+    with ChunkedGridSpectra(tmp_path/'grid.h5') as grid:
+        assert grid.cache_size == 5
+
+
+def test_chunked_grid_spectra(tmp_path):
+    make_grid(tmp_path/'grid.h5')
+    with ChunkedGridSpectra(tmp_path/'grid.h5', 2*u.um, 3*u.um) as grid:
+        assert grid.wl[0] < 2*u.um and grid.wl[-1] > 3*u.um
+        assert len(grid.wl) < 401
+        wl = np.linspace(2, 3, 11)*u.um
+        assert np.allclose(grid.evaluate(wl, 3000, 4.5), 0)
+        assert np.allclose(grid.evaluate(wl, 3100, 5.0, 0.0), 11)
+        assert np.allclose(grid.evaluate(wl, 3050, 4.75), 5.5)
+        assert set(grid.loaded) == {(0, 0, 0), (0, 1, 0), (1, 0, 0), (1, 1, 0)}
+        assert all(len(flux) == len(grid.wl) for flux in grid.loaded.values())
+        assert np.all(np.isnan(grid.evaluate(wl, 3050, 4.0)))
+        assert np.all(np.isnan(grid.evaluate(4*u.um, 3050, 4.75)))
+        assert grid.evaluate_matrix(wl, [(3000, 4.5), (3100, 4.5)]).shape == (2, 11)
+
+
+def test_chunked_grid_warmup(tmp_path):
+    make_grid(tmp_path/'grid.h5')
+    with ChunkedGridSpectra(tmp_path/'grid.h5') as grid:
+        wl = np.linspace(2, 3, 11)*u.um
+        assert grid.warmup(wl, 3100, 5.0, None) > 0
+        assert set(grid.loaded) == {(1, 1, 0)}
+        grid.warmup(wl)
+        assert set(grid.loaded) == {(0, 0, 0), (1, 1, 0)}
+        # an axis with a single node can be left as None
+        assert np.allclose(grid.evaluate_cached(wl, 3100, 5.0, None), 11)
+        assert np.allclose(grid.evaluate_matrix(wl, [(3100, 4.5, None)]), 10)
+
+
+def test_raw_reader_filename():
+    assert RawReader.get_filename(3000*u.K) == 'lte03000-5.00-0.0.PHOENIX-ACES-AGSS-COND-2011.HR.h5'
+    assert RawReader.get_filename(12000*u.K, 4.5, -1.0) == 'lte12000-4.50-1.0.PHOENIX-ACES-AGSS-COND-2011.HR.h5'
+    assert RawReader.get_filename(3000*u.K, 4.0, 0.5) == 'lte03000-4.00+0.5.PHOENIX-ACES-AGSS-COND-2011.HR.h5'
+
+
+def test_build_chunked_phoenix_grid(tmp_path, monkeypatch):
+    from VSPEC.spectra.chunked import build_chunked_phoenix_grid
+    monkeypatch.setattr(RawReader, '_path', tmp_path)
+    wl = np.linspace(5000, 50000, 20001)
+    for teff, logg in [(3000, 4.5), (3000, 5.0)]:
+        with h5py.File(tmp_path/RawReader.get_filename(teff*u.K, logg), 'w') as fh5:
+            fh5['PHOENIX_SPECTRUM/wl'] = wl
+            fh5['PHOENIX_SPECTRUM/flux'] = np.full(len(wl), logg)
+    build_chunked_phoenix_grid(
+        tmp_path/'grid.h5', 100, 1*u.um, 2*u.um, [3000]*u.K, loggs=[4.5, 5.0])
+    with ChunkedGridSpectra(tmp_path/'grid.h5') as grid:
+        wl_eval = np.linspace(1.1, 1.9, 5)*u.um
+        expected = (10**4.75*u.Unit('erg cm-2 s-1 cm-1')).to_value(config.flux_unit)
+        assert np.allclose(grid.evaluate(wl_eval, 3000, 4.75),
+                           0.5*(10**4.5 + 10**5)*expected/10**4.75)
@@ -13,3 +13,19 @@ def test_forward_spectra_blackbody():
     # Assertions
     assert flux.shape == (3,)
     assert np.all(flux > 0)
+
+
+def test_blackbody_kernel():
+    from astropy import constants as c
+    from VSPEC.spectra.forward import blackbody_kernel
+    from VSPEC import config
+    wl = np.linspace(0.5, 20, 200)*u.um
+    teffs = np.array([2500., 3300., 9000.])*u.K
+    block = ForwardSpectra.blackbody().evaluate(wl, teffs)
+    assert block.shape == (3, 200)
+    for teff, row in zip(teffs, block):
+        A = 2 * c.h * c.c**2/wl**5
+        B = np.exp(((c.h*c.c)/(wl*c.k_B*teff)).to(u.dimensionless_unscaled)) - 1
+        assert np.allclose(row, (A/B).to(config.flux_unit), rtol=1e-12, atol=0)
+    assert np.all(blackbody_kernel(wl.value, 3300.) == block[1].value)
+    assert np.allclose(ForwardSpectra.blackbody().evaluate(wl.to(u.nm), 3300*u.K), block[1])
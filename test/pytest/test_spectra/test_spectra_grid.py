@@ -1,7 +1,9 @@
 import numpy as np
+import pytest
 from astropy import units as u
 
-from VSPEC.spectra.grid import GridSpectra
+from VSPEC.spectra.grid import GridSpectra, LazyGridSpectra
+from VSPEC.spectra import read_phoenix
 from VSPEC.helpers import isclose
 
 
@@ -33,3 +35,104 @@ def test_grid_spectra_from_vspec():
     # Assertions
     assert evaluated.shape == (3,)
     # assert evaluated.unit == grid._evaluate([3100])[0].unit
+
+
+def test_grid_spectra_evaluate_cached():
+    wl = np.linspace(3000, 3200, 3) * u.Angstrom
+    spectra = [np.random.rand(3), np.random.rand(3), np.random.rand(3)]
+    params = (np.array([3000, 3100, 3200]),)
+    grid = GridSpectra(wl, spectra, *params, cache_size=2)
+
+    flux = grid.evaluate_cached(wl, 3050, scale=2.0)
+    assert np.all(np.isclose(flux, 2*grid.evaluate(wl, 3050), atol=1e-6))
+    assert grid.evaluate_cached(wl, 3050, scale=2.0) is flux
+    assert not flux.flags.writeable
+
+    grid.evaluate_cached(wl, 3100, scale=2.0)
+    grid.evaluate_cached(wl, 3150, scale=2.0)
+    assert len(grid._cache) == 2
+    assert grid.evaluate_cached(wl, 3050, scale=2.0) is not flux
+
+
+def test_grid_spectra_cache_size_config(monkeypatch):
+    from VSPEC import config
+    wl = np.linspace(3000, 3200, 3) * u.Angstrom
+    spectra = [np.random.rand(3), np.random.rand(3), np.random.rand(3)]
+    # the default is read when the grid is made
+    monkeypatch.setattr(config, 'spectrum_cache_size', 5)
+    assert GridSpectra(wl, spectra, np.array([3000, 3100, 3200])).cache_size == 5
+    assert LazyGridSpectra(3*u.um, 4*u.um, 500, [3000, 3100]*u.K).cache_size == 5
+
+
+def test_grid_spectra_from_vspec_workers():
+    w1 = 3 * u.um
+    w2 = 4 * u.um
+    R = 500
+    teffs = np.linspace(3000, 3400, 5) * u.K
+    wl = np.linspace(3.1, 3.9, 20) * u.um
+    serial = GridSpectra.from_vspec(w1, w2, R, teffs, n_workers=1)
+    parallel = GridSpectra.from_vspec(w1, w2, R, teffs, n_workers=4)
+    for teff in teffs.value:
+        assert np.all(serial.evaluate(wl, teff) == parallel.evaluate(wl, teff))
+
+
+def test_iter_phoenix_processes(monkeypatch):
+    from VSPEC.spectra import grid
+    contexts = []
+    class RecordingExecutor(grid.ProcessPoolExecutor):
+        def __init__(self, *args, mp_context=None, **kwargs):
+            contexts.append(mp_context)
+            super().__init__(*args, mp_context=mp_context, **kwargs)
+    # pretend there are no binned spectra so that raw models would be binned;
+    # the workers still read the binned files
+    monkeypatch.setattr(grid, 'get_binned_options', lambda: np.array([], dtype=int))
+    monkeypatch.setattr(grid, 'ProcessPoolExecutor', RecordingExecutor)
+    w1 = 3 * u.um
+    w2 = 4 * u.um
+    R = 500
+    teffs = np.linspace(3000, 3200, 3) * u.K
+    serial = list(grid.iter_phoenix(teffs, R, w1, w2, n_workers=1))
+    threads = list(grid.iter_phoenix(teffs, R, w1, w2, n_workers=2))
+    # processes are only used when asked for
+    assert contexts == []
+    parallel = list(grid.iter_phoenix(teffs, R, w1, w2, n_workers=2, use_processes=True))
+    assert [context.get_start_method() for context in contexts] == ['spawn']
+    for (wl1, fl1), (wl2, fl2), (wl3, fl3) in zip(serial, threads, parallel):
+        assert np.all(wl1 == wl2) and np.all(wl1 == wl3)
+        assert np.all(fl1 == fl2) and np.all(fl1 == fl3)
+
+
+def test_lazy_grid_spectra():
+    w1 = 3 * u.um
+    w2 = 4 * u.um
+    R = 500
+    teffs = np.linspace(3000, 3400, 5) * u.K
+    grid = GridSpectra.from_vspec(w1, w2, R, teffs)
+    lazy = LazyGridSpectra(w1, w2, R, teffs)
+    assert len(lazy.loaded) == 0
+
+    wl = np.linspace(3.1, 3.9, 20) * u.um
+    assert np.all(np.isclose(lazy.evaluate(wl, 3150), grid.evaluate(wl, 3150), rtol=1e-5))
+    assert set(lazy.loaded) == {1, 2}
+    assert np.all(np.isclose(lazy.evaluate(wl, 3300), grid.evaluate(wl, 3300), rtol=1e-5))
+    assert set(lazy.loaded) == {1, 2, 3}
+    assert np.all(np.isnan(lazy.evaluate(wl, 3500)))
+
+    lazy.preload([3000, 3050] * u.K, n_workers=2)
+    assert set(lazy.loaded) == {0, 1, 2, 3}
+    assert lazy.warmup(wl, 3400) > 0
+    assert set(lazy.loaded) == {0, 1, 2, 3, 4}
+
+    # a node that does not match the pixel axis is rejected
+    wave, flux = read_phoenix(3400*u.K, R, w1, w2)
+    with pytest.raises(ValueError):
+        lazy._add_node(0, wave, flux[:-1])
+    with pytest.raises(ValueError):
+        lazy._add_node(0, wave[1:], flux)
+
+
+def test_grid_spectra_warmup():
+    wl = np.linspace(3000, 3200, 3) * u.Angstrom
+    spectra = [np.random.rand(3), np.random.rand(3), np.random.rand(3)]
+    grid = GridSpectra(wl, spectra, np.array([3000, 3100, 3200]))
+    assert grid.warmup(wl) >= 0
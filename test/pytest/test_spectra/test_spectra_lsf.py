@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from astropy import units as u
+
+from VSPEC.spectra.lsf import LineSpreadFunction, GaussianLSF, TabulatedLSF
+from VSPEC.spectra import phoenix, get_wavelengths
+from VSPEC import config
+
+
+def test_gaussian_lsf():
+    wl = np.linspace(1, 2, 2001)*u.um
+    flux = np.zeros(len(wl))*config.flux_unit
+    flux[1000] = 1*config.flux_unit
+    lsf = GaussianLSF(fwhm=0.01*u.um)
+    line = lsf.convolve(wl, flux)
+    above_half = wl[line > line.max()/2]
+    assert np.isclose((above_half[-1] - above_half[0]).to_value(u.um), 0.01, atol=1e-3)
+    assert np.isclose(np.sum(line.value), 1, rtol=1e-3)
+
+    flat = np.ones(len(wl))*config.flux_unit
+    assert np.allclose(lsf.convolve(wl, flat), flat)
+    # the wavelength axis must match the flux, e.g. not the pixel edges
+    with pytest.raises(ValueError):
+        lsf.convolve(wl, flat[:-1])
+
+
+def test_lsf_resolving_power():
+    wl = get_wavelengths(10000, 1, 4)
+    lsf = GaussianLSF(resolving_power=1000)
+    matrix = lsf.get_matrix(wl)
+    assert np.allclose(matrix.sum(axis=1), 1)
+    # constant R means the kernel is the same number of pixels wide everywhere
+    widths = np.diff(matrix.indptr)
+    assert np.all(np.abs(widths[100:-100] - widths[100]) <= 1)
+
+
+def test_tabulated_lsf():
+    x = np.linspace(-1.5, 1.5, 301)
+    profile = np.exp(-4*np.log(2)*x**2)
+    wl = np.linspace(1, 2, 1001)*u.um
+    flux = np.random.rand(len(wl))*config.flux_unit
+    tabulated = TabulatedLSF(x, profile, fwhm=[0.005, 0.02]*u.um, wl=[1, 2]*u.um)
+    gaussian = GaussianLSF(fwhm=[0.005, 0.02]*u.um, wl=[1, 2]*u.um)
+    assert np.allclose(tabulated.convolve(wl, flux), gaussian.convolve(wl, flux), rtol=1e-3)
+    assert tabulated.key != gaussian.key
+
+
+def test_lsf_from_dict():
+    lsf = LineSpreadFunction.from_dict({'kind': 'gaussian', 'resolving_power': 100})
+    assert isinstance(lsf, GaussianLSF)
+    assert lsf.resolving_power == 100
+    lsf = LineSpreadFunction.from_dict({
+        'kind': 'tabulated',
+        'fwhm': ['1 um', '2 um'],
+        'wl': ['1 um', '5 um'],
+        'x': [-1, 0, 1],
+        'profile': [0, 1, 0]
+    })
+    assert isinstance(lsf, TabulatedLSF)
+    assert np.allclose(lsf.get_fwhm(np.array([3.0])), 1.5)
+
+
+def test_read_phoenix_lsf(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SPECTRA_CACHE_PATH', tmp_path)
+    lsf = GaussianLSF(resolving_power=200)
+    args = (3000*u.K, 500, 1*u.um, 2*u.um)
+    wl, flux = phoenix.read_phoenix(*args)
+    wl_lsf, flux_lsf = phoenix.read_phoenix(*args, lsf=lsf)
+    assert np.all(wl == wl_lsf)
+    assert np.allclose(flux_lsf, lsf.convolve(wl[:-1], flux))
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+    _, flux_cached = phoenix.read_phoenix(*args, lsf=lsf)
+    assert np.all(flux_cached == flux_lsf)
@@ -1,6 +1,7 @@
 import pytest
 from pathlib import Path
 import numpy as np
+import h5py
 from astropy import units as u
 from VSPEC.spectra.phoenix import (
     get_binned_options,
@@ -8,6 +9,8 @@ from VSPEC.spectra.phoenix import (
     BinnedReader,
     read_phoenix,
     write_binned_spectrum,
+    write_binned_stack,
+    get_slice,
 )
 
 
@@ -93,6 +96,61 @@ def test_binned_reader():
     assert fl.unit == u.Unit("W m-2 um-1")
 
 
+def test_binned_reader_stack(monkeypatch):
+    """
+    The binary stack should match the text files.
+    """
+    reader = BinnedReader()
+    R = 1000
+    teff = 3000 * u.K
+    assert reader.has_stack(R)
+    wl_stack, fl_stack = reader.read(R, teff)
+    wl_stack_slice, fl_stack_slice = reader.read(R, teff, 2*u.um, 3*u.um)
+    assert wl_stack_slice[0] <= 2*u.um < wl_stack_slice[1]
+    assert wl_stack_slice[-2] < 3*u.um <= wl_stack_slice[-1]
+
+    _, teffs, _ = reader.read_stack(R)
+    stack = [reader.read(R, t*u.K) for t in teffs]
+    monkeypatch.setattr(BinnedReader, 'has_stack', lambda self, R: False)
+    wl_text, fl_text = reader.read(R, teff)
+    assert np.all(wl_stack == wl_text)
+    assert np.all(fl_stack == fl_text)
+    # the coolest models have flux far below the range of float32
+    for t, (_, fl) in zip(teffs, stack):
+        assert np.all(fl == reader.read(R, t*u.K)[1])
+
+
+def test_write_binned_stack(tmp_path, monkeypatch):
+    """
+    Test for `write_binned_stack()` function.
+    """
+    monkeypatch.setattr(BinnedReader, '_path', tmp_path)
+    reader = BinnedReader()
+    wavelength = np.linspace(1, 5, 401) * u.um
+    teffs = [3000, 3100] * u.K
+    flux = np.array([np.ones(401), 2*np.ones(401)]) * u.Unit('W m-2 um-1')
+    write_binned_stack(reader.get_stack_path(100), wavelength, teffs, flux)
+    assert reader.has_stack(100)
+
+    wl, fl = reader.read(100, 3100*u.K, 2*u.um, 3*u.um)
+    assert np.all(fl == 2*u.Unit('W m-2 um-1'))
+    assert wl[0] < 2*u.um and wl[-1] > 3*u.um
+    assert len(wl) == 103
+
+    with pytest.raises(ValueError):
+        write_binned_stack(tmp_path, wavelength, teffs, flux[:1])
+
+
+def test_get_slice():
+    """
+    Test for `get_slice()` function.
+    """
+    wl = np.arange(10.)
+    assert get_slice(wl) == slice(0, None)
+    assert np.all(wl[get_slice(wl, 2.5, 5)] == [2, 3, 4, 5, 6])
+    assert np.all(wl[get_slice(wl, -1, 20)] == wl)
+
+
 @pytest.mark.parametrize(
     'teff, R, w1, w2',
     [
@@ -128,3 +186,48 @@ def test_write_binned_spectrum(tmp_path):
         assert f"wavelength[Angstrom], flux[{flux_unit.to_string()}]" in content
         assert all([f"{wavelength[i].value:.6e}, {flux[i].value:.6e}" in content for i in range(
             len(wavelength))])
+
+
+def test_raw_reader_slice(tmp_path, monkeypatch):
+    """
+    Test that `RawReader` only reads the requested wavelength range.
+    """
+    wl = np.linspace(5000, 50000, 1001)
+    flux = np.log10(np.linspace(1, 2, 1001))
+    reader = RawReader()
+    monkeypatch.setattr(reader, '_path', tmp_path)
+    teff = 3000 * u.K
+    with h5py.File(tmp_path/reader.get_filename(teff), 'w') as fh5:
+        fh5['PHOENIX_SPECTRUM/wl'] = wl
+        fh5['PHOENIX_SPECTRUM/flux'] = flux
+    with reader:
+        wl_full, fl_full = reader.read(teff)
+        wl_part, fl_part = reader.read(teff, 1*u.um, 2*u.um)
+        assert len(reader._files) == 1
+    assert len(reader._files) == 0
+    assert len(wl_full) == 1001
+    assert wl_part[0] < 1*u.um and wl_part[1] >= 1*u.um
+    assert wl_part[-1] > 2*u.um and wl_part[-2] <= 2*u.um
+    s = slice(np.argmax(wl_full == wl_part[0]), np.argmax(wl_full == wl_part[-1]) + 1)
+    assert np.all(wl_full[s] == wl_part)
+    assert np.all(fl_full[s] == fl_part)
+
+
+def test_raw_reader_threads(tmp_path, monkeypatch):
+    """
+    Test that a `RawReader` shared by several threads opens each file once.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    reader = RawReader()
+    monkeypatch.setattr(reader, '_path', tmp_path)
+    teffs = [3000, 3100] * u.K
+    for teff in teffs:
+        with h5py.File(tmp_path/reader.get_filename(teff), 'w') as fh5:
+            fh5['PHOENIX_SPECTRUM/wl'] = np.linspace(5000, 50000, 101)
+            fh5['PHOENIX_SPECTRUM/flux'] = np.zeros(101) + teff.value/1000
+    with reader, ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(reader.read, [teffs[i % 2] for i in range(40)]))
+        assert len(reader._files) == 2
+    assert len(reader._files) == 0
+    for i, (_, fl) in enumerate(results):
+        assert np.all(fl == results[i % 2][1])
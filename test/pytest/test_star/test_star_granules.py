@@ -2,6 +2,8 @@
 Test module for VSPEC Granulation model
 """
 import numpy as np
+import jax
+import pytest
 from tinygp import GaussianProcess
 from astropy import units as u
 from VSPEC.variable_star_model import granules
@@ -59,3 +61,83 @@ def test_granulation_get_coverage():
     assert not np.any(coverage > 1)
     assert not np.any(coverage < 0)
     
+
+def test_build_quasisep_kernel():
+    """
+    Test for `granules.build_quasisep_kernel()`
+    """
+    params = dict(
+            mean=0.5,
+            scale=0.1,
+            period=3
+    )
+    X = np.linspace(0,10,51)
+    dense = granules.GranulationKernel(params['scale'],params['period'])
+    qsm = granules.build_quasisep_kernel(params)
+    assert np.allclose(dense(X,X),qsm(X,X),atol=1e-6)
+
+def test_sample_state_space():
+    """
+    Test for `granules.sample_state_space()`
+    """
+    params = dict(
+            mean=0.5,
+            scale=0.1,
+            period=3
+    )
+    kernel = granules.build_quasisep_kernel(params)
+    X = np.linspace(0,1e4,100000)
+    key = jax.random.PRNGKey(0)
+    sample = np.array(granules.sample_state_space(kernel,X,key,mean=params['mean']))
+    assert sample.shape == X.shape
+    assert np.all(np.isfinite(sample))
+    variance = params['scale']/params['period']/np.sqrt(2)
+    assert np.isclose(np.var(sample),variance,rtol=0.2)
+
+def test_iter_state_space():
+    """
+    Test for `granules.iter_state_space()`
+    """
+    params = dict(
+            mean=0.5,
+            scale=0.1,
+            period=3
+    )
+    kernel = granules.build_quasisep_kernel(params)
+    X = np.linspace(0,10,1001)
+    key = jax.random.PRNGKey(0)
+    chunks = list(granules.iter_state_space(kernel,X,key,mean=params['mean'],chunk_size=100))
+    assert len(chunks) == 11
+    sample = np.concatenate(chunks)
+    assert sample.shape == X.shape
+    # no jumps at the chunk boundaries
+    steps = np.abs(np.diff(sample))
+    assert np.all(steps[99::100] < 10*np.median(steps))
+
+def test_granulation_iter_coverage():
+    t = np.linspace(0,10,51)*u.day
+    gran = granules.Granulation(0.2,0.01,3*u.day,200*u.K)
+    chunks = list(gran.iter_coverage(t,chunk_size=20))
+    assert [len(chunk) for chunk in chunks] == [20,20,11]
+    coverage = gran.get_coverage(t,chunk_size=20)
+    assert np.all(coverage == np.concatenate(chunks))
+    with pytest.raises(ValueError):
+        list(gran.iter_coverage(t[::-1]))
+
+
+def test_granulation_chunk_size_config(monkeypatch):
+    from VSPEC import config
+    t = np.linspace(0,10,51)*u.day
+    gran = granules.Granulation(0.2,0.01,3*u.day,200*u.K)
+    # the default is read when the method is called
+    monkeypatch.setattr(config,'granulation_chunk_size',25)
+    assert [len(chunk) for chunk in gran.iter_coverage(t)] == [25,25,1]
+
+
+def test_granulation_warmup():
+    t = np.linspace(0,10,51)*u.day
+    gran = granules.Granulation(0.2,0.01,3*u.day,200*u.K)
+    assert gran.warmup(len(t),chunk_size=20) >= 0
+    n_compiled = granules._propagate_state._cache_size()
+    list(gran.iter_coverage(t,chunk_size=20))
+    assert granules._propagate_state._cache_size() == n_compiled
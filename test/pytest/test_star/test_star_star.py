@@ -82,6 +82,12 @@ def test_star_with_granulation():
 
     assert isinstance(star.granulation, Granulation)
 
+def test_star_iter_granulation_coverage(star:Star):
+    time = np.linspace(0,10,25)*u.day
+    chunks = list(star.iter_granulation_coverage(time,chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10,10,5]
+    assert np.all(np.concatenate(chunks) == 0)
+
 
 def test_star_with_custom_gridmaker():
     Teff = 5000 * u.K